@@ -21,6 +21,7 @@ CREATE TABLE challenges (
     total_pnl FLOAT DEFAULT 0,
     total_pnl_pct FLOAT DEFAULT 0,
     daily_pnl_pct FLOAT DEFAULT 0,
+    daily_reset_date DATE,
     max_daily_loss_pct FLOAT DEFAULT 5,
     max_total_loss_pct FLOAT DEFAULT 10,
     profit_target_pct FLOAT DEFAULT 10,
@@ -29,6 +30,8 @@ CREATE TABLE challenges (
     total_trades INTEGER DEFAULT 0,
     winning_trades INTEGER DEFAULT 0,
     last_trade_date TIMESTAMP,
+    version INTEGER NOT NULL DEFAULT 1,
+    ledger_seq INTEGER NOT NULL DEFAULT 0,
     created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -44,12 +47,40 @@ CREATE TABLE trades (
     pnl FLOAT DEFAULT 0,
     pnl_pct FLOAT DEFAULT 0,
     status VARCHAR(20) DEFAULT 'open',
+    stop_loss FLOAT,
+    take_profit FLOAT,
+    close_reason VARCHAR(20),
+    client_id VARCHAR(36),
     open_time TIMESTAMP,
     close_time TIMESTAMP,
     created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE TABLE trade_events (
+    id VARCHAR(36) PRIMARY KEY,
+    challenge_id VARCHAR(36) NOT NULL REFERENCES challenges(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    event_type VARCHAR(20) NOT NULL,
+    trade_id VARCHAR(36),
+    balance_delta FLOAT DEFAULT 0,
+    pnl FLOAT DEFAULT 0,
+    created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(challenge_id, seq)
+);
+
+CREATE TABLE challenge_snapshots (
+    id VARCHAR(36) PRIMARY KEY,
+    challenge_id VARCHAR(36) NOT NULL REFERENCES challenges(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    current_balance FLOAT NOT NULL,
+    total_pnl FLOAT DEFAULT 0,
+    total_trades INTEGER DEFAULT 0,
+    winning_trades INTEGER DEFAULT 0,
+    created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(challenge_id, seq)
+);
+
 CREATE TABLE posts (
     id VARCHAR(36) PRIMARY KEY,
     author_email VARCHAR(255) NOT NULL,
@@ -126,6 +157,7 @@ CREATE TABLE course_progress (
 CREATE INDEX idx_challenges_created_by ON challenges(created_by_id);
 CREATE INDEX idx_challenges_status ON challenges(status);
 CREATE INDEX idx_trades_challenge ON trades(challenge_id);
+CREATE INDEX idx_trades_client_id ON trades(client_id);
 CREATE INDEX idx_posts_created_date ON posts(created_date DESC);
 CREATE INDEX idx_comments_post ON comments(post_id);
 CREATE INDEX idx_likes_post ON likes(post_id);
@@ -4,6 +4,7 @@ from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm.exc import StaleDataError
 from datetime import datetime, timedelta
 import os
 
@@ -15,12 +16,16 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'postgresql://
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'change-this-secret-key')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=7)
+# Attempts at a compare-and-swap challenge update before answering 409
+CHALLENGE_UPDATE_RETRIES = int(os.getenv('CHALLENGE_UPDATE_RETRIES', 5))
+# A challenge is snapshotted every this many ledger events, which bounds what a rebuild replays
+LEDGER_SNAPSHOT_INTERVAL = int(os.getenv('LEDGER_SNAPSHOT_INTERVAL', 100))
 
 db = SQLAlchemy(app)
 jwt = JWTManager(app)
 
 # Import models after db initialization
-from models import User, Challenge, Trade, Post, Comment, Like, Payment, Course, CourseProgress
+from models import User, Challenge, Trade, TradeEvent, ChallengeSnapshot, Post, Comment, Like, Payment, Course, CourseProgress, gen_uuid
 
 # ==================== AUTH ====================
 
@@ -94,18 +99,114 @@ def create_challenge():
     db.session.commit()
     return jsonify(challenge.to_dict()), 201
 
+def apply_challenge_update(challenge_id, values):
+    """Apply column expressions to a challenge in one UPDATE and bump its version.
+
+    Counters and balances are written as SQL expressions (e.g.
+    Challenge.total_trades + 1) so concurrent trades add up instead of
+    overwriting each other. Returns the number of rows matched.
+    """
+    values = dict(values)
+    values[Challenge.version] = Challenge.version + 1
+    values[Challenge.updated_date] = datetime.utcnow()
+    return Challenge.query.filter_by(id=challenge_id).update(values, synchronize_session=False)
+
+def update_challenge_cas(challenge_id, mutate, expected_version=None):
+    """Read-modify-write a challenge, retrying when a concurrent update wins the race.
+
+    The commit only matches the row if its version is still the one that
+    was read (Challenge maps version as its version_id_col). With
+    expected_version the caller's own earlier read must still be current,
+    so a conflict is reported rather than retried. Returns the challenge,
+    or None on conflict.
+    """
+    for _ in range(CHALLENGE_UPDATE_RETRIES):
+        challenge = Challenge.query.get_or_404(challenge_id)
+        if expected_version is not None and challenge.version != expected_version:
+            return None
+        mutate(challenge)
+        challenge.updated_date = datetime.utcnow()
+        try:
+            db.session.commit()
+            return challenge
+        except StaleDataError:
+            db.session.rollback()
+    return None
+
+# Challenge aggregates that are projections of the trade ledger
+LEDGER_FIELDS = ['current_balance', 'total_pnl', 'total_trades', 'winning_trades']
+
+def ledger_state(challenge_id, lock=False):
+    query = db.session.query(Challenge.ledger_seq, *[getattr(Challenge, field) for field in LEDGER_FIELDS])
+    if lock:
+        query = query.with_for_update()
+    return query.filter_by(id=challenge_id).first()
+
+def take_snapshot(challenge_id, state):
+    db.session.add(ChallengeSnapshot(
+        challenge_id=challenge_id, seq=state.ledger_seq,
+        **{field: getattr(state, field) for field in LEDGER_FIELDS}
+    ))
+
+def append_ledger_event(challenge_id, event_type, trade_id, values, balance_delta=0, pnl=0):
+    """Apply a trade's effect on a challenge (see apply_challenge_update) and record it in the ledger.
+
+    The challenge row is locked first, so events are numbered (ledger_seq)
+    in the order their effects are applied. The aggregates before the
+    first event become the seq 0 snapshot, and another snapshot is taken
+    every LEDGER_SNAPSHOT_INTERVAL events. Returns the number of rows matched.
+    """
+    before = ledger_state(challenge_id, lock=True)
+    if before is None:
+        return 0
+    if not before.ledger_seq:
+        take_snapshot(challenge_id, before)
+    values = dict(values)
+    values[Challenge.ledger_seq] = Challenge.ledger_seq + 1
+    apply_challenge_update(challenge_id, values)
+    after = ledger_state(challenge_id)
+    db.session.add(TradeEvent(
+        challenge_id=challenge_id, seq=after.ledger_seq, event_type=event_type,
+        trade_id=trade_id, balance_delta=balance_delta, pnl=pnl
+    ))
+    if after.ledger_seq % LEDGER_SNAPSHOT_INTERVAL == 0:
+        take_snapshot(challenge_id, after)
+    return 1
+
+def rebuild_challenge(challenge_id):
+    """Ledger aggregates of a challenge from its latest snapshot plus the events after it,
+    or None if it has no ledger"""
+    snapshot = ChallengeSnapshot.query.filter_by(challenge_id=challenge_id).order_by(ChallengeSnapshot.seq.desc()).first()
+    if snapshot is None:
+        return None
+    state = {'ledger_seq': snapshot.seq, **{field: getattr(snapshot, field) for field in LEDGER_FIELDS}}
+    events = TradeEvent.query.filter(
+        TradeEvent.challenge_id == challenge_id, TradeEvent.seq > snapshot.seq
+    ).order_by(TradeEvent.seq).all()
+    for event in events:
+        state['ledger_seq'] = event.seq
+        state['current_balance'] += event.balance_delta
+        state['total_pnl'] += event.pnl
+        if event.event_type == 'trade_opened':
+            state['total_trades'] += 1
+        elif event.event_type == 'trade_closed' and event.pnl > 0:
+            state['winning_trades'] += 1
+    return state
+
 @app.route('/api/challenges/<id>', methods=['PUT'])
 @jwt_required()
 def update_challenge(id):
-    challenge = Challenge.query.get_or_404(id)
     data = request.get_json()
+    expected_version = data.pop('version', None)
     
-    for key, value in data.items():
-        if hasattr(challenge, key):
-            setattr(challenge, key, value)
+    def apply(challenge):
+        for key, value in data.items():
+            if hasattr(challenge, key):
+                setattr(challenge, key, value)
     
-    challenge.updated_date = datetime.utcnow()
-    db.session.commit()
+    challenge = update_challenge_cas(id, apply, expected_version)
+    if challenge is None:
+        return jsonify({'error': 'Challenge was modified concurrently'}), 409
     return jsonify(challenge.to_dict())
 
 @app.route('/api/challenges/<id>', methods=['DELETE'])
@@ -130,18 +231,23 @@ def get_trades():
 def create_trade():
     data = request.get_json()
     trade = Trade(
+        id=gen_uuid(),
         challenge_id=data['challenge_id'],
         symbol=data['symbol'],
         side=data['side'],
         quantity=data['quantity'],
         entry_price=data['entry_price'],
+        stop_loss=data.get('stop_loss'),
+        take_profit=data.get('take_profit'),
         open_time=datetime.utcnow(),
         status='open'
     )
-    db.session.add(trade)
     
-    challenge = Challenge.query.get(data['challenge_id'])
-    challenge.total_trades += 1
+    if not append_ledger_event(data['challenge_id'], 'trade_opened', trade.id,
+                               {Challenge.total_trades: Challenge.total_trades + 1}):
+        db.session.rollback()
+        return jsonify({'error': 'Challenge not found'}), 404
+    db.session.add(trade)
     db.session.commit()
     return jsonify(trade.to_dict()), 201
 
@@ -150,26 +256,34 @@ def create_trade():
 def close_trade(id):
     trade = Trade.query.get_or_404(id)
     data = request.get_json()
-    
-    trade.exit_price = data['exit_price']
-    trade.close_time = datetime.utcnow()
-    trade.status = 'closed'
+    exit_price = data['exit_price']
     
     if trade.side == 'buy':
-        trade.pnl = (trade.exit_price - trade.entry_price) * trade.quantity
+        pnl = (exit_price - trade.entry_price) * trade.quantity
     else:
-        trade.pnl = (trade.entry_price - trade.exit_price) * trade.quantity
-    
-    trade.pnl_pct = (trade.pnl / (trade.entry_price * trade.quantity)) * 100
+        pnl = (trade.entry_price - exit_price) * trade.quantity
     
-    challenge = Challenge.query.get(trade.challenge_id)
-    challenge.current_balance += trade.pnl
-    challenge.total_pnl += trade.pnl
-    challenge.total_pnl_pct = ((challenge.current_balance - challenge.starting_balance) / challenge.starting_balance) * 100
+    pnl_pct = (pnl / (trade.entry_price * trade.quantity)) * 100
     
-    if trade.pnl > 0:
-        challenge.winning_trades += 1
+    # Only one concurrent close can move the trade out of 'open', so its P&L is booked once
+    closed = Trade.query.filter_by(id=id, status='open').update({
+        Trade.exit_price: exit_price,
+        Trade.close_time: datetime.utcnow(),
+        Trade.status: 'closed',
+        Trade.pnl: pnl,
+        Trade.pnl_pct: pnl_pct
+    }, synchronize_session=False)
+    if not closed:
+        db.session.rollback()
+        return jsonify({'error': 'Trade is already closed'}), 409
     
+    # SET expressions see the row as it was before this UPDATE
+    append_ledger_event(trade.challenge_id, 'trade_closed', trade.id, {
+        Challenge.current_balance: Challenge.current_balance + pnl,
+        Challenge.total_pnl: Challenge.total_pnl + pnl,
+        Challenge.total_pnl_pct: (Challenge.current_balance + pnl - Challenge.starting_balance) / Challenge.starting_balance * 100,
+        Challenge.winning_trades: Challenge.winning_trades + (1 if pnl > 0 else 0)
+    }, balance_delta=pnl, pnl=pnl)
     db.session.commit()
     return jsonify(trade.to_dict())
 
@@ -272,6 +386,37 @@ def admin_challenges():
     challenges = Challenge.query.all()
     return jsonify([c.to_dict() for c in challenges])
 
+@app.route('/api/admin/challenges/<id>/rebuild', methods=['POST'])
+@jwt_required()
+def admin_rebuild_challenge(id):
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    
+    if user.role != 'admin':
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    # Locked so no trade lands between the rebuild and the comparison
+    stored = ledger_state(id, lock=True)
+    if stored is None:
+        return jsonify({'error': 'Challenge not found'}), 404
+    rebuilt = rebuild_challenge(id)
+    if rebuilt is None:
+        db.session.rollback()
+        return jsonify({'error': 'Challenge has no ledger'}), 404
+    
+    drift = {
+        field: {'stored': getattr(stored, field), 'ledger': rebuilt[field]}
+        for field in LEDGER_FIELDS if abs((getattr(stored, field) or 0) - rebuilt[field]) >= 0.01
+    }
+    apply = bool((request.get_json(silent=True) or {}).get('apply'))
+    if apply and drift:
+        apply_challenge_update(id, {
+            **{getattr(Challenge, field): rebuilt[field] for field in LEDGER_FIELDS},
+            Challenge.total_pnl_pct: rebuilt['total_pnl'] / Challenge.starting_balance * 100
+        })
+    db.session.commit()
+    return jsonify({'challenge_id': id, 'ledger': rebuilt, 'drift': drift, 'applied': apply and bool(drift)})
+
 @app.route('/api/admin/users/<email>', methods=['DELETE'])
 @jwt_required()
 def admin_delete_user(email):
@@ -0,0 +1,11 @@
+from .http import HttpPool, HttpResponse, BackgroundLoop, get_pool, close_pool
+from .auth import TokenCache, InvalidToken, AuthServiceError, decode_jwt
+from .client import Base44Client, EntityClient
+from .cascade import CascadeDeleter, CascadeJobs, CascadeProgress
+
+__all__ = [
+    'Base44Client', 'EntityClient',
+    'CascadeDeleter', 'CascadeJobs', 'CascadeProgress',
+    'TokenCache', 'InvalidToken', 'AuthServiceError', 'decode_jwt',
+    'HttpPool', 'HttpResponse', 'BackgroundLoop', 'get_pool', 'close_pool'
+]
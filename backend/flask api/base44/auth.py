@@ -0,0 +1,153 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+
+from common.cache import TTLCache
+
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', 10000))
+AUTH_CACHE_TTL = float(os.environ.get('AUTH_CACHE_TTL', 300))
+AUTH_NEGATIVE_TTL = float(os.environ.get('AUTH_NEGATIVE_TTL', 30))
+BASE44_JWT_SECRET = os.environ.get('BASE44_JWT_SECRET')
+
+_HMAC_ALGORITHMS = {
+    'HS256': hashlib.sha256,
+    'HS384': hashlib.sha384,
+    'HS512': hashlib.sha512
+}
+
+_INVALID = object()
+
+
+class InvalidToken(Exception):
+    """Raised when a token can be rejected without asking the auth service"""
+
+
+class AuthServiceError(Exception):
+    """Raised by a user fetcher when the auth service failed without rejecting the token"""
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + '=' * (-len(segment) % 4))
+
+
+def decode_jwt(token: str, secret: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """Decode JWT claims, checking the signature when a secret is given.
+
+    Returns the claims and whether their signature was checked: (None,
+    False) for tokens that are not JWTs (opaque tokens). Raises
+    InvalidToken for JWTs that are malformed, expired or wrongly signed.
+    Unchecked claims are whatever the client sent and must not be trusted.
+    """
+    parts = token.split('.')
+    if len(parts) != 3:
+        return None, False
+    try:
+        header = json.loads(_b64decode(parts[0]))
+        claims = json.loads(_b64decode(parts[1]))
+    except ValueError:
+        raise InvalidToken('Malformed token')
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        raise InvalidToken('Malformed token')
+
+    exp = claims.get('exp')
+    if isinstance(exp, (int, float)) and exp <= time.time():
+        raise InvalidToken('Token expired')
+
+    if not secret:
+        return claims, False
+    digest = _HMAC_ALGORITHMS.get(header.get('alg'))
+    if digest is None:
+        raise InvalidToken(f"Unsupported token algorithm: {header.get('alg')}")
+    signing_input = f"{parts[0]}.{parts[1]}".encode()
+    expected = hmac.new(secret.encode(), signing_input, digest).digest()
+    try:
+        signature = _b64decode(parts[2])
+    except ValueError:
+        raise InvalidToken('Malformed token')
+    if not hmac.compare_digest(expected, signature):
+        raise InvalidToken('Invalid token signature')
+    return claims, True
+
+
+class TokenCache:
+    """Verified-identity cache keyed by token hash.
+
+    Positive entries live for at most ``ttl`` seconds and never past the
+    token's own ``exp``. Rejected tokens are remembered for ``negative_ttl``
+    seconds so repeated bad requests don't reach the auth service either.
+    When ``jwt_secret`` is set, signed tokens are checked locally and, if
+    their claims carry an email, never leave the process at all.
+    """
+
+    def __init__(self, maxsize: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL,
+                 negative_ttl: float = AUTH_NEGATIVE_TTL, jwt_secret: Optional[str] = BASE44_JWT_SECRET):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.jwt_secret = jwt_secret
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._local_verifications = 0
+        self._remote_verifications = 0
+
+    @staticmethod
+    def token_key(auth_header: str) -> str:
+        return hashlib.sha256(auth_header.encode()).hexdigest()
+
+    def _entry_ttl(self, claims: Optional[Dict[str, Any]]) -> float:
+        exp = (claims or {}).get('exp')
+        if isinstance(exp, (int, float)):
+            return min(self.ttl, exp - time.time())
+        return self.ttl
+
+    async def verify(self, auth_header: str,
+                     fetch_user: Callable[[str], Awaitable[Optional[Dict[str, Any]]]]) -> Optional[Dict[str, Any]]:
+        """Return the identity behind auth_header, calling fetch_user only on a cache miss.
+
+        fetch_user returns None for a rejected token and raises
+        AuthServiceError on transient failures, which are not cached.
+        """
+        key = self.token_key(auth_header)
+        cached = self._cache.get(key)
+        if cached is _INVALID:
+            return None
+        if cached is not None:
+            return dict(cached)
+
+        token = auth_header[7:] if auth_header.startswith('Bearer ') else auth_header
+        try:
+            claims, verified = decode_jwt(token, self.jwt_secret)
+        except InvalidToken:
+            self._cache.set(key, _INVALID, self.negative_ttl)
+            return None
+
+        # Only a signature checked against jwt_secret makes the claims trustworthy on their own
+        if verified and claims.get('email'):
+            self._local_verifications += 1
+            user = {
+                'id': claims.get('sub') or claims.get('id'),
+                'email': claims['email'],
+                'full_name': claims.get('full_name') or claims.get('name'),
+                'role': claims.get('role', 'user')
+            }
+        else:
+            self._remote_verifications += 1
+            user = await fetch_user(auth_header)
+
+        if user is None:
+            self._cache.set(key, _INVALID, self.negative_ttl)
+            return None
+        self._cache.set(key, dict(user), self._entry_ttl(claims))
+        return user
+
+    def invalidate(self, auth_header: str):
+        """Forget a token, e.g. after logout"""
+        self._cache.pop(self.token_key(auth_header))
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        stats['local_verifications'] = self._local_verifications
+        stats['remote_verifications'] = self._remote_verifications
+        return stats
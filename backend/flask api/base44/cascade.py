@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Dict, Any, Optional, List
+
+from common.cache import TTLCache
+
+CASCADE_DELETE_CONCURRENCY = int(os.environ.get('CASCADE_DELETE_CONCURRENCY', 8))
+CASCADE_JOB_TTL = float(os.environ.get('CASCADE_JOB_TTL', 3600))
+
+# Per-challenge records besides trades (the trading ledger), deleted along with the challenge
+CHALLENGE_CHILD_ENTITIES = ['TradeEvent', 'ChallengeSnapshot']
+
+
+class CascadeProgress:
+    """Counters and failures for one cascade delete, readable while it runs"""
+
+    def __init__(self, challenges_total: int = 0):
+        self.challenges_total = challenges_total
+        self.challenges_deleted = 0
+        self.trades_deleted = 0
+        self.failures: List[Dict[str, Any]] = []
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def fail(self, challenge_id: str, error: str, trade_id: Optional[str] = None):
+        failure = {'challengeId': challenge_id, 'error': error}
+        if trade_id:
+            failure['tradeId'] = trade_id
+        self.failures.append(failure)
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'challengesTotal': self.challenges_total,
+            'deletedChallenges': self.challenges_deleted,
+            'deletedTrades': self.trades_deleted,
+            'failures': list(self.failures),
+            'complete': self.done and not self.failures,
+            'done': self.done,
+            'elapsedMs': int(((self.finished_at or time.time()) - self.started_at) * 1000)
+        }
+
+
+class CascadeDeleter:
+    """Deletes challenges and their trades with bounded concurrency.
+
+    Each challenge's trades, then its ledger records, go in one bulk delete
+    per entity; if a bulk call fails those records are deleted one by one
+    instead. A challenge is only removed once all of its trades and ledger
+    records are gone, so a partial failure never orphans them.
+    """
+
+    def __init__(self, client, concurrency: int = CASCADE_DELETE_CONCURRENCY):
+        if concurrency <= 0:
+            raise ValueError('concurrency must be positive')
+        self.client = client
+        self.concurrency = concurrency
+
+    async def _delete_one_by_one(self, entity: str, challenge_id: str, semaphore: asyncio.Semaphore,
+                                 progress: CascadeProgress) -> bool:
+        entity_client = getattr(self.client.entities, entity)
+        async with semaphore:
+            records = await entity_client.filter({'challenge_id': challenge_id}, fields=['id'])
+
+        async def delete_record(record_id: str) -> bool:
+            trade_id = record_id if entity == 'Trade' else None
+            async with semaphore:
+                try:
+                    deleted = await entity_client.delete(record_id)
+                except Exception as e:
+                    progress.fail(challenge_id, str(e), trade_id)
+                    return False
+            if not deleted:
+                progress.fail(challenge_id, 'Failed to delete trade' if trade_id else f'Failed to delete {entity} {record_id}',
+                              trade_id)
+            elif entity == 'Trade':
+                progress.trades_deleted += 1
+            return deleted
+
+        results = await asyncio.gather(*(delete_record(record['id']) for record in records))
+        return all(results)
+
+    async def _delete_children(self, entity: str, challenge_id: str, semaphore: asyncio.Semaphore,
+                               progress: CascadeProgress) -> bool:
+        """Delete a challenge's records of entity in one bulk call, else one by one"""
+        async with semaphore:
+            deleted = await getattr(self.client.entities, entity).bulk_delete_by_filter(
+                {'challenge_id': challenge_id}
+            )
+        if deleted is None:
+            return await self._delete_one_by_one(entity, challenge_id, semaphore, progress)
+        if entity == 'Trade':
+            progress.trades_deleted += deleted
+        return True
+
+    async def _delete_challenge(self, challenge_id: str, semaphore: asyncio.Semaphore,
+                                progress: CascadeProgress):
+        try:
+            if not await self._delete_children('Trade', challenge_id, semaphore, progress):
+                progress.fail(challenge_id, 'Challenge kept because some trades could not be deleted')
+                return
+            for entity in CHALLENGE_CHILD_ENTITIES:
+                if not await self._delete_children(entity, challenge_id, semaphore, progress):
+                    progress.fail(challenge_id, f'Challenge kept because some {entity} records could not be deleted')
+                    return
+
+            async with semaphore:
+                deleted = await self.client.entities.Challenge.delete(challenge_id)
+            if deleted:
+                progress.challenges_deleted += 1
+            else:
+                progress.fail(challenge_id, 'Failed to delete challenge')
+        except Exception as e:
+            logging.error(f'Cascade delete of challenge {challenge_id} failed: {e}')
+            progress.fail(challenge_id, str(e))
+
+    async def delete_challenges(self, challenge_ids: List[str],
+                                progress: Optional[CascadeProgress] = None) -> CascadeProgress:
+        """Delete every challenge in challenge_ids together with its trades and ledger records"""
+        progress = progress or CascadeProgress()
+        progress.challenges_total = len(challenge_ids)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            await asyncio.gather(*(
+                self._delete_challenge(challenge_id, semaphore, progress)
+                for challenge_id in challenge_ids
+            ))
+        finally:
+            progress.finished_at = time.time()
+        return progress
+
+
+class CascadeJobs:
+    """Runs cascade deletes in the background and keeps their progress for polling"""
+
+    def __init__(self, deleter: CascadeDeleter, ttl: float = CASCADE_JOB_TTL, maxsize: int = 1000):
+        self.deleter = deleter
+        self._jobs = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def start(self, challenge_ids: List[str], owner: Optional[str] = None) -> str:
+        """Schedule a cascade delete on the pool loop and return its job id"""
+        job_id = str(uuid.uuid4())
+        progress = CascadeProgress(len(challenge_ids))
+        self._jobs.set(job_id, {'owner': owner, 'progress': progress})
+        self.deleter.client.pool.submit(self.deleter.delete_challenges(challenge_ids, progress))
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        return {'jobId': job_id, 'owner': job['owner'], **job['progress'].to_dict()}
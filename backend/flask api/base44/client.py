@@ -0,0 +1,192 @@
+import hashlib
+import json
+import logging
+from typing import Dict, Any, Optional, List
+
+from common.singleflight import SingleFlight
+
+from .auth import TokenCache, AuthServiceError
+from .http import HttpPool, HttpResponse, get_pool
+
+ENTITY_NAMES = ('Challenge', 'Trade', 'Payment', 'Post', 'Comment', 'Like', 'Course', 'CourseProgress',
+                'TradeEvent', 'ChallengeSnapshot')
+
+
+class EntityClient:
+    """CRUD and bulk operations for one Base44 entity type (e.g. base44.entities.Trade)"""
+
+    def __init__(self, client: 'Base44Client', name: str):
+        self.client = client
+        self.name = name
+        self.url = f"{client.base_url}/entities/{name}"
+
+    async def _send(self, method: str, url: str, json: Any = None,
+                    params: Optional[Dict[str, Any]] = None) -> HttpResponse:
+        return await self.client.pool.request(
+            method, url,
+            headers=self.client.service_headers,
+            json=json,
+            params=params
+        )
+
+    async def filter(self, filters: Dict[str, Any], fields: Optional[List[str]] = None,
+                     limit: Optional[int] = None, sort: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Records matching filters, optionally projected to fields and capped at limit"""
+        params = {}
+        if fields:
+            params['fields'] = ','.join(fields)
+        if limit is not None:
+            params['limit'] = limit
+        if sort:
+            params['sort'] = sort
+        response = await self._send('POST', f"{self.url}/filter", json=filters, params=params or None)
+        if response.status == 200:
+            return response.data or []
+        return []
+
+    async def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        response = await self._send('GET', f"{self.url}/{record_id}")
+        if response.status == 200:
+            return response.data
+        return None
+
+    async def create(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        response = await self._send('POST', self.url, json=data)
+        if response.status == 200:
+            return response.data or {}
+        return {}
+
+    async def update(self, record_id: str, updates: Dict[str, Any]) -> bool:
+        response = await self._send('PUT', f"{self.url}/{record_id}", json=updates)
+        return response.status == 200
+
+    async def delete(self, record_id: str) -> bool:
+        response = await self._send('DELETE', f"{self.url}/{record_id}")
+        return response.status == 200
+
+    async def bulk_create(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create many records in one call; returns the created records"""
+        if not records:
+            return []
+        response = await self._send('POST', f"{self.url}/bulk", json=records)
+        if response.status == 200:
+            return response.data or []
+        return []
+
+    async def bulk_update(self, updates: List[Dict[str, Any]]) -> bool:
+        """Apply per-record updates in one call; each update must carry the record 'id'"""
+        if not updates:
+            return True
+        if any('id' not in update for update in updates):
+            raise ValueError('bulk_update requires an id on every update')
+        response = await self._send('PUT', f"{self.url}/bulk", json=updates)
+        return response.status == 200
+
+    async def bulk_delete_by_filter(self, filters: Dict[str, Any]) -> Optional[int]:
+        """Delete every record matching filters in one call.
+
+        Returns the number of deleted records, or None if the call failed.
+        """
+        if not filters:
+            raise ValueError('bulk_delete_by_filter refuses an empty filter')
+        response = await self._send('POST', f"{self.url}/bulk-delete", json=filters)
+        if response.status != 200:
+            return None
+        data = response.data or {}
+        return int(data.get('deleted', 0)) if isinstance(data, dict) else 0
+
+
+class Entities:
+    """Attribute access to entity clients, e.g. client.entities.Trade"""
+
+    def __init__(self, client: 'Base44Client'):
+        self._client = client
+        self._entities: Dict[str, EntityClient] = {}
+
+    def __getattr__(self, name: str) -> EntityClient:
+        if name not in ENTITY_NAMES:
+            raise AttributeError(f"Unknown Base44 entity: {name}")
+        if name not in self._entities:
+            self._entities[name] = EntityClient(self._client, name)
+        return self._entities[name]
+
+
+class Base44Client:
+    """Shared Base44 client used by every microservice"""
+
+    def __init__(self, api_key: str, base_url: str, pool: Optional[HttpPool] = None,
+                 token_cache: Optional[TokenCache] = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.pool = pool or get_pool()
+        self.token_cache = token_cache or TokenCache()
+        self.llm_flight = SingleFlight()
+        self.entities = Entities(self)
+
+    @property
+    def service_headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    async def get_user_from_request(self, req) -> Optional[Dict[str, Any]]:
+        """Get authenticated user from request"""
+        return await self.authenticate(req.headers.get('Authorization'))
+
+    async def authenticate(self, auth_header: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Get the user behind an Authorization header value"""
+        if not auth_header:
+            return None
+
+        try:
+            return await self.token_cache.verify(auth_header, self._fetch_user)
+        except AuthServiceError as e:
+            logging.warning(f'Auth service unavailable: {e}')
+            return None
+
+    async def _fetch_user(self, auth_header: str) -> Optional[Dict[str, Any]]:
+        response = await self.pool.request(
+            'GET', f"{self.base_url}/auth/me",
+            headers={"Authorization": auth_header}
+        )
+        if response.status == 200:
+            return response.data
+        if response.status in (401, 403):
+            return None
+        raise AuthServiceError(f'auth/me returned {response.status}')
+
+    async def invoke_function(self, function_name: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Invoke Base44 function"""
+        response = await self.pool.request(
+            'POST', f"{self.base_url}/functions/{function_name}",
+            headers=self.service_headers,
+            json=data
+        )
+        if response.status == 200:
+            return response.data or {}
+        return {}
+
+    async def invoke_llm(self, prompt: str, add_context: bool = False,
+                         schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Invoke the Core.InvokeLLM integration.
+
+        Identical concurrent prompts share one upstream call.
+        """
+        payload = {
+            'prompt': prompt,
+            'add_context_from_internet': add_context
+        }
+
+        if schema:
+            payload['response_json_schema'] = schema
+
+        key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        return await self.llm_flight.do(key, lambda: self._invoke_llm(payload))
+
+    async def _invoke_llm(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = await self.pool.request(
+            'POST', f"{self.base_url}/integrations/Core/InvokeLLM",
+            headers=self.service_headers,
+            json=payload
+        )
+        if response.status == 200:
+            return response.data or {}
+        return {}
@@ -0,0 +1,271 @@
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Awaitable, TypeVar
+
+import aiohttp
+
+T = TypeVar('T')
+
+HTTP_POOL_LIMIT = int(os.environ.get('HTTP_POOL_LIMIT', 100))
+HTTP_POOL_LIMIT_PER_HOST = int(os.environ.get('HTTP_POOL_LIMIT_PER_HOST', 20))
+HTTP_POOL_DNS_TTL = int(os.environ.get('HTTP_POOL_DNS_TTL', 300))
+HTTP_POOL_KEEPALIVE = float(os.environ.get('HTTP_POOL_KEEPALIVE', 30))
+HTTP_POOL_TIMEOUT = float(os.environ.get('HTTP_POOL_TIMEOUT', 30))
+
+
+@dataclass(frozen=True)
+class HttpResponse:
+    """Status code and decoded JSON body (None if the body was empty or not JSON)"""
+    status: int
+    data: Any = None
+
+
+class BackgroundLoop:
+    """Event loop running forever on a daemon thread.
+
+    Flask runs every async view on a fresh event loop, so loop-bound objects
+    (sessions, locks, tasks) that must outlive a request live here instead.
+    """
+
+    def __init__(self, name: str = 'base44-loop'):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def in_loop(self) -> bool:
+        """True when called from a coroutine already running on this loop"""
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def submit(self, coro: Awaitable[T]) -> 'concurrent.futures.Future[T]':
+        """Schedule a coroutine on the loop from any thread.
+
+        Like asyncio.run_coroutine_threadsafe, except that a task which
+        fails after its caller gave up (e.g. an aiohttp timeout racing a
+        caller's wait_for) doesn't leave an unretrieved exception behind.
+        """
+        future: 'concurrent.futures.Future[T]' = concurrent.futures.Future()
+
+        def copy_state(task: asyncio.Task):
+            error = None if task.cancelled() else task.exception()
+            try:
+                if task.cancelled():
+                    future.cancel()
+                elif error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(task.result())
+            except concurrent.futures.InvalidStateError:
+                pass  # the caller already cancelled
+
+        def start():
+            if future.cancelled():
+                coro.close()
+                return
+            task = self.loop.create_task(coro)
+            task.add_done_callback(copy_state)
+            future.add_done_callback(
+                lambda f: f.cancelled() and self.loop.call_soon_threadsafe(task.cancel)
+            )
+
+        self.loop.call_soon_threadsafe(start)
+        return future
+
+    async def run(self, coro: Awaitable[T]) -> T:
+        """Await a coroutine on the loop from any other event loop"""
+        if self.in_loop():
+            return await coro
+        return await asyncio.wrap_future(self.submit(coro))
+
+    async def _cancel_tasks(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self, timeout: float = 5):
+        """Cancel long-running tasks (pollers, refreshers) and stop the loop"""
+        if self.loop.is_closed():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._cancel_tasks(), self.loop).result(timeout)
+        except Exception as e:
+            logging.warning(f'Error cancelling background tasks: {e}')
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self.loop.close()
+
+
+class HttpPool:
+    """Process-wide pooled aiohttp session with keep-alive and DNS caching"""
+
+    def __init__(self, limit: int = HTTP_POOL_LIMIT, limit_per_host: int = HTTP_POOL_LIMIT_PER_HOST,
+                 dns_ttl: int = HTTP_POOL_DNS_TTL, keepalive_timeout: float = HTTP_POOL_KEEPALIVE,
+                 timeout: float = HTTP_POOL_TIMEOUT):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self._background = BackgroundLoop('base44-http')
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'errors': 0,
+            'in_flight': 0,
+            'connections_created': 0,
+            'connections_reused': 0,
+            'dns_cache_hits': 0,
+            'dns_cache_misses': 0,
+            'total_latency_ms': 0.0
+        }
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._background.loop
+
+    def submit(self, coro: Awaitable[T]) -> 'concurrent.futures.Future[T]':
+        """Schedule a coroutine on the pool loop from any thread"""
+        return self._background.submit(coro)
+
+    async def run(self, coro: Awaitable[T]) -> T:
+        """Await a coroutine on the pool loop from the caller's event loop"""
+        return await self._background.run(coro)
+
+    def _count(self, key: str, amount: float = 1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        def counter(key):
+            async def hook(session, ctx, params):
+                self._count(key)
+            return hook
+
+        trace.on_connection_create_end.append(counter('connections_created'))
+        trace.on_connection_reuseconn.append(counter('connections_reused'))
+        trace.on_dns_cache_hit.append(counter('dns_cache_hits'))
+        trace.on_dns_cache_miss.append(counter('dns_cache_misses'))
+        return trace
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Only ever called on the pool loop, so no locking is needed
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[self._trace_config()]
+            )
+        return self._session
+
+    async def _request(self, method: str, url: str, timeout: Optional[float] = None,
+                       **kwargs) -> HttpResponse:
+        if self._closed:
+            raise RuntimeError('HTTP pool is closed')
+        session = self._get_session()
+        if timeout is not None:
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+
+        self._count('requests')
+        self._count('in_flight')
+        started = time.perf_counter()
+        try:
+            async with session.request(method, url, **kwargs) as response:
+                try:
+                    data = await response.json(content_type=None)
+                except ValueError:
+                    data = None
+                return HttpResponse(response.status, data)
+        except Exception:
+            self._count('errors')
+            raise
+        finally:
+            self._count('in_flight', -1)
+            self._count('total_latency_ms', (time.perf_counter() - started) * 1000)
+
+    async def request(self, method: str, url: str, *, headers: Optional[Dict[str, str]] = None,
+                      json: Any = None, params: Optional[Dict[str, Any]] = None,
+                      timeout: Optional[float] = None) -> HttpResponse:
+        """Send a request over the shared session and return its decoded response"""
+        return await self.run(self._request(
+            method, url, headers=headers, json=json, params=params, timeout=timeout
+        ))
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool counters and configured limits"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        total_latency = stats.pop('total_latency_ms')
+        stats['avg_latency_ms'] = round(total_latency / stats['requests'], 2) if stats['requests'] else 0
+        opened = stats['connections_created'] + stats['connections_reused']
+        stats['connection_reuse_ratio'] = round(stats['connections_reused'] / opened, 3) if opened else 0
+        stats.update({
+            'limit': self.limit,
+            'limit_per_host': self.limit_per_host,
+            'dns_ttl': self.dns_ttl,
+            'keepalive_timeout': self.keepalive_timeout,
+            'closed': self._closed
+        })
+        return stats
+
+    async def _close_session(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def close(self, timeout: float = 5):
+        """Close the session and stop the pool loop; safe to call more than once"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.submit(self._close_session()).result(timeout)
+        except Exception as e:
+            logging.warning(f'Error closing HTTP pool: {e}')
+        self._background.stop(timeout)
+
+
+_pool: Optional[HttpPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> HttpPool:
+    """Return the process-wide HTTP pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HttpPool()
+                atexit.register(close_pool)
+    return _pool
+
+
+def close_pool():
+    """Shut down the process-wide HTTP pool if it was started"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
@@ -0,0 +1,5 @@
+from .cache import TTLCache
+from .idempotency import IdempotencyStore
+from .singleflight import SingleFlight
+
+__all__ = ['TTLCache', 'SingleFlight', 'IdempotencyStore']
@@ -0,0 +1,176 @@
+import asyncio
+import concurrent.futures
+import functools
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from flask import Response, jsonify, make_response, request
+
+from .cache import TTLCache
+from .singleflight import LeaderCancelled
+
+IDEMPOTENCY_MAX_KEYS = int(os.environ.get('IDEMPOTENCY_MAX_KEYS', 10000))
+IDEMPOTENCY_TTL = float(os.environ.get('IDEMPOTENCY_TTL', 86400))
+# How long a retry waits for the original request to finish before answering 409
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', 30))
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+# For callers that can only send a JSON body (e.g. base44.functions.invoke)
+IDEMPOTENCY_BODY_FIELD = 'idempotencyKey'
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# (body, status, mimetype) of a finished response
+StoredResponse = Tuple[bytes, int, str]
+
+
+def _cacheable(status: int) -> bool:
+    """Successes and client errors are final; server errors, auth failures and rate limits are
+    worth retrying for real"""
+    return status < 500 and status not in (401, 429)
+
+
+class IdempotencyStore:
+    """Remembers the responses of requests sent with an idempotency key.
+
+    The first request with a key runs; requests with the same key that
+    arrive while it runs wait for its response (up to ``wait_timeout``
+    seconds), and those that arrive later get the stored response for
+    ``ttl`` seconds, without running the request again. At most
+    ``maxsize`` completed responses are kept, least recently used first
+    out. Keys are scoped to the route and the caller's credentials, and a
+    key reused with a different request body is rejected. Like
+    SingleFlight it works across the per-request event loops Flask runs
+    async views on, and if the first request is cancelled before it
+    finishes, a waiting retry runs the request in its place.
+    """
+
+    def __init__(self, maxsize: int = IDEMPOTENCY_MAX_KEYS, ttl: float = IDEMPOTENCY_TTL,
+                 wait_timeout: float = IDEMPOTENCY_WAIT_TIMEOUT):
+        self.wait_timeout = wait_timeout
+        self._done = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._in_flight: Dict[Hashable, Tuple[str, concurrent.futures.Future]] = {}
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'replayed': 0, 'waited': 0, 'conflicts': 0, 'leader_cancellations': 0}
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    async def run(self, key: Hashable, fingerprint: str,
+                  call: Callable[[], Any]) -> Tuple[Optional[StoredResponse], str]:
+        """The response for key and how it was obtained: 'ran', 'replayed' or 'waited'; None with
+        'mismatch' if key was used for a different request, or with 'timeout' if it is still running"""
+        self._count('requests')
+        deadline = None
+        while True:
+            with self._lock:
+                done = self._done.get(key)
+                running = None
+                if done is None:
+                    running = self._in_flight.get(key)
+                    if running is None:
+                        future = concurrent.futures.Future()
+                        self._in_flight[key] = (fingerprint, future)
+
+            if done is not None:
+                done_fingerprint, response = done
+                if done_fingerprint != fingerprint:
+                    self._count('conflicts')
+                    return None, 'mismatch'
+                self._count('replayed')
+                return response, 'replayed'
+
+            if running is None:
+                break
+            running_fingerprint, running_future = running
+            if running_fingerprint != fingerprint:
+                self._count('conflicts')
+                return None, 'mismatch'
+            if deadline is None:
+                self._count('waited')
+                deadline = time.monotonic() + self.wait_timeout
+            waiting = asyncio.wrap_future(running_future)
+            # Outlives a retry that gives up; its outcome is retrieved here so it isn't logged as lost
+            waiting.add_done_callback(lambda f: f.cancelled() or f.exception())
+            try:
+                # Shielded so a retry that gives up doesn't cancel the original
+                response = await asyncio.wait_for(asyncio.shield(waiting), max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                return None, 'timeout'
+            except LeaderCancelled:
+                continue  # the original never finished, so nothing ran twice: run it here (or wait again)
+            return response, 'waited'
+
+        try:
+            response = await call()
+        except asyncio.CancelledError:
+            # Cancelled (e.g. the client went away): waiting retries take over instead of failing with it
+            with self._lock:
+                self._stats['leader_cancellations'] += 1
+                self._in_flight.pop(key, None)
+            future.set_exception(LeaderCancelled())
+            raise
+        except BaseException as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            if _cacheable(response[1]):
+                self._done.set(key, (fingerprint, response))
+            self._in_flight.pop(key, None)
+        future.set_result(response)
+        return response, 'ran'
+
+    def idempotent(self, scope: str):
+        """Decorate an async Flask view so requests carrying an idempotency key (the
+        Idempotency-Key header or an idempotencyKey JSON field) run at most once per key"""
+        def decorator(view):
+            @functools.wraps(view)
+            async def wrapper(*args, **kwargs):
+                data = request.get_json(silent=True)
+                idempotency_key = request.headers.get(IDEMPOTENCY_HEADER) or (
+                    data.get(IDEMPOTENCY_BODY_FIELD) if isinstance(data, dict) else None
+                )
+                if not idempotency_key:
+                    return await view(*args, **kwargs)
+                if not isinstance(idempotency_key, str) or len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                    return jsonify({
+                        'error': f'Idempotency key must be a string of at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters',
+                        'success': False
+                    }), 400
+
+                caller = hashlib.sha256(request.headers.get('Authorization', '').encode()).hexdigest()
+                fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+                async def call() -> StoredResponse:
+                    response = make_response(await view(*args, **kwargs))
+                    return response.get_data(), response.status_code, response.mimetype
+
+                stored, outcome = await self.run((scope, caller, idempotency_key), fingerprint, call)
+                if outcome == 'mismatch':
+                    return jsonify({
+                        'error': 'Idempotency key was already used for a different request',
+                        'success': False
+                    }), 422
+                if outcome == 'timeout':
+                    return jsonify({
+                        'error': 'A request with this idempotency key is still in progress',
+                        'success': False
+                    }), 409
+                body, status, mimetype = stored
+                response = Response(body, status=status, mimetype=mimetype)
+                if outcome != 'ran':
+                    response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._in_flight)
+        stats['stored'] = self._done.stats()
+        return stats
@@ -0,0 +1,74 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar('T')
+
+
+class LeaderCancelled(Exception):
+    """Handed to the callers waiting on a call whose leader was cancelled before it finished"""
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one in-flight call.
+
+    The first caller for a key (the leader) runs the call; callers that
+    arrive while it is in flight await the leader's result instead of
+    issuing their own. If the leader is cancelled (e.g. by a timeout of its
+    own), the callers waiting on it start the call over rather than being
+    cancelled with it. Works across event loops and threads, since Flask
+    runs each async view on its own loop.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'coalesced': 0, 'errors': 0, 'leader_cancellations': 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        while True:
+            with self._lock:
+                self._stats['calls'] += 1
+                future = self._calls.get(key)
+                leader = future is None
+                if leader:
+                    future = concurrent.futures.Future()
+                    self._calls[key] = future
+                else:
+                    self._stats['coalesced'] += 1
+
+            if leader:
+                break
+            try:
+                # Shielded so a cancelled follower doesn't cancel the shared call
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except LeaderCancelled:
+                continue  # the call was abandoned, not failed: run it (or join whoever does)
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # The leader's cancellation is its own; its followers retry instead of being cancelled too
+            with self._lock:
+                self._stats['leader_cancellations'] += 1
+                self._calls.pop(key, None)
+            future.set_exception(LeaderCancelled())
+            raise
+        except BaseException as e:
+            with self._lock:
+                self._stats['errors'] += 1
+                self._calls.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._calls.pop(key, None)
+        future.set_result(result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        stats['upstream_calls'] = stats['calls'] - stats['coalesced']
+        return stats
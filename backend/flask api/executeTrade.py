@@ -1,88 +1,72 @@
 from flask import Flask, request, jsonify
 from datetime import datetime
+import hmac
+import math
 import os
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import json
 
+from base44 import Base44Client
+from trading import TradingError, ChallengeSweeper, get_engine
+from trading.sweeper import SWEEP_ENABLED
+import closeTrade
+from closeTrade import close_trade, idempotency
+
 app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 
 BASE44_API_KEY = os.environ.get('BASE44_API_KEY')
 BASE44_API_URL = os.environ.get('BASE44_API_URL', 'https://api.base44.com')
+EXECUTE_BATCH_MAX_ORDERS = int(os.environ.get('EXECUTE_BATCH_MAX_ORDERS', 100))
+REBUILD_MAX_CHALLENGES = int(os.environ.get('REBUILD_MAX_CHALLENGES', 1000))
+# Shared with fetchMarketData, the only caller allowed to send price ticks; unset, ticks are refused
+MARKET_FEED_SECRET = os.environ.get('MARKET_FEED_SECRET')
+MARKET_FEED_HEADER = 'X-Market-Feed-Secret'
 
-class Base44Client:
-    def __init__(self, api_key: str, base_url: str):
-        self.api_key = api_key
-        self.base_url = base_url
-    
-    async def get_user_from_request(self, req) -> Optional[Dict[str, Any]]:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header:
-            return None
-        
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self.base_url}/auth/me",
-                headers={"Authorization": auth_header}
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                return None
-    
-    async def filter_challenges(self, filters: Dict[str, Any]) -> list:
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/entities/Challenge/filter",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json=filters
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                return []
-    
-    async def create_trade(self, trade_data: Dict[str, Any]) -> Dict[str, Any]:
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/entities/Trade",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json=trade_data
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                return {}
-    
-    async def update_challenge(self, challenge_id: str, updates: Dict[str, Any]) -> bool:
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            async with session.put(
-                f"{self.base_url}/entities/Challenge/{challenge_id}",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json=updates
-            ) as response:
-                return response.status == 200
-    
-    async def invoke_function(self, function_name: str, data: Dict[str, Any]) -> Dict[str, Any]:
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/functions/{function_name}",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json=data
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                return {}
+REQUIRED_ORDER_FIELDS = ['challengeId', 'symbol', 'side', 'quantity', 'price']
+# Optional stop-loss/take-profit levels: prices, or percentages of the entry price as getAISignals suggests
+LEVEL_FIELDS = {
+    'stopLoss': 'stop_loss',
+    'takeProfit': 'take_profit',
+    'stopLossPct': 'stop_loss_pct',
+    'takeProfitPct': 'take_profit_pct'
+}
 
 base44_client = Base44Client(
     api_key=BASE44_API_KEY,
     base_url=BASE44_API_URL
 )
 
+engine = get_engine(base44_client, 'trades')
+closeTrade.use_engine(engine)
+
+def from_market_feed() -> bool:
+    """Whether the current request carries the market data service's shared secret"""
+    supplied = request.headers.get(MARKET_FEED_HEADER, '')
+    return bool(MARKET_FEED_SECRET) and hmac.compare_digest(supplied.encode(), MARKET_FEED_SECRET.encode())
+
+def parse_levels(data: Dict[str, Any]) -> Tuple[Dict[str, float], Optional[str]]:
+    """Engine levels from a request's stop-loss/take-profit fields, or the reason they are invalid"""
+    levels = {}
+    for field, key in LEVEL_FIELDS.items():
+        if data.get(field) is None:
+            continue
+        try:
+            levels[key] = float(data[field])
+        except (TypeError, ValueError):
+            return {}, f'{field} must be a number'
+        if levels[key] <= 0:
+            return {}, f'{field} must be positive'
+    return levels, None
+
+# Rules and the daily rollover for every active challenge, including those no one trades
+sweeper = ChallengeSweeper(base44_client.pool, base44_client, engine)
+if SWEEP_ENABLED:
+    sweeper.start()
+
 @app.route('/execute_trade', methods=['POST'])
+@idempotency.idempotent('execute_trade')
 async def execute_trade():
     try:
         user = await base44_client.get_user_from_request(request)
@@ -94,8 +78,7 @@ async def execute_trade():
             return jsonify({'error': 'Invalid JSON data'}), 400
 
         # Validate inputs
-        required_fields = ['challengeId', 'symbol', 'side', 'quantity', 'price']
-        missing_fields = [field for field in required_fields if not data.get(field)]
+        missing_fields = [field for field in REQUIRED_ORDER_FIELDS if not data.get(field)]
         
         if missing_fields:
             return jsonify({
@@ -108,77 +91,233 @@ async def execute_trade():
         side = data['side']
         quantity = float(data['quantity'])
         price = float(data['price'])
+        levels, error = parse_levels(data)
+        if error:
+            return jsonify({'error': error, 'success': False}), 400
 
-        # Get the challenge
-        challenges = await base44_client.filter_challenges({
-            'id': challenge_id,
-            'created_by': user.get('email')
+        # Applied in memory and acknowledged once journaled; persisted write-behind
+        trade, evaluation = await engine.open_trade(
+            user.get('email'), challenge_id, symbol, side, quantity, price, levels
+        )
+
+        return jsonify({
+            'success': True,
+            'trade': trade,
+            'evaluation': evaluation
         })
 
-        if not challenges:
-            return jsonify({
-                'error': 'Challenge not found',
-                'success': False
-            }), 404
+    except TradingError as error:
+        return jsonify({
+            'error': error.message,
+            'success': False
+        }), error.status
+    except Exception as error:
+        logging.error(f'Trade execution error: {error}', exc_info=True)
+        return jsonify({
+            'error': str(error),
+            'success': False
+        }), 500
+
+def parse_order(order: Any) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Engine order from one entry of a batch, or the reason it is invalid"""
+    if not isinstance(order, dict):
+        return None, 'Order must be an object'
+    missing_fields = [field for field in REQUIRED_ORDER_FIELDS if not order.get(field)]
+    if missing_fields:
+        return None, f'Missing required fields: {", ".join(missing_fields)}'
+    try:
+        quantity, price = float(order['quantity']), float(order['price'])
+    except (TypeError, ValueError):
+        return None, 'quantity and price must be numbers'
+    levels, error = parse_levels(order)
+    if error:
+        return None, error
+    return {
+        'challenge_id': order['challengeId'],
+        'symbol': order['symbol'],
+        'side': order['side'],
+        'quantity': quantity,
+        'price': price,
+        'levels': levels
+    }, None
 
-        challenge = challenges[0]
+@app.route('/execute_trades', methods=['POST'])
+@idempotency.idempotent('execute_trades')
+async def execute_trades():
+    """Open a batch of orders across one or more challenges with one auth and one round trip"""
+    try:
+        user = await base44_client.get_user_from_request(request)
+        if not user:
+            return jsonify({'error': 'Unauthorized'}), 401
 
-        # Check if challenge is active
-        if challenge.get('status') != 'active':
+        data = request.get_json()
+        orders = data.get('orders') if isinstance(data, dict) else None
+        if not isinstance(orders, list) or not orders:
+            return jsonify({'error': 'orders must be a non-empty array', 'success': False}), 400
+        if len(orders) > EXECUTE_BATCH_MAX_ORDERS:
             return jsonify({
-                'error': 'Challenge is not active',
+                'error': f'At most {EXECUTE_BATCH_MAX_ORDERS} orders per batch',
                 'success': False
             }), 400
 
-        # Calculate trade cost
-        trade_cost = quantity * price
+        results: List[Optional[Dict[str, Any]]] = [None] * len(orders)
+        valid, positions = [], []
+        for index, order in enumerate(orders):
+            parsed, error = parse_order(order)
+            if error:
+                results[index] = {'success': False, 'error': error, 'status': 400}
+            else:
+                valid.append(parsed)
+                positions.append(index)
 
-        # Check if user has enough balance
-        if trade_cost > challenge.get('current_balance', 0):
-            return jsonify({
-                'error': 'Insufficient balance',
-                'success': False
-            }), 400
+        evaluations = {}
+        if valid:
+            # Applied in memory and acknowledged once journaled; persisted write-behind
+            opened, evaluations = await engine.open_trades(user.get('email'), valid)
+            for index, result in zip(positions, opened):
+                results[index] = result
 
-        # Create the trade
-        trade = await base44_client.create_trade({
-            'challenge_id': challenge_id,
-            'symbol': symbol,
-            'side': side,
-            'quantity': quantity,
-            'entry_price': price,
-            'status': 'open',
-            'open_time': datetime.utcnow().isoformat()
+        return jsonify({
+            'success': True,
+            'accepted': sum(1 for result in results if result['success']),
+            'results': results,
+            'evaluations': evaluations
         })
 
-        # Update challenge balance
-        new_balance = challenge.get('current_balance', 0) - trade_cost
+    except Exception as error:
+        logging.error(f'Batch trade execution error: {error}', exc_info=True)
+        return jsonify({
+            'error': str(error),
+            'success': False
+        }), 500
 
-        await base44_client.update_challenge(challenge_id, {
-            'current_balance': new_balance,
-            'equity': new_balance,
-            'total_trades': (challenge.get('total_trades') or 0) + 1,
-            'last_trade_date': datetime.utcnow().isoformat()
-        })
+@app.route('/set_trade_levels', methods=['POST'])
+async def set_trade_levels():
+    """Attach, replace or clear (when none are given) the stop loss and take profit of an open trade"""
+    try:
+        user = await base44_client.get_user_from_request(request)
+        if not user:
+            return jsonify({'error': 'Unauthorized'}), 401
 
-        # Trigger challenge evaluation
-        eval_response = await base44_client.invoke_function('evaluateChallenge', {
-            'challengeId': challenge_id
-        })
+        data = request.get_json()
+        if not data or not data.get('tradeId'):
+            return jsonify({'error': 'Trade ID is required', 'success': False}), 400
+        levels, error = parse_levels(data)
+        if error:
+            return jsonify({'error': error, 'success': False}), 400
 
+        trade = await engine.set_levels(user.get('email'), data['tradeId'], levels)
+        return jsonify({'success': True, 'trade': trade})
+
+    except TradingError as error:
+        return jsonify({
+            'error': error.message,
+            'success': False
+        }), error.status
+    except Exception as error:
+        logging.error(f'Set trade levels error: {error}', exc_info=True)
+        return jsonify({
+            'error': str(error),
+            'success': False
+        }), 500
+
+# Orders for a challenge must reach the process that holds its state, so trades are closed here too
+app.add_url_rule('/close_trade', view_func=close_trade, methods=['POST'])
+
+@app.route('/mark_to_market', methods=['POST'])
+async def mark_to_market():
+    """Price tick from the market data feed: fire crossed SL/TP levels, then revalue open positions.
+
+    Only fetchMarketData, which forwards the prices it fetched upstream,
+    may send ticks (see MARKET_FEED_SECRET).
+    """
+    try:
+        if not from_market_feed():
+            return jsonify({'error': 'Unauthorized', 'success': False}), 401
+
+        data = request.get_json()
+        prices = data.get('prices') if isinstance(data, dict) else None
+        if not isinstance(prices, dict):
+            return jsonify({'error': 'prices must be an object of symbol to price', 'success': False}), 400
+        try:
+            prices = {str(symbol): float(price) for symbol, price in prices.items()}
+        except (TypeError, ValueError):
+            return jsonify({'error': 'prices must be numbers', 'success': False}), 400
+        if not all(math.isfinite(price) and price > 0 for price in prices.values()):
+            return jsonify({'error': 'prices must be positive', 'success': False}), 400
+
+        result = await engine.mark_to_market(prices)
+        return jsonify({'success': True, **result})
+
+    except Exception as error:
+        logging.error(f'Mark to market error: {error}', exc_info=True)
+        return jsonify({
+            'error': str(error),
+            'success': False
+        }), 500
+
+@app.route('/sweep_challenges', methods=['POST'])
+async def sweep_challenges():
+    """Run a challenge sweep now instead of waiting for the next scheduled one (admins only)"""
+    try:
+        user = await base44_client.get_user_from_request(request)
+        if not user or user.get('role') != 'admin':
+            return jsonify({'error': 'Admin access required', 'success': False}), 403
+
+        result = await sweeper.sweep()
+        return jsonify({'success': True, **result})
+
+    except Exception as error:
+        logging.error(f'Challenge sweep error: {error}', exc_info=True)
+        return jsonify({
+            'error': str(error),
+            'success': False
+        }), 500
+
+@app.route('/rebuild_challenges', methods=['POST'])
+async def rebuild_challenges():
+    """Rebuild challenge aggregates from the trade ledger and report (or, with apply, repair) drift;
+    admins only, like the SQL backend's /api/admin/challenges/<id>/rebuild"""
+    try:
+        user = await base44_client.get_user_from_request(request)
+        if not user or user.get('role') != 'admin':
+            return jsonify({'error': 'Admin access required', 'success': False}), 403
+
+        data = request.get_json()
+        challenge_ids = data.get('challengeIds') if isinstance(data, dict) else None
+        if not isinstance(challenge_ids, list) or not challenge_ids:
+            return jsonify({'error': 'challengeIds must be a non-empty array', 'success': False}), 400
+        if len(challenge_ids) > REBUILD_MAX_CHALLENGES:
+            return jsonify({
+                'error': f'At most {REBUILD_MAX_CHALLENGES} challenges per rebuild',
+                'success': False
+            }), 400
+
+        results = await engine.reconcile(list(dict.fromkeys(map(str, challenge_ids))), bool(data.get('apply')))
         return jsonify({
             'success': True,
-            'trade': trade,
-            'evaluation': eval_response.get('data', {})
+            'drifted': sum(1 for result in results if result.get('drift')),
+            'results': results
         })
 
     except Exception as error:
-        logging.error(f'Trade execution error: {error}', exc_info=True)
+        logging.error(f'Challenge rebuild error: {error}', exc_info=True)
         return jsonify({
             'error': str(error),
             'success': False
         }), 500
 
+@app.route('/health', methods=['GET'])
+def health_check():
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.utcnow().isoformat(),
+        'engine': engine.stats(),
+        'sweeper': sweeper.stats(),
+        'idempotency': idempotency.stats(),
+        'http_pool': base44_client.pool.stats()
+    }), 200
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 3002))
     app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_DEBUG', 'False').lower() == 'true')
\ No newline at end of file
@@ -1,256 +1,345 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from datetime import datetime, timedelta
 import os
+import asyncio
 import logging
-import random
 import time
 from typing import Dict, Any, Optional, List
 import json
 
+import numpy as np
+
+from base44 import Base44Client
+from common import SingleFlight
+from market import (
+    QuoteCache, QuoteStream, CandleSeries, TickStore, LiveCandles, Resamplers, TIMEFRAMES, PrefetchScheduler,
+    MarkFeed, ScheduledSnapshot, CSE_HOURS, resample, serialize_quote, synthetic_candles,
+    negotiate, encode_payload, candles_since
+)
+from market.cache import QUOTE_CACHE_TTL
+from market.stream import STREAM_POLL_INTERVAL, STREAM_RETRY_MS
+
 app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 
 BASE44_API_KEY = os.environ.get('BASE44_API_KEY')
 BASE44_API_URL = os.environ.get('BASE44_API_URL', 'https://api.base44.com')
-
-class Base44Client:
-    def __init__(self, api_key: str, base_url: str):
-        self.api_key = api_key
-        self.base_url = base_url
-    
-    async def get_user_from_request(self, req) -> Optional[Dict[str, Any]]:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header:
-            return None
-        
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self.base_url}/auth/me",
-                headers={"Authorization": auth_header}
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                return None
-    
-    async def invoke_llm(self, prompt: str, add_context: bool = False, schema: Dict[str, Any] = None) -> Dict[str, Any]:
-        import aiohttp
-        payload = {
-            'prompt': prompt,
-            'add_context_from_internet': add_context
-        }
-        
-        if schema:
-            payload['response_json_schema'] = schema
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/integrations/Core/InvokeLLM",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json=payload
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                return {}
+YAHOO_CHART_URL = os.environ.get('YAHOO_CHART_URL', 'https://query1.finance.yahoo.com/v8/finance/chart')
+MARKET_FETCH_CONCURRENCY = int(os.environ.get('MARKET_FETCH_CONCURRENCY', 10))
+MARKET_SYMBOL_TIMEOUT = float(os.environ.get('MARKET_SYMBOL_TIMEOUT', 5))
+# Set TICK_STORE_DIR to an empty string to disable the on-disk 1m history
+TICK_STORE_DIR = os.environ.get('TICK_STORE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ticks'))
+# Yahoo only serves 1m bars for the last 7 days, so older tails refetch the default range
+INCREMENTAL_FETCH_MAX_GAP = 7 * 24 * 3600
+SYNTHETIC_CANDLE_COUNT = int(os.environ.get('SYNTHETIC_CANDLE_COUNT', 60))
+SYNTHETIC_CANDLE_VOLATILITY = float(os.environ.get('SYNTHETIC_CANDLE_VOLATILITY', 0.003))
+# Kept warm from the first request on, even before anyone asks for them (the Dashboard's non-CSE tabs)
+PREFETCH_SYMBOLS = [s for s in os.environ.get(
+    'PREFETCH_SYMBOLS', 'BTC-USD,ETH-USD,SOL-USD,BNB-USD,AAPL,TSLA,GOOGL,MSFT,NVDA'
+).split(',') if s]
+# Set SYNTHETIC_CANDLE_SEED to make the synthetic Casablanca candles reproducible
+SYNTHETIC_CANDLE_SEED = os.environ.get('SYNTHETIC_CANDLE_SEED')
 
 base44_client = Base44Client(
     api_key=BASE44_API_KEY,
     base_url=BASE44_API_URL
 )
 
+# Shared by every user, so upstream traffic scales with distinct symbols. Stream polls read
+# through it, so a TTL longer than the poll interval would mostly republish the same quote
+quote_cache = QuoteCache(base44_client.pool, ttl=min(QUOTE_CACHE_TTL, STREAM_POLL_INTERVAL))
+# Concurrent misses and refreshes of the same chart share one Yahoo request
+chart_flight = SingleFlight()
+# Upstream prices are the only source of the trading service's mark-to-market ticks
+mark_feed = MarkFeed(base44_client.pool)
+tick_store = TickStore(TICK_STORE_DIR) if TICK_STORE_DIR else None
+live_candles = LiveCandles(tick_store)
+# Higher timeframes are rolled up from the same 1m bars, never fetched separately
+resamplers = Resamplers(tick_store)
+synthetic_rng = np.random.default_rng(int(SYNTHETIC_CANDLE_SEED) if SYNTHETIC_CANDLE_SEED else None)
+
+CSE_SYMBOLS = ['IAM', 'ATW', 'BCP', 'CIH']
+CSE_FALLBACK_PRICES = {
+    'IAM': {'name': 'Maroc Telecom', 'price': 152.30, 'prev': 151.80},
+    'ATW': {'name': 'Attijariwafa Bank', 'price': 485.50, 'prev': 483.20},
+    'BCP': {'name': 'Banque Centrale Populaire', 'price': 268.70, 'prev': 267.50},
+    'CIH': {'name': 'Crédit Immobilier et Hôtelier', 'price': 325.40, 'prev': 324.10}
+}
+
+async def fetch_international_symbol(symbol: str, interval: str = '1m', chart_range: str = '1d') -> Optional[Dict[str, Any]]:
+    """Fetch one symbol's quote and candles from Yahoo Finance.
+
+    1m bars are kept per symbol in memory (and in the tick store, which
+    seeds them after a restart) and fed to the resamplers. Once a symbol
+    has recent bars, only the window from its last bar onwards is
+    requested and merged in, re-fetching that last bar in case it was
+    still forming. Yahoo leaves previousClose out of such windowed
+    responses, so it is carried over from the cached quote, and without
+    one the full range is fetched.
+    """
+    incremental = interval == '1m'
+    last_time = live_candles.last_time(symbol) if incremental else None
+    cached = quote_cache.get(chart_key(symbol)) if last_time else None
+    known_close = cached.get('previousClose') if cached else None
+    now = int(time.time())
+    windowed = known_close is not None and now - last_time < INCREMENTAL_FETCH_MAX_GAP
+    if windowed:
+        url = f"{YAHOO_CHART_URL}/{symbol}?interval={interval}&period1={last_time}&period2={now}"
+    else:
+        url = f"{YAHOO_CHART_URL}/{symbol}?interval={interval}&range={chart_range}"
+
+    response = await base44_client.pool.request('GET', url, timeout=MARKET_SYMBOL_TIMEOUT)
+    prefetcher.mark_fetched(symbol)
+    if response.status != 200:
+        return None
+    data = response.data or {}
+
+    if not (data.get('chart', {}).get('result') and data['chart']['result'][0]):
+        return None
+
+    result = data['chart']['result'][0]
+    meta = result.get('meta', {})
+    quotes = result.get('indicators', {}).get('quote', [{}])[0]
+    timestamps = result.get('timestamp', [])
+
+    # Get latest price
+    latest_price = meta.get('regularMarketPrice')
+    if latest_price is None and quotes.get('close'):
+        latest_price = quotes['close'][-1]
+
+    previous_close = known_close if windowed else meta.get('previousClose', latest_price)
+    mark_feed.record(symbol, latest_price)
+    change = latest_price - previous_close if latest_price and previous_close else 0
+    change_percent = (change / previous_close * 100) if previous_close != 0 else 0
+
+    # Columnar candles; converted to JSON records only when the response is built
+    candles = CandleSeries.from_yahoo(timestamps, quotes)
+    if incremental:
+        if tick_store is not None:
+            tick_store.append(symbol, candles)
+        resamplers.ingest(symbol, candles)
+        candles = live_candles.merge(symbol, candles)
+    candles = candles.tail(100)
+
+    return {
+        'symbol': symbol,
+        'price': latest_price,
+        'change': change,
+        'changePercent': change_percent,
+        'volume': meta.get('regularMarketVolume', 0),
+        'previousClose': previous_close,
+        'candles': candles
+    }
+
 async def fetch_international_data(symbols: List[str]) -> List[Dict[str, Any]]:
-    """Fetch international market data using yfinance API"""
-    international_data = []
-    
-    for symbol in symbols:
-        if symbol.startswith('IAM') or 'Morocco' in symbol:
-            continue
-
-        try:
-            import aiohttp
-            # Using Yahoo Finance API
-            url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}?interval=1m&range=1d"
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        if data.get('chart', {}).get('result') and data['chart']['result'][0]:
-                            result = data['chart']['result'][0]
-                            meta = result.get('meta', {})
-                            quotes = result.get('indicators', {}).get('quote', [{}])[0]
-                            timestamps = result.get('timestamp', [])
-                            
-                            # Get latest price
-                            latest_price = meta.get('regularMarketPrice')
-                            if latest_price is None and quotes.get('close'):
-                                latest_price = quotes['close'][-1]
-                            
-                            previous_close = meta.get('previousClose', latest_price)
-                            change = latest_price - previous_close if latest_price and previous_close else 0
-                            change_percent = (change / previous_close * 100) if previous_close != 0 else 0
-                            
-                            # Build candlestick data
-                            candles = []
-                            if timestamps and quotes.get('open') and quotes.get('high') and quotes.get('low') and quotes.get('close'):
-                                for i in range(len(timestamps)):
-                                    if (i < len(quotes['open']) and i < len(quotes['high']) and 
-                                        i < len(quotes['low']) and i < len(quotes['close'])):
-                                        candle = {
-                                            'time': timestamps[i],
-                                            'open': quotes['open'][i] or 0,
-                                            'high': quotes['high'][i] or 0,
-                                            'low': quotes['low'][i] or 0,
-                                            'close': quotes['close'][i] or 0,
-                                            'volume': quotes.get('volume', [0])[i] or 0
-                                        }
-                                        candles.append(candle)
-                            
-                            international_data.append({
-                                'symbol': symbol,
-                                'price': latest_price,
-                                'change': change,
-                                'changePercent': change_percent,
-                                'volume': meta.get('regularMarketVolume', 0),
-                                'previousClose': previous_close,
-                                'candles': candles[-100:] if candles else []
-                            })
-        except Exception as e:
-            logging.error(f"Error fetching {symbol}: {str(e)}")
-    
-    return international_data
+    """Fetch international market data using yfinance API.
 
-async def fetch_moroccan_data(symbols: List[str]) -> List[Dict[str, Any]]:
-    """Fetch Moroccan market data using AI"""
-    moroccan_data = []
-    moroccan_symbols = [s for s in symbols if s in ['IAM', 'ATW', 'BCP', 'CIH']]
-    
-    if not moroccan_symbols:
-        return moroccan_data
-    
-    try:
-        stock_prices = await base44_client.invoke_llm(
-            prompt=f"""Get current real stock prices in Moroccan Dirham (MAD) for these Casablanca Stock Exchange symbols: {', '.join(moroccan_symbols)}.
-            IAM = Maroc Telecom (Itissalat Al-Maghrib)
-            ATW = Attijariwafa Bank
-            BCP = Banque Centrale Populaire
-            CIH = Crédit Immobilier et Hôtelier
-            
-            Provide current price, previous close, and calculate change. Use real market data from today {datetime.now().strftime('%Y-%m-%d')}.""",
-            add_context=True,
-            schema={
-                "type": "object",
-                "properties": {
-                    "stocks": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "symbol": {"type": "string"},
-                                "name": {"type": "string"},
-                                "price": {"type": "number"},
-                                "previousClose": {"type": "number"},
-                                "volume": {"type": "number"}
-                            },
-                            "required": ["symbol", "name", "price", "previousClose"]
-                        }
-                    }
-                },
-                "required": ["stocks"]
-            }
-        )
-        
-        for stock in stock_prices.get('stocks', []):
-            price = stock.get('price', 0)
-            previous_close = stock.get('previousClose', price)
-            change = price - previous_close
-            change_percent = (change / previous_close * 100) if previous_close != 0 else 0
-            
-            # Generate realistic intraday candles
-            candles = generate_intraday_candles(previous_close, price)
-            
-            moroccan_data.append({
-                'symbol': stock['symbol'],
-                'name': stock.get('name', ''),
-                'price': price,
-                'change': change,
-                'changePercent': change_percent,
-                'volume': stock.get('volume', random.randint(100000, 300000)),
-                'previousClose': previous_close,
-                'candles': candles,
-                'market': 'Casablanca Stock Exchange',
-                'currency': 'MAD'
-            })
-            
-    except Exception as e:
-        logging.error(f'Error fetching Moroccan market data: {e}')
-        # Fallback data
-        fallback_prices = {
-            'IAM': {'name': 'Maroc Telecom', 'price': 152.30, 'prev': 151.80},
-            'ATW': {'name': 'Attijariwafa Bank', 'price': 485.50, 'prev': 483.20},
-            'BCP': {'name': 'Banque Centrale Populaire', 'price': 268.70, 'prev': 267.50},
-            'CIH': {'name': 'Crédit Immobilier et Hôtelier', 'price': 325.40, 'prev': 324.10}
+    Symbols are served from the shared quote cache; misses are fetched
+    concurrently, at most MARKET_FETCH_CONCURRENCY at a time, each bounded by
+    MARKET_SYMBOL_TIMEOUT. Results keep the order of symbols; symbols that
+    fail or time out are left out.
+    """
+    semaphore = asyncio.Semaphore(MARKET_FETCH_CONCURRENCY)
+
+    async def fetch(symbol: str) -> Optional[Dict[str, Any]]:
+        key = chart_key(symbol)
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(
+                    quote_cache.get_or_fetch(key, lambda: chart_flight.do(key, lambda: fetch_international_symbol(symbol))),
+                    MARKET_SYMBOL_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                logging.warning(f"Timed out fetching {symbol}")
+            except Exception as e:
+                logging.error(f"Error fetching {symbol}: {str(e)}")
+            return None
+
+    international_symbols = [s for s in symbols if not (s in CSE_SYMBOLS or s.startswith('IAM') or 'Morocco' in s)]
+    prefetcher.record(international_symbols)
+    results = await asyncio.gather(*(fetch(symbol) for symbol in international_symbols))
+    return [result for result in results if result]
+
+def chart_key(symbol: str) -> tuple:
+    """Quote cache key of a symbol's default 1m chart"""
+    return (symbol, '1m', '1d')
+
+async def prefetch_symbol(symbol: str):
+    """Refresh a symbol's cached quote ahead of the next request for it"""
+    key = chart_key(symbol)
+    quote = await chart_flight.do(key, lambda: fetch_international_symbol(symbol))
+    if quote is not None:
+        quote_cache.set(key, quote)
+
+# Keeps the most watched symbols warm so tab switches hit the cache, refreshing each before it expires
+prefetcher = PrefetchScheduler(
+    base44_client.pool, prefetch_symbol, pinned=PREFETCH_SYMBOLS, lifetime=quote_cache.ttl + quote_cache.stale_ttl
+)
+
+def build_moroccan_quotes(stocks: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Quotes keyed by symbol for CSE stock prices, with candles generated in one batch"""
+    all_candles = generate_intraday_candles(
+        [stock['previousClose'] for stock in stocks],
+        [stock['price'] for stock in stocks]
+    )
+
+    quotes = {}
+    for stock, candles in zip(stocks, all_candles):
+        price = stock['price']
+        previous_close = stock['previousClose']
+        change = price - previous_close
+        change_percent = (change / previous_close * 100) if previous_close != 0 else 0
+
+        quotes[stock['symbol']] = {
+            'symbol': stock['symbol'],
+            'name': stock['name'],
+            'price': price,
+            'change': change,
+            'changePercent': change_percent,
+            'volume': stock['volume'] or int(synthetic_rng.integers(100000, 300000)),
+            'previousClose': previous_close,
+            'candles': candles,
+            'market': 'Casablanca Stock Exchange',
+            'currency': 'MAD'
         }
-        
-        for symbol in moroccan_symbols:
-            if symbol in fallback_prices:
-                stock_info = fallback_prices[symbol]
-                price = stock_info['price'] + (random.random() - 0.5) * 2
-                previous_close = stock_info['prev']
-                change = price - previous_close
-                change_percent = (change / previous_close * 100) if previous_close != 0 else 0
-                
-                candles = generate_intraday_candles(previous_close, price)
-                
-                moroccan_data.append({
-                    'symbol': symbol,
-                    'name': stock_info['name'],
-                    'price': price,
-                    'change': change,
-                    'changePercent': change_percent,
-                    'volume': random.randint(100000, 300000),
-                    'previousClose': previous_close,
-                    'candles': candles,
-                    'market': 'Casablanca Stock Exchange',
-                    'currency': 'MAD'
-                })
-    
-    return moroccan_data
+    return quotes
 
-def generate_intraday_candles(previous_close: float, current_price: float) -> List[Dict[str, Any]]:
-    """Generate realistic intraday candlestick data"""
-    candles = []
-    now = time.time()
-    
-    for i in range(60):
-        timestamp = int(now - (60 - i) * 60)
-        progress = i / 60
-        base_price = previous_close + (current_price - previous_close) * progress
-        volatility = base_price * 0.003
+async def fetch_cse_snapshot() -> Dict[str, Dict[str, Any]]:
+    """Fetch every CSE symbol's price with one AI call; raises if no prices come back"""
+    stock_prices = await base44_client.invoke_llm(
+        prompt=f"""Get current real stock prices in Moroccan Dirham (MAD) for these Casablanca Stock Exchange symbols: {', '.join(CSE_SYMBOLS)}.
+        IAM = Maroc Telecom (Itissalat Al-Maghrib)
+        ATW = Attijariwafa Bank
+        BCP = Banque Centrale Populaire
+        CIH = Crédit Immobilier et Hôtelier
         
-        open_price = base_price + (random.random() - 0.5) * volatility
-        high_price = base_price + random.random() * volatility * 1.5
-        low_price = base_price - random.random() * volatility * 1.5
-        close_price = base_price + (random.random() - 0.5) * volatility
-        
-        candles.append({
-            'time': timestamp,
-            'open': open_price,
-            'high': high_price,
-            'low': low_price,
-            'close': close_price,
-            'volume': random.randint(50000, 200000)
-        })
-    
-    # Ensure last candle has current price
-    if candles:
-        candles[-1]['close'] = current_price
+        Provide current price, previous close, and calculate change. Use real market data from today {datetime.now().strftime('%Y-%m-%d')}.""",
+        add_context=True,
+        schema={
+            "type": "object",
+            "properties": {
+                "stocks": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "symbol": {"type": "string"},
+                            "name": {"type": "string"},
+                            "price": {"type": "number"},
+                            "previousClose": {"type": "number"},
+                            "volume": {"type": "number"}
+                        },
+                        "required": ["symbol", "name", "price", "previousClose"]
+                    }
+                }
+            },
+            "required": ["stocks"]
+        }
+    )
+
+    stocks = [
+        {
+            'symbol': stock['symbol'],
+            'name': stock.get('name', ''),
+            'price': stock.get('price', 0),
+            'previousClose': stock.get('previousClose', stock.get('price', 0)),
+            'volume': stock.get('volume')
+        }
+        for stock in (stock_prices or {}).get('stocks', [])
+        if stock.get('symbol') in CSE_SYMBOLS
+    ]
+    if not stocks:
+        raise ValueError('No CSE prices returned')
+    for stock in stocks:
+        mark_feed.record(stock['symbol'], stock['price'])
+    return build_moroccan_quotes(stocks)
+
+# Refreshed on the pool loop during CSE trading hours; requests only read memory
+cse_quotes = ScheduledSnapshot(base44_client.pool, fetch_cse_snapshot, CSE_HOURS)
+
+def fallback_moroccan_quotes(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Approximate quotes used until the first CSE snapshot has been fetched"""
+    return build_moroccan_quotes([
+        {
+            'symbol': symbol,
+            'name': CSE_FALLBACK_PRICES[symbol]['name'],
+            'price': CSE_FALLBACK_PRICES[symbol]['price'] + (synthetic_rng.random() - 0.5) * 2,
+            'previousClose': CSE_FALLBACK_PRICES[symbol]['prev'],
+            'volume': None
+        }
+        for symbol in symbols if symbol in CSE_FALLBACK_PRICES
+    ])
+
+async def fetch_moroccan_data(symbols: List[str]) -> List[Dict[str, Any]]:
+    """Moroccan market data from the background-refreshed CSE snapshot.
+
+    Each quote carries asOf, the time (ms) its prices were fetched.
+    """
+    moroccan_symbols = [s for s in symbols if s in CSE_SYMBOLS]
     
-    return candles
+    if not moroccan_symbols:
+        return []
+
+    snapshot = await cse_quotes.get()
+    if snapshot is not None:
+        quotes, fetched_at = snapshot['value'], snapshot['fetchedAt']
+    else:
+        quotes, fetched_at = fallback_moroccan_quotes(moroccan_symbols), time.time()
+
+    as_of = int(fetched_at * 1000)
+    return [{**quotes[symbol], 'asOf': as_of} for symbol in moroccan_symbols if symbol in quotes]
+
+def generate_intraday_candles(previous_closes: List[float], current_prices: List[float]) -> List[CandleSeries]:
+    """Generate realistic intraday candlestick data, one series per (previous close, price) pair"""
+    if not current_prices:
+        return []
+    return synthetic_candles(
+        previous_closes, current_prices,
+        length=SYNTHETIC_CANDLE_COUNT,
+        volatility=SYNTHETIC_CANDLE_VOLATILITY,
+        rng=synthetic_rng
+    )
+
+def with_timeframe(quote: Dict[str, Any], timeframe: str) -> Dict[str, Any]:
+    """Copy of a 1m quote with its candles rolled up to timeframe"""
+    if timeframe == '1m' or not quote.get('candles'):
+        return quote
+    candles = resamplers.series(quote['symbol'], timeframe, 100)
+    if not len(candles):
+        # Not fed to the resamplers (e.g. synthetic Moroccan candles): roll up what we have
+        candles = quote['candles']
+        if not isinstance(candles, CandleSeries):
+            candles = CandleSeries.from_records(candles)
+        candles = resample(candles, TIMEFRAMES[timeframe]).tail(100)
+    return {**quote, 'candles': candles, 'timeframe': timeframe}
+
+async def collect_quotes(symbols: List[str], timeframe: str = '1m') -> List[Dict[str, Any]]:
+    """International and Moroccan quotes for symbols, fetched concurrently; candles stay columnar"""
+    international_data, moroccan_data = await asyncio.gather(
+        fetch_international_data(symbols),
+        fetch_moroccan_data(symbols)
+    )
+    return [with_timeframe(quote, timeframe) for quote in international_data + moroccan_data]
+
+async def fetch_quotes(symbols: List[str], timeframe: str = '1m') -> List[Dict[str, Any]]:
+    """Quotes for symbols with JSON-ready candles"""
+    return [serialize_quote(quote) for quote in await collect_quotes(symbols, timeframe)]
+
+async def fetch_stream_quote(symbol: str) -> Optional[Dict[str, Any]]:
+    quotes = await fetch_quotes([symbol])
+    return quotes[0] if quotes else None
+
+# One upstream poller per symbol, shared by every streaming client
+quote_stream = QuoteStream(base44_client.pool, fetch_stream_quote)
 
 @app.route('/fetch_market_data', methods=['POST'])
 async def fetch_market_data():
+    """Quotes and candles for the requested symbols.
+
+    The encoding follows the Accept header: JSON records by default, or
+    delta-encoded columnar candles as JSON (COLUMNAR_JSON) or MessagePack.
+    With since (unix seconds), only candles from that time on are sent.
+    """
     try:
         user = await base44_client.get_user_from_request(request)
         if not user:
@@ -264,18 +353,34 @@ async def fetch_market_data():
         if not symbols:
             return jsonify({'error': 'No symbols provided'}), 400
 
-        # Fetch international and Moroccan data concurrently
-        import asyncio
-        international_task = asyncio.create_task(fetch_international_data(symbols))
-        moroccan_task = asyncio.create_task(fetch_moroccan_data(symbols))
-        
-        international_data, moroccan_data = await asyncio.gather(international_task, moroccan_task)
+        timeframe = data.get('timeframe', '1m')
+        if timeframe not in TIMEFRAMES:
+            return jsonify({'error': f"timeframe must be one of {', '.join(TIMEFRAMES)}"}), 400
 
-        return jsonify({
+        since = data.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'since must be a unix timestamp in seconds'}), 400
+
+        quotes = [
+            {**quote, 'candles': candles_since(quote.get('candles'), since)}
+            for quote in await collect_quotes(symbols, timeframe)
+        ]
+        payload = {
             'success': True,
-            'data': international_data + moroccan_data,
+            'data': quotes,
             'timestamp': int(time.time() * 1000)
-        })
+        }
+
+        mimetype = negotiate(request.accept_mimetypes)
+        if mimetype == 'application/json':
+            response = jsonify({**payload, 'data': [serialize_quote(quote) for quote in quotes]})
+        else:
+            response = Response(encode_payload(payload, mimetype), mimetype=mimetype)
+        response.headers['Vary'] = 'Accept'
+        return response
 
     except Exception as error:
         logging.error(f'Market data fetch error: {error}', exc_info=True)
@@ -284,6 +389,98 @@ async def fetch_market_data():
             'success': False
         }), 500
 
+@app.route('/stream_market_data', methods=['GET'])
+async def stream_market_data():
+    """Server-sent events: a snapshot per symbol, then deltas as quotes change.
+
+    EventSource can't set headers, so the token may also be passed as the
+    access_token query parameter. Auth happens once, when the stream opens.
+    """
+    auth_header = request.headers.get('Authorization')
+    if not auth_header and request.args.get('access_token'):
+        auth_header = f"Bearer {request.args['access_token']}"
+    user = await base44_client.authenticate(auth_header)
+    if not user:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    symbols = list(dict.fromkeys(s.strip() for s in request.args.get('symbols', '').split(',') if s.strip()))
+    if not symbols:
+        return jsonify({'error': 'No symbols provided'}), 400
+    if len(symbols) > quote_stream.max_symbols:
+        return jsonify({
+            'error': f'A stream covers at most {quote_stream.max_symbols} symbols',
+            'success': False
+        }), 400
+
+    subscription = quote_stream.subscribe(symbols)
+    if subscription is None:
+        response = jsonify({'error': 'Too many open market streams', 'success': False})
+        response.headers['Retry-After'] = str(STREAM_RETRY_MS // 1000)
+        return response, 503
+    return Response(
+        quote_stream.events(subscription),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/market_history', methods=['POST'])
+async def market_history():
+    """Stored 1m bars for one symbol between start and end (unix seconds)"""
+    try:
+        user = await base44_client.get_user_from_request(request)
+        if not user:
+            return jsonify({'error': 'Unauthorized'}), 401
+
+        if tick_store is None:
+            return jsonify({'error': 'Market history is disabled', 'success': False}), 404
+
+        data = request.get_json()
+        if not data or not data.get('symbol'):
+            return jsonify({'error': 'Symbol is required'}), 400
+
+        start = data.get('start')
+        end = data.get('end')
+        limit = int(data['limit']) if data.get('limit') is not None else None
+        if limit is not None and limit < 1:
+            return jsonify({'error': 'limit must be at least 1', 'success': False}), 400
+        candles = tick_store.read(
+            data['symbol'],
+            int(start) if start is not None else None,
+            int(end) if end is not None else None
+        )
+        if limit is not None:
+            candles = candles.tail(limit)
+
+        return jsonify({
+            'success': True,
+            'symbol': data['symbol'],
+            'candles': candles.to_records()
+        })
+
+    except (TypeError, ValueError):
+        return jsonify({'error': 'start, end and limit must be integers', 'success': False}), 400
+    except Exception as error:
+        logging.error(f'Market history error: {error}', exc_info=True)
+        return jsonify({
+            'error': str(error),
+            'success': False
+        }), 500
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.utcnow().isoformat(),
+        'quote_cache': quote_cache.stats(),
+        'chart_singleflight': chart_flight.stats(),
+        'stream': quote_stream.stats(),
+        'mark_feed': mark_feed.stats(),
+        'cse_quotes': cse_quotes.stats(),
+        'prefetch': prefetcher.stats(),
+        'llm_singleflight': base44_client.llm_flight.stats(),
+        'http_pool': base44_client.pool.stats()
+    }), 200
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 3004))
     app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_DEBUG', 'False').lower() == 'true')
\ No newline at end of file
@@ -5,49 +5,14 @@ import time
 from typing import Dict, Any, Optional
 import json
 
+from base44 import Base44Client
+
 app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 
 BASE44_API_KEY = os.environ.get('BASE44_API_KEY')
 BASE44_API_URL = os.environ.get('BASE44_API_URL', 'https://api.base44.com')
 
-class Base44Client:
-    def __init__(self, api_key: str, base_url: str):
-        self.api_key = api_key
-        self.base_url = base_url
-    
-    async def get_user_from_request(self, req) -> Optional[Dict[str, Any]]:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header:
-            return None
-        
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self.base_url}/auth/me",
-                headers={"Authorization": auth_header}
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                return None
-    
-    async def invoke_llm(self, prompt: str, schema: Dict[str, Any] = None) -> Dict[str, Any]:
-        import aiohttp
-        payload = {'prompt': prompt}
-        
-        if schema:
-            payload['response_json_schema'] = schema
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/integrations/Core/InvokeLLM",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json=payload
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                return {}
-
 base44_client = Base44Client(
     api_key=BASE44_API_KEY,
     base_url=BASE44_API_URL
@@ -0,0 +1,21 @@
+from .cache import QuoteCache
+from .candles import CandleSeries, serialize_quote
+from .exchange import ExchangeHours, ScheduledSnapshot, CSE_HOURS
+from .feed import MarkFeed
+from .live import LiveCandles
+from .prefetch import PrefetchScheduler
+from .resample import TIMEFRAMES, Resamplers, SymbolResampler, resample
+from .store import TickStore
+from .synthetic import synthetic_candles
+from .stream import QuoteStream, Subscription, quote_delta
+from .wire import encode_candles, decode_candles, encode_payload, negotiate, candles_since
+
+__all__ = [
+    'QuoteCache', 'CandleSeries', 'serialize_quote',
+    'QuoteStream', 'Subscription', 'quote_delta',
+    'TickStore', 'LiveCandles', 'PrefetchScheduler', 'MarkFeed',
+    'TIMEFRAMES', 'Resamplers', 'SymbolResampler', 'resample',
+    'synthetic_candles',
+    'ExchangeHours', 'ScheduledSnapshot', 'CSE_HOURS',
+    'encode_candles', 'decode_candles', 'encode_payload', 'negotiate', 'candles_since'
+]
@@ -0,0 +1,112 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Callable, Awaitable, Hashable
+
+from common.cache import TTLCache
+
+QUOTE_CACHE_TTL = float(os.environ.get('QUOTE_CACHE_TTL', 15))
+QUOTE_CACHE_STALE_TTL = float(os.environ.get('QUOTE_CACHE_STALE_TTL', 60))
+QUOTE_CACHE_SIZE = int(os.environ.get('QUOTE_CACHE_SIZE', 500))
+
+Fetcher = Callable[[], Awaitable[Optional[Any]]]
+
+
+class QuoteCache:
+    """Process-level quote/candle cache with stale-while-revalidate.
+
+    Entries younger than ``ttl`` are served as-is. Entries up to
+    ``ttl + stale_ttl`` old are still served, but trigger one background
+    refresh on ``runner`` (anything with a ``submit(coro)`` method, e.g. the
+    HTTP pool). Older entries are refetched inline. The cache holds at most
+    ``maxsize`` keys, evicting the least recently used.
+    """
+
+    def __init__(self, runner, ttl: float = QUOTE_CACHE_TTL, stale_ttl: float = QUOTE_CACHE_STALE_TTL,
+                 maxsize: int = QUOTE_CACHE_SIZE):
+        self.runner = runner
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl + stale_ttl)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._stats = {
+            'fresh_hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'refreshes': 0,
+            'refresh_errors': 0
+        }
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Cached value regardless of freshness, without fetching"""
+        entry = self._entries.get(key)
+        return entry[1] if entry else None
+
+    def set(self, key: Hashable, value: Any):
+        self._entries.set(key, (time.monotonic(), value))
+
+    def age(self, key: Hashable) -> Optional[float]:
+        entry = self._entries.get(key)
+        return time.monotonic() - entry[0] if entry else None
+
+    async def _refresh(self, key: Hashable, fetcher: Fetcher):
+        try:
+            value = await fetcher()
+            if value is not None:
+                self.set(key, value)
+        except Exception as e:
+            self._count('refresh_errors')
+            logging.warning(f'Background refresh of {key} failed: {e}')
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _schedule_refresh(self, key: Hashable, fetcher: Fetcher):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            self._stats['refreshes'] += 1
+        self.runner.submit(self._refresh(key, fetcher))
+
+    async def get_or_fetch(self, key: Hashable, fetcher: Fetcher) -> Optional[Any]:
+        """Return the cached value for key, fetching or revalidating it as needed.
+
+        Failed fetches (None or an exception) are never cached.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            fetched_at, value = entry
+            if time.monotonic() - fetched_at < self.ttl:
+                self._count('fresh_hits')
+            else:
+                self._count('stale_hits')
+                self._schedule_refresh(key, fetcher)
+            return value
+
+        self._count('misses')
+        value = await fetcher()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        entries = self._entries.stats()
+        lookups = stats['fresh_hits'] + stats['stale_hits'] + stats['misses']
+        stats.update({
+            'size': entries['size'],
+            'maxsize': entries['maxsize'],
+            'evictions': entries['evictions'],
+            'hit_ratio': round((stats['fresh_hits'] + stats['stale_hits']) / lookups, 3) if lookups else 0,
+            'ttl': self.ttl,
+            'stale_ttl': self.stale_ttl
+        })
+        return stats
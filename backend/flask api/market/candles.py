@@ -0,0 +1,123 @@
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def _column(values: Optional[Sequence], length: int) -> np.ndarray:
+    """First length values as float64, with missing (None/NaN) values set to 0"""
+    if not values:
+        return np.zeros(length)
+    column = np.array(values[:length], dtype=np.float64)
+    if len(column) < length:
+        column = np.concatenate([column, np.zeros(length - len(column))])
+    return np.nan_to_num(column, nan=0.0, copy=False)
+
+
+class CandleSeries:
+    """OHLCV candles held as contiguous NumPy columns (struct of arrays).
+
+    Slicing returns views, so windowing never copies; candles only become
+    a list of dicts in to_records(), at the response boundary.
+    """
+
+    __slots__ = ('time', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, time: np.ndarray, open: np.ndarray, high: np.ndarray,
+                 low: np.ndarray, close: np.ndarray, volume: np.ndarray):
+        self.time = np.asarray(time, dtype=np.int64)
+        self.open = np.asarray(open, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        self.volume = np.asarray(volume, dtype=np.int64)
+
+    @classmethod
+    def empty(cls) -> 'CandleSeries':
+        return cls(np.empty(0, np.int64), *(np.empty(0) for _ in FIELDS[:-1]), np.empty(0, np.int64))
+
+    @classmethod
+    def from_yahoo(cls, timestamps: Sequence[int], quote: Dict[str, Any]) -> 'CandleSeries':
+        """Build from a Yahoo chart result's timestamp list and indicators.quote[0].
+
+        Bars are kept up to the shortest of the timestamp and OHLC lists;
+        missing prices and volumes become 0.
+        """
+        if not timestamps or not all(quote.get(field) for field in ('open', 'high', 'low', 'close')):
+            return cls.empty()
+        length = min(len(timestamps), *(len(quote[field]) for field in ('open', 'high', 'low', 'close')))
+        return cls(
+            np.array(timestamps[:length], dtype=np.int64),
+            *(_column(quote.get(field), length) for field in FIELDS)
+        )
+
+    @classmethod
+    def from_records(cls, candles: List[Dict[str, Any]]) -> 'CandleSeries':
+        if not candles:
+            return cls.empty()
+        return cls(
+            np.fromiter((c['time'] for c in candles), dtype=np.int64, count=len(candles)),
+            *(np.fromiter((c.get(field) or 0 for c in candles), dtype=np.float64, count=len(candles))
+              for field in FIELDS)
+        )
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def __getitem__(self, index) -> 'CandleSeries':
+        if not isinstance(index, slice):
+            index = slice(index, index + 1 or None)
+        return CandleSeries(*(getattr(self, name)[index] for name in self.__slots__))
+
+    def tail(self, count: int) -> 'CandleSeries':
+        """Last count candles, as a view"""
+        return self[-count:] if count < len(self) else self
+
+    def between(self, start: Optional[int] = None, end: Optional[int] = None) -> 'CandleSeries':
+        """Candles with start <= time < end, located by binary search"""
+        lo = 0 if start is None else int(np.searchsorted(self.time, start, side='left'))
+        hi = len(self) if end is None else int(np.searchsorted(self.time, end, side='left'))
+        return self[lo:hi]
+
+    def complete(self) -> 'CandleSeries':
+        """Candles that have a close price; bars still empty upstream are dropped"""
+        mask = self.close != 0
+        if mask.all():
+            return self
+        return CandleSeries(*(getattr(self, name)[mask] for name in self.__slots__))
+
+    def merge(self, newer: 'CandleSeries', max_length: Optional[int] = None) -> 'CandleSeries':
+        """These candles updated with newer ones.
+
+        Candles from newer's first timestamp onwards replace ours, which
+        corrects a last bar that was still forming when it was fetched.
+        """
+        if not len(newer):
+            merged = self
+        elif not len(self):
+            merged = newer
+        else:
+            kept = self.between(end=int(newer.time[0]))
+            merged = CandleSeries(*(
+                np.concatenate([getattr(kept, name), getattr(newer, name)]) for name in self.__slots__
+            ))
+        return merged.tail(max_length) if max_length is not None else merged
+
+    @property
+    def last_close(self) -> Optional[float]:
+        return float(self.close[-1]) if len(self) else None
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """JSON shape used by the API: a list of {time, open, high, low, close, volume}"""
+        columns = [self.time.tolist()] + [getattr(self, field).tolist() for field in FIELDS]
+        keys = ('time',) + FIELDS
+        return [dict(zip(keys, row)) for row in zip(*columns)]
+
+
+def serialize_quote(quote: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a quote dict with any CandleSeries converted to JSON records"""
+    candles = quote.get('candles')
+    if isinstance(candles, CandleSeries):
+        return {**quote, 'candles': candles.to_records()}
+    return quote
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, time as dtime
+from typing import Dict, Any, Optional, Callable, Awaitable, Iterable
+from zoneinfo import ZoneInfo
+
+from common.singleflight import SingleFlight
+
+CSE_TIMEZONE = os.environ.get('CSE_TIMEZONE', 'Africa/Casablanca')
+CSE_OPEN = os.environ.get('CSE_OPEN', '09:30')
+CSE_CLOSE = os.environ.get('CSE_CLOSE', '15:30')
+CSE_REFRESH_INTERVAL = float(os.environ.get('CSE_REFRESH_INTERVAL', 300))
+CSE_RETRY_INTERVAL = float(os.environ.get('CSE_RETRY_INTERVAL', 60))
+
+SnapshotFetcher = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+def _parse_time(value: str) -> dtime:
+    hours, minutes = value.split(':')
+    return dtime(int(hours), int(minutes))
+
+
+class ExchangeHours:
+    """Weekly trading session of an exchange in its local time zone"""
+
+    def __init__(self, timezone: str, open: str, close: str, weekdays: Iterable[int] = range(5)):
+        self.timezone = ZoneInfo(timezone)
+        self.open = _parse_time(open)
+        self.close = _parse_time(close)
+        self.weekdays = frozenset(weekdays)
+
+    def _local(self, now: Optional[float]) -> datetime:
+        return datetime.fromtimestamp(time.time() if now is None else now, self.timezone)
+
+    def is_open(self, now: Optional[float] = None) -> bool:
+        local = self._local(now)
+        return local.weekday() in self.weekdays and self.open <= local.time() < self.close
+
+    def seconds_until_close(self, now: Optional[float] = None) -> float:
+        """Seconds until today's close; 0 when the session is not open"""
+        if not self.is_open(now):
+            return 0.0
+        local = self._local(now)
+        return (datetime.combine(local.date(), self.close, self.timezone) - local).total_seconds()
+
+    def seconds_until_open(self, now: Optional[float] = None) -> float:
+        """Seconds until the next session opens; 0 while it is open"""
+        if self.is_open(now):
+            return 0.0
+        local = self._local(now)
+        day = local.date()
+        if local.time() >= self.open:
+            day += timedelta(days=1)
+        while day.weekday() not in self.weekdays:
+            day += timedelta(days=1)
+        return (datetime.combine(day, self.open, self.timezone) - local).total_seconds()
+
+
+CSE_HOURS = ExchangeHours(CSE_TIMEZONE, CSE_OPEN, CSE_CLOSE)
+
+
+class ScheduledSnapshot:
+    """A snapshot refreshed in the background on an exchange-hours schedule.
+
+    While the session is open the snapshot is refetched every ``interval``
+    seconds (and once more at the close); outside it, the loop sleeps until
+    the next open. Readers get the last good snapshot from memory; only the
+    very first read waits for a fetch. A failed refresh keeps the previous
+    snapshot and is retried after ``retry_interval``; until one succeeds,
+    reads during that interval get None instead of fetching again.
+    """
+
+    def __init__(self, runner, fetch: SnapshotFetcher, hours: ExchangeHours = CSE_HOURS,
+                 interval: float = CSE_REFRESH_INTERVAL, retry_interval: float = CSE_RETRY_INTERVAL):
+        self.runner = runner
+        self.fetch = fetch
+        self.hours = hours
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self._value: Optional[Dict[str, Any]] = None
+        self._fetched_at: Optional[float] = None
+        self._failed_at: Optional[float] = None
+        self._started = False
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._stats = {'refreshes': 0, 'refresh_errors': 0, 'reads': 0, 'backed_off_reads': 0}
+
+    def start(self):
+        """Start the refresh loop on runner, once"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.runner.submit(self._run())
+
+    async def _fetch(self) -> Dict[str, Any]:
+        try:
+            value = await self.fetch()
+        except Exception:
+            with self._lock:
+                self._failed_at = time.monotonic()
+            raise
+        with self._lock:
+            self._value = value
+            self._fetched_at = time.time()
+            self._failed_at = None
+            self._stats['refreshes'] += 1
+        return value
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Fetch a new snapshot now; concurrent callers share one fetch"""
+        return await self._flight.do('refresh', self._fetch)
+
+    def next_delay(self, now: Optional[float] = None) -> float:
+        if self.hours.is_open(now):
+            return min(self.interval, self.hours.seconds_until_close(now))
+        return self.hours.seconds_until_open(now)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+                delay = self.next_delay()
+            except Exception as e:
+                with self._lock:
+                    self._stats['refresh_errors'] += 1
+                logging.warning(f'Scheduled snapshot refresh failed: {e}')
+                delay = self.retry_interval
+            await asyncio.sleep(max(delay, 1.0))
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        """Latest snapshot and its unix fetch time, or None if none could be fetched yet"""
+        self.start()
+        with self._lock:
+            self._stats['reads'] += 1
+            value, fetched_at = self._value, self._fetched_at
+            backing_off = value is None and self._failed_at is not None and (
+                time.monotonic() - self._failed_at < self.retry_interval
+            )
+            if backing_off:
+                self._stats['backed_off_reads'] += 1
+        if backing_off:
+            return None
+        if value is None:
+            try:
+                value = await self.refresh()
+                fetched_at = self._fetched_at
+            except Exception as e:
+                logging.warning(f'Initial snapshot fetch failed: {e}')
+                return None
+        return {'value': value, 'fetchedAt': fetched_at}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['age'] = round(time.time() - self._fetched_at, 1) if self._fetched_at else None
+        stats['market_open'] = self.hours.is_open()
+        stats['next_refresh_in'] = round(self.next_delay(), 1)
+        return stats
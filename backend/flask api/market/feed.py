@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+from typing import Dict, Any, Optional
+
+# executeTrade's /mark_to_market; unset, fetched prices aren't forwarded anywhere
+MARK_FEED_URL = os.environ.get('MARK_FEED_URL')
+MARK_FEED_INTERVAL = float(os.environ.get('MARK_FEED_INTERVAL', 1))
+MARK_FEED_TIMEOUT = float(os.environ.get('MARK_FEED_TIMEOUT', 5))
+# Shared secret the trading service expects on price ticks
+MARKET_FEED_SECRET = os.environ.get('MARKET_FEED_SECRET')
+MARKET_FEED_HEADER = 'X-Market-Feed-Secret'
+
+
+class MarkFeed:
+    """Forwards upstream prices to the trading service as mark-to-market ticks.
+
+    Prices recorded between two sends are coalesced per symbol (the latest
+    wins) and posted together every ``interval`` seconds by a loop on pool
+    (the HTTP pool, which also sends them). A failed send is merged back
+    under any newer prices and retried on the next round.
+    """
+
+    def __init__(self, pool, url: Optional[str] = MARK_FEED_URL, secret: Optional[str] = MARKET_FEED_SECRET,
+                 interval: float = MARK_FEED_INTERVAL, timeout: float = MARK_FEED_TIMEOUT):
+        self.pool = pool
+        self.url = url
+        self.secret = secret
+        self.interval = interval
+        self.timeout = timeout
+        self._pending: Dict[str, float] = {}
+        self._started = False
+        self._lock = threading.Lock()
+        self._stats = {'ticks': 0, 'prices': 0, 'send_errors': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url and self.secret)
+
+    def record(self, symbol: str, price: Any):
+        """Queue symbol's latest fetched price for the next tick"""
+        if not self.enabled or not isinstance(price, (int, float)) or not math.isfinite(price) or price <= 0:
+            return
+        with self._lock:
+            self._pending[symbol] = float(price)
+            if self._started:
+                return
+            self._started = True
+        self.pool.submit(self._run())
+
+    async def _send(self, prices: Dict[str, float]) -> bool:
+        try:
+            response = await self.pool.request(
+                'POST', self.url, headers={MARKET_FEED_HEADER: self.secret},
+                json={'prices': prices}, timeout=self.timeout
+            )
+        except Exception as e:
+            logging.warning(f'Mark feed tick failed: {e}')
+            return False
+        if response.status != 200:
+            logging.warning(f'Mark feed tick rejected with status {response.status}')
+            return False
+        return True
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            with self._lock:
+                prices, self._pending = self._pending, {}
+            if not prices:
+                continue
+            if await self._send(prices):
+                self._stats['ticks'] += 1
+                self._stats['prices'] += len(prices)
+            else:
+                self._stats['send_errors'] += 1
+                with self._lock:
+                    self._pending = {**prices, **self._pending}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        stats['enabled'] = self.enabled
+        return stats
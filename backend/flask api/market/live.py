@@ -0,0 +1,50 @@
+import os
+import threading
+from typing import Dict, Optional
+
+from .candles import CandleSeries
+
+LIVE_CANDLES_MAX = int(os.environ.get('LIVE_CANDLES_MAX', 1440))
+
+
+class LiveCandles:
+    """Latest 1m candles per symbol, kept in memory so refreshes only fetch what is missing.
+
+    Symbols seen for the first time are seeded from store (a TickStore)
+    when one is given.
+    """
+
+    def __init__(self, store=None, max_length: int = LIVE_CANDLES_MAX):
+        self.store = store
+        self.max_length = max_length
+        self._series: Dict[str, CandleSeries] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, symbol: str) -> Optional[CandleSeries]:
+        # Caller holds the lock
+        series = self._series.get(symbol)
+        if series is None and self.store is not None:
+            series = self.store.tail(symbol, self.max_length)
+            if len(series):
+                self._series[symbol] = series
+            else:
+                series = None
+        return series
+
+    def last_time(self, symbol: str) -> Optional[int]:
+        with self._lock:
+            series = self._get(symbol)
+            return int(series.time[-1]) if series is not None else None
+
+    def merge(self, symbol: str, candles: CandleSeries) -> CandleSeries:
+        """Merge freshly fetched candles into symbol's series and return the result"""
+        candles = candles.complete()
+        with self._lock:
+            series = self._get(symbol)
+            merged = candles.tail(self.max_length) if series is None else series.merge(candles, self.max_length)
+            self._series[symbol] = merged
+            return merged
+
+    def get(self, symbol: str) -> Optional[CandleSeries]:
+        with self._lock:
+            return self._get(symbol)
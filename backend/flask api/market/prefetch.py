@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Iterable
+
+PREFETCH_BUDGET = float(os.environ.get('PREFETCH_BUDGET', 60))
+PREFETCH_MIN_CADENCE = float(os.environ.get('PREFETCH_MIN_CADENCE', 15))
+PREFETCH_MAX_CADENCE = float(os.environ.get('PREFETCH_MAX_CADENCE', 300))
+PREFETCH_HALF_LIFE = float(os.environ.get('PREFETCH_HALF_LIFE', 600))
+PREFETCH_MAX_SYMBOLS = int(os.environ.get('PREFETCH_MAX_SYMBOLS', 50))
+PREFETCH_CONCURRENCY = int(os.environ.get('PREFETCH_CONCURRENCY', 4))
+PREFETCH_TICK = 1.0
+# Decayed request counts below this stop being prefetched
+PREFETCH_MIN_SCORE = 0.05
+# Share of the cache lifetime a symbol may go unrefreshed, leaving room for the tick and the fetch itself
+PREFETCH_LIFETIME_SHARE = 0.8
+
+Prefetcher = Callable[[str], Awaitable[Any]]
+
+
+class PrefetchScheduler:
+    """Keeps the most requested symbols warm within an upstream request budget.
+
+    Every request adds to its symbols' scores, which halve every
+    ``half_life`` seconds. The top ``max_symbols`` are refreshed on a
+    cadence that scales with their score: the hottest symbol every
+    ``min_cadence`` seconds, colder ones less often, down to
+    ``max_cadence``. Refreshes draw from a token bucket of ``budget``
+    upstream requests per minute; when it runs dry, due symbols are
+    served in score order and the rest wait. Pinned symbols are always
+    kept at least at ``max_cadence``. Given the ``lifetime`` of the cache
+    entries it refreshes, both cadences are clamped below it so that a
+    kept symbol is refreshed before its entry expires.
+    """
+
+    def __init__(self, runner, prefetch: Prefetcher, budget: float = PREFETCH_BUDGET,
+                 min_cadence: float = PREFETCH_MIN_CADENCE, max_cadence: float = PREFETCH_MAX_CADENCE,
+                 half_life: float = PREFETCH_HALF_LIFE, max_symbols: int = PREFETCH_MAX_SYMBOLS,
+                 concurrency: int = PREFETCH_CONCURRENCY, pinned: Iterable[str] = (),
+                 lifetime: Optional[float] = None):
+        if lifetime is not None:
+            max_cadence = min(max_cadence, lifetime * PREFETCH_LIFETIME_SHARE)
+            min_cadence = min(min_cadence, max_cadence)
+        self.runner = runner
+        self.prefetch = prefetch
+        self.budget = budget
+        self.min_cadence = min_cadence
+        self.max_cadence = max_cadence
+        self.half_life = half_life
+        self.max_symbols = max_symbols
+        self.concurrency = concurrency
+        self.pinned = frozenset(pinned)
+        self._scores: Dict[str, List[float]] = {}  # symbol -> [score, scored_at]
+        self._last_fetch: Dict[str, float] = {}
+        self._in_flight = set()
+        self._tasks = set()
+        self._tokens = budget / 60 * PREFETCH_TICK
+        self._started = False
+        self._lock = threading.Lock()
+        self._stats = {'prefetches': 0, 'prefetch_errors': 0, 'throttled': 0}
+
+    def start(self):
+        """Start the scheduler loop on runner, once"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.runner.submit(self._run())
+
+    def _decayed(self, entry: List[float], now: float) -> float:
+        return entry[0] * 0.5 ** ((now - entry[1]) / self.half_life)
+
+    def record(self, symbols: Iterable[str]):
+        """Count one request for each of symbols"""
+        now = time.monotonic()
+        with self._lock:
+            for symbol in symbols:
+                entry = self._scores.get(symbol)
+                self._scores[symbol] = [(self._decayed(entry, now) if entry else 0.0) + 1.0, now]
+        self.start()
+
+    def mark_fetched(self, symbol: str):
+        """Note an upstream fetch made outside the scheduler, which resets symbol's cadence"""
+        with self._lock:
+            self._last_fetch[symbol] = time.monotonic()
+
+    def ranking(self) -> List[tuple]:
+        """(symbol, score) for the symbols being kept warm, hottest first"""
+        now = time.monotonic()
+        with self._lock:
+            for symbol, entry in list(self._scores.items()):
+                if self._decayed(entry, now) < PREFETCH_MIN_SCORE and symbol not in self.pinned:
+                    del self._scores[symbol]
+                    self._last_fetch.pop(symbol, None)
+            scores = {symbol: self._decayed(entry, now) for symbol, entry in self._scores.items()}
+        for symbol in self.pinned:
+            scores.setdefault(symbol, 0.0)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:self.max_symbols]
+
+    def cadence(self, score: float, top_score: float) -> float:
+        """Refresh interval for a symbol, from min_cadence (hottest) to max_cadence"""
+        if score <= 0 or top_score <= 0:
+            return self.max_cadence
+        return min(self.max_cadence, max(self.min_cadence, self.min_cadence * top_score / score))
+
+    def due(self, now: Optional[float] = None) -> List[str]:
+        """Symbols whose cadence has elapsed, hottest first"""
+        now = time.monotonic() if now is None else now
+        ranked = self.ranking()
+        if not ranked:
+            return []
+        top_score = ranked[0][1]
+        with self._lock:
+            return [
+                symbol for symbol, score in ranked
+                if symbol not in self._in_flight
+                and now - self._last_fetch.get(symbol, float('-inf')) >= self.cadence(score, top_score)
+            ]
+
+    async def _prefetch(self, symbol: str, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            try:
+                await self.prefetch(symbol)
+                with self._lock:
+                    self._stats['prefetches'] += 1
+            except Exception as e:
+                with self._lock:
+                    self._stats['prefetch_errors'] += 1
+                logging.warning(f'Prefetch of {symbol} failed: {e}')
+            finally:
+                with self._lock:
+                    self._in_flight.discard(symbol)
+                    self._last_fetch[symbol] = time.monotonic()
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        capacity = max(1.0, self.budget / 60 * self.min_cadence)
+        while True:
+            self._tokens = min(capacity, self._tokens + self.budget / 60 * PREFETCH_TICK)
+            try:
+                due = self.due()
+            except Exception as e:
+                logging.warning(f'Prefetch scheduling failed: {e}')
+                due = []
+            allowed = due[:int(self._tokens)]
+            with self._lock:
+                self._stats['throttled'] += len(due) - len(allowed)
+                self._in_flight.update(allowed)
+            self._tokens -= len(allowed)
+            for symbol in allowed:
+                task = asyncio.create_task(self._prefetch(symbol, semaphore))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            await asyncio.sleep(PREFETCH_TICK)
+
+    def stats(self) -> Dict[str, Any]:
+        ranked = self.ranking()
+        top_score = ranked[0][1] if ranked else 0
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._in_flight)
+        stats.update({
+            'symbols': len(ranked),
+            'budget_per_minute': self.budget,
+            'top': [
+                {'symbol': symbol, 'score': round(score, 2), 'cadence': round(self.cadence(score, top_score), 1)}
+                for symbol, score in ranked[:10]
+            ]
+        })
+        return stats
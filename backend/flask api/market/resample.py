@@ -0,0 +1,147 @@
+import threading
+from collections import deque
+from typing import Dict, Optional, List, Tuple
+
+import numpy as np
+
+from .candles import CandleSeries
+
+TIMEFRAMES = {
+    '1m': 60,
+    '5m': 300,
+    '15m': 900,
+    '1h': 3600,
+    '1d': 86400
+}
+
+# (bucket time, open, high, low, close, volume)
+Bar = Tuple[int, float, float, float, float, int]
+
+
+def resample(candles: CandleSeries, seconds: int) -> CandleSeries:
+    """Aggregate candles into seconds-wide buckets in one vectorized pass"""
+    if not len(candles):
+        return CandleSeries.empty()
+    buckets = candles.time - candles.time % seconds
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(candles)] - 1
+    return CandleSeries(
+        buckets[starts],
+        candles.open[starts],
+        np.maximum.reduceat(candles.high, starts),
+        np.minimum.reduceat(candles.low, starts),
+        candles.close[ends],
+        np.add.reduceat(candles.volume, starts)
+    )
+
+
+def _merge(bar: Optional[Bar], time: int, o: float, h: float, l: float, c: float, v: int) -> Bar:
+    if bar is None:
+        return (time, o, h, l, c, v)
+    return (bar[0], bar[1], max(bar[2], h), min(bar[3], l), c, bar[5] + v)
+
+
+class _TimeframeBars:
+    """Completed bars of one timeframe plus the bucket currently forming.
+
+    The forming bucket is kept as the aggregate of its closed 1m bars and
+    the latest (possibly still changing) 1m bar, so a corrected 1m bar
+    replaces its earlier version instead of being counted twice.
+    """
+
+    def __init__(self, seconds: int, max_bars: int):
+        self.seconds = seconds
+        self.completed: 'deque[Bar]' = deque(maxlen=max_bars)
+        self.closed: Optional[Bar] = None
+        self.forming: Optional[Bar] = None
+
+    def update(self, time: int, o: float, h: float, l: float, c: float, v: int):
+        bucket = time - time % self.seconds
+        if self.forming is not None and self.forming[0] != time:
+            # The previous 1m bar is final: fold it into its bucket
+            forming_bucket = self.forming[0] - self.forming[0] % self.seconds
+            self.closed = _merge(self.closed, forming_bucket, *self.forming[1:])
+            self.forming = None
+        if self.closed is not None and self.closed[0] != bucket:
+            self.completed.append(self.closed)
+            self.closed = None
+        self.forming = (time, o, h, l, c, v)
+
+    def current(self) -> Optional[Bar]:
+        if self.forming is None:
+            return self.closed
+        bucket = self.forming[0] - self.forming[0] % self.seconds
+        return _merge(self.closed, bucket, *self.forming[1:])
+
+    def series(self, count: Optional[int] = None) -> CandleSeries:
+        bars: List[Bar] = list(self.completed)
+        current = self.current()
+        if current is not None:
+            bars.append(current)
+        if count is not None:
+            bars = bars[-count:]
+        if not bars:
+            return CandleSeries.empty()
+        return CandleSeries(*(np.array(column) for column in zip(*bars)))
+
+
+class SymbolResampler:
+    """Rolling higher-timeframe bars for one symbol, updated per 1m bar in O(1)"""
+
+    def __init__(self, timeframes: Dict[str, int] = TIMEFRAMES, max_bars: int = 1000):
+        self.last_time: Optional[int] = None
+        self._frames = {name: _TimeframeBars(seconds, max_bars) for name, seconds in timeframes.items()}
+
+    def update(self, time: int, o: float, h: float, l: float, c: float, v: int) -> bool:
+        """Apply one 1m bar; bars older than the last one seen, or still empty upstream, are ignored"""
+        if c == 0 or (self.last_time is not None and time < self.last_time):
+            return False
+        self.last_time = time
+        for frame in self._frames.values():
+            frame.update(time, o, h, l, c, v)
+        return True
+
+    def ingest(self, candles: CandleSeries) -> int:
+        """Apply every bar from the last one seen onwards; returns how many were applied"""
+        if self.last_time is not None:
+            candles = candles.between(self.last_time)
+        rows = zip(candles.time.tolist(), candles.open.tolist(), candles.high.tolist(),
+                   candles.low.tolist(), candles.close.tolist(), candles.volume.tolist())
+        return sum(1 for row in rows if self.update(*row))
+
+    def series(self, timeframe: str, count: Optional[int] = None) -> CandleSeries:
+        if timeframe not in self._frames:
+            raise ValueError(f'Unknown timeframe: {timeframe}')
+        return self._frames[timeframe].series(count)
+
+
+class Resamplers:
+    """Thread-safe SymbolResampler registry, seeded from stored history on first use"""
+
+    def __init__(self, store=None, timeframes: Dict[str, int] = TIMEFRAMES, max_bars: int = 1000):
+        self.store = store
+        self.timeframes = timeframes
+        self.max_bars = max_bars
+        self._symbols: Dict[str, SymbolResampler] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, symbol: str) -> SymbolResampler:
+        # Caller holds the lock
+        resampler = self._symbols.get(symbol)
+        if resampler is None:
+            resampler = SymbolResampler(self.timeframes, self.max_bars)
+            if self.store is not None:
+                # Only the newest bars can be served, so seed from the last day of history
+                last_time = self.store.last_time(symbol)
+                if last_time is not None:
+                    resampler.ingest(self.store.read(symbol, last_time - max(self.timeframes.values())))
+            self._symbols[symbol] = resampler
+        return resampler
+
+    def ingest(self, symbol: str, candles: CandleSeries) -> int:
+        with self._lock:
+            return self._get(symbol).ingest(candles)
+
+    def series(self, symbol: str, timeframe: str, count: Optional[int] = None) -> CandleSeries:
+        with self._lock:
+            return self._get(symbol).series(timeframe, count)
@@ -0,0 +1,129 @@
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .candles import CandleSeries, FIELDS
+
+RECORD_DTYPE = np.dtype([
+    ('time', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<i8')
+])
+
+_UNSAFE_CHARS = re.compile(r'[^A-Za-z0-9._-]')
+
+
+def symbol_filename(symbol: str) -> str:
+    """Filesystem-safe, reversible file name for a symbol (e.g. ^GSPC -> %5EGSPC.ohlcv)"""
+    return _UNSAFE_CHARS.sub(lambda m: f'%{ord(m.group()):02X}', symbol) + '.ohlcv'
+
+
+class TickStore:
+    """Per-symbol, append-only OHLCV files read through memory maps.
+
+    Each file is a flat array of fixed-width RECORD_DTYPE records in time
+    order, so a time range is found by binary search on the time column and
+    returned as views into the map without copying. New bars are appended;
+    the only in-place write is refreshing the last bar while it is still
+    forming (same timestamp).
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._maps: Dict[str, Tuple[int, np.memmap]] = {}
+        self._lock = threading.Lock()
+
+    def path(self, symbol: str) -> str:
+        return os.path.join(self.root, symbol_filename(symbol))
+
+    def _records(self, symbol: str) -> Optional[np.ndarray]:
+        # Caller holds the lock
+        path = self.path(symbol)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return None
+        size -= size % RECORD_DTYPE.itemsize
+        if size == 0:
+            return None
+        cached = self._maps.get(symbol)
+        if cached is None or cached[0] != size:
+            # The file grew since it was mapped; remap to see the new records
+            cached = (size, np.memmap(path, dtype=RECORD_DTYPE, mode='r', shape=(size // RECORD_DTYPE.itemsize,)))
+            self._maps[symbol] = cached
+        return cached[1]
+
+    def last_time(self, symbol: str) -> Optional[int]:
+        with self._lock:
+            records = self._records(symbol)
+            return int(records['time'][-1]) if records is not None else None
+
+    def symbols(self) -> List[str]:
+        """Symbols that have a file in the store"""
+        return sorted(
+            re.sub(r'%([0-9A-F]{2})', lambda m: chr(int(m.group(1), 16)), name[:-len('.ohlcv')])
+            for name in os.listdir(self.root) if name.endswith('.ohlcv')
+        )
+
+    def count(self, symbol: str) -> int:
+        with self._lock:
+            records = self._records(symbol)
+            return 0 if records is None else len(records)
+
+    def append(self, symbol: str, candles: CandleSeries) -> int:
+        """Persist bars newer than the stored tail; returns how many were written.
+
+        Bars with no close price (still empty upstream) are skipped. A bar
+        with the same timestamp as the stored last bar replaces it.
+        """
+        candles = candles.complete()
+        if not len(candles):
+            return 0
+
+        with self._lock:
+            records = self._records(symbol)
+            last = int(records['time'][-1]) if records is not None else None
+            start = 0 if last is None else int(np.searchsorted(candles.time, last, side='left'))
+            new = candles[start:]
+            if not len(new):
+                return 0
+
+            rows = np.empty(len(new), dtype=RECORD_DTYPE)
+            rows['time'] = new.time
+            for field in FIELDS:
+                rows[field] = getattr(new, field)
+
+            with open(self.path(symbol), 'r+b' if records is not None else 'wb') as f:
+                if last is not None and rows['time'][0] == last:
+                    f.seek((len(records) - 1) * RECORD_DTYPE.itemsize)
+                else:
+                    f.seek(len(records) * RECORD_DTYPE.itemsize if records is not None else 0)
+                f.write(rows.tobytes())
+            return len(rows)
+
+    def read(self, symbol: str, start: Optional[int] = None, end: Optional[int] = None) -> CandleSeries:
+        """Bars with start <= time < end, as zero-copy views into the map"""
+        with self._lock:
+            records = self._records(symbol)
+        if records is None:
+            return CandleSeries.empty()
+        times = records['time']
+        lo = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+        hi = len(records) if end is None else int(np.searchsorted(times, end, side='left'))
+        window = records[lo:hi]
+        return CandleSeries(window['time'], *(window[field] for field in FIELDS))
+
+    def tail(self, symbol: str, count: int) -> CandleSeries:
+        with self._lock:
+            records = self._records(symbol)
+        if records is None:
+            return CandleSeries.empty()
+        window = records[-count:]
+        return CandleSeries(window['time'], *(window[field] for field in FIELDS))
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional, List, Callable, Awaitable, Set, Deque, Tuple
+
+STREAM_POLL_INTERVAL = float(os.environ.get('STREAM_POLL_INTERVAL', 5))
+# Events kept for subscribers to catch up on, across all symbols
+STREAM_LOG_SIZE = int(os.environ.get('STREAM_LOG_SIZE', 1000))
+STREAM_KEEPALIVE = float(os.environ.get('STREAM_KEEPALIVE', 15))
+# Each open stream holds a worker, so both their number and their length are bounded
+STREAM_MAX_SUBSCRIPTIONS = int(os.environ.get('STREAM_MAX_SUBSCRIPTIONS', 64))
+STREAM_MAX_DURATION = float(os.environ.get('STREAM_MAX_DURATION', 300))
+# Every streamed symbol gets its own upstream poller
+STREAM_MAX_SYMBOLS = int(os.environ.get('STREAM_MAX_SYMBOLS', 20))
+STREAM_RETRY_MS = int(os.environ.get('STREAM_RETRY_MS', 5000))
+
+QUOTE_FIELDS = ('price', 'change', 'changePercent', 'volume', 'previousClose')
+
+QuoteFetcher = Callable[[str], Awaitable[Optional[Dict[str, Any]]]]
+
+
+def quote_delta(previous: Dict[str, Any], current: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Fields and candles of current that differ from previous, or None if nothing changed.
+
+    Candles are sent from the last candle previous knew about (which may
+    still have been forming) onwards.
+    """
+    delta = {field: current.get(field) for field in QUOTE_FIELDS if current.get(field) != previous.get(field)}
+
+    old_candles = previous.get('candles') or []
+    new_candles = current.get('candles') or []
+    since = old_candles[-1]['time'] if old_candles else None
+    changed = [c for c in new_candles if since is None or c['time'] >= since]
+    if changed and (len(changed) > 1 or not old_candles or changed[0] != old_candles[-1]):
+        delta['candles'] = changed
+
+    if not delta:
+        return None
+    return {'type': 'delta', 'symbol': current.get('symbol'), **delta}
+
+
+class Subscription:
+    """One streaming client's symbols and its position in the stream's event log"""
+
+    def __init__(self, symbols: List[str], cursor: int):
+        self.symbols = list(dict.fromkeys(symbols))
+        self.cursor = cursor
+        self.pending: List[Dict[str, Any]] = []
+        self.dropped = 0
+
+
+class QuoteStream:
+    """Fans quote deltas out to subscribers from one upstream poller per symbol.
+
+    Pollers run on runner (anything with a ``submit(coro)`` method, e.g. the
+    HTTP pool) and stop once their symbol has no subscribers left. Each
+    change is appended once to a shared, bounded event log, so publishing
+    costs the same however many clients are connected; a subscriber only
+    keeps its position in the log and reads the events for its symbols
+    from there. One that falls further behind than the log reaches is
+    reset to a snapshot of each of its symbols.
+
+    A streamed WSGI response occupies its worker for as long as the client
+    stays connected, so at most ``max_subscriptions`` streams are open at
+    once and each ends after ``max_duration`` seconds; EventSource
+    reconnects on its own and starts again from a snapshot. A stream
+    covers at most ``max_symbols`` symbols.
+    """
+
+    def __init__(self, runner, fetch_quote: QuoteFetcher, interval: float = STREAM_POLL_INTERVAL,
+                 log_size: int = STREAM_LOG_SIZE, max_subscriptions: int = STREAM_MAX_SUBSCRIPTIONS,
+                 max_duration: float = STREAM_MAX_DURATION, max_symbols: int = STREAM_MAX_SYMBOLS):
+        self.runner = runner
+        self.fetch_quote = fetch_quote
+        self.interval = interval
+        self.max_subscriptions = max_subscriptions
+        self.max_duration = max_duration
+        self.max_symbols = max_symbols
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._subscriptions = 0
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self._pollers: Set[str] = set()
+        self._log: Deque[Tuple[int, str, Dict[str, Any]]] = deque(maxlen=log_size)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._stats = {'polls': 0, 'poll_errors': 0, 'events': 0, 'rejected': 0}
+
+    def subscribe(self, symbols: List[str]) -> Optional[Subscription]:
+        """A new subscription, or None if max_subscriptions streams are already open; raises
+        ValueError for more than max_symbols symbols"""
+        symbols = list(dict.fromkeys(symbols))
+        if len(symbols) > self.max_symbols:
+            raise ValueError(f'A stream covers at most {self.max_symbols} symbols')
+        to_start = []
+        with self._lock:
+            if self._subscriptions >= self.max_subscriptions:
+                self._stats['rejected'] += 1
+                return None
+            self._subscriptions += 1
+            subscription = Subscription(symbols, self._seq)
+            for symbol in subscription.symbols:
+                self._subscribers.setdefault(symbol, set()).add(subscription)
+                latest = self._latest.get(symbol)
+                if latest is not None:
+                    subscription.pending.append(self._snapshot(latest))
+                if symbol not in self._pollers:
+                    self._pollers.add(symbol)
+                    to_start.append(symbol)
+        for symbol in to_start:
+            self.runner.submit(self._poll(symbol))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions -= 1
+            for symbol in subscription.symbols:
+                subscribers = self._subscribers.get(symbol)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[symbol]
+
+    @staticmethod
+    def _snapshot(quote: Dict[str, Any]) -> Dict[str, Any]:
+        return {'type': 'snapshot', **quote}
+
+    def _publish(self, symbol: str, quote: Dict[str, Any]) -> bool:
+        """Log the change since the last poll; False if the symbol has no subscribers left"""
+        with self._lock:
+            subscribers = self._subscribers.get(symbol)
+            if not subscribers:
+                self._pollers.discard(symbol)
+                self._latest.pop(symbol, None)
+                return False
+            previous = self._latest.get(symbol)
+            self._latest[symbol] = quote
+            event = self._snapshot(quote) if previous is None else quote_delta(previous, quote)
+            if event is not None:
+                self._seq += 1
+                self._log.append((self._seq, symbol, event))
+                self._stats['events'] += 1
+                self._changed.notify_all()
+            return True
+
+    async def _poll(self, symbol: str):
+        while True:
+            quote = None
+            try:
+                quote = await self.fetch_quote(symbol)
+                self._stats['polls'] += 1
+            except Exception as e:
+                self._stats['poll_errors'] += 1
+                logging.warning(f'Stream poll for {symbol} failed: {e}')
+
+            if quote is not None:
+                if not self._publish(symbol, quote):
+                    return
+            else:
+                with self._lock:
+                    if not self._subscribers.get(symbol):
+                        self._pollers.discard(symbol)
+                        self._latest.pop(symbol, None)
+                        return
+            await asyncio.sleep(self.interval)
+
+    def _take(self, subscription: Subscription) -> List[Dict[str, Any]]:
+        """Events for subscription since its cursor, which moves to the end of the log (lock held)"""
+        events, subscription.pending = subscription.pending, []
+        if subscription.cursor < self._seq:
+            if not self._log or self._log[0][0] > subscription.cursor + 1:
+                subscription.dropped += 1
+                events = [self._snapshot(self._latest[s]) for s in subscription.symbols if s in self._latest]
+            else:
+                symbols = set(subscription.symbols)
+                logged = []
+                for seq, symbol, event in reversed(self._log):
+                    if seq <= subscription.cursor:
+                        break
+                    if symbol in symbols:
+                        logged.append(event)
+                events.extend(reversed(logged))
+            subscription.cursor = self._seq
+        return events
+
+    def next_events(self, subscription: Subscription, timeout: float = STREAM_KEEPALIVE) -> List[Dict[str, Any]]:
+        """Wait up to timeout for events on subscription's symbols; empty means none came"""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                events = self._take(subscription)
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    return events
+                self._changed.wait(remaining)
+
+    def events(self, subscription: Subscription, keepalive: float = STREAM_KEEPALIVE):
+        """Server-sent event lines for subscription, for up to max_duration seconds; unsubscribes
+        when the stream ends or the client goes away"""
+        try:
+            yield f'retry: {STREAM_RETRY_MS}\n\n'
+            ends = time.monotonic() + self.max_duration
+            while True:
+                remaining = ends - time.monotonic()
+                if remaining <= 0:
+                    return
+                events = self.next_events(subscription, min(keepalive, remaining))
+                if not events:
+                    yield ': keepalive\n\n'
+                for event in events:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['symbols'] = len(self._pollers)
+            stats['subscriptions'] = self._subscriptions
+            stats['log'] = len(self._log)
+        return stats
@@ -0,0 +1,45 @@
+import time
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+from .candles import CandleSeries
+
+Seed = Union[None, int, np.random.Generator]
+
+
+def synthetic_candles(start_prices: Sequence[float], end_prices: Sequence[float], length: int = 60,
+                      volatility: float = 0.003, interval: int = 60, end_time: Optional[int] = None,
+                      volume_range: Sequence[int] = (50000, 200000), rng: Seed = None) -> List[CandleSeries]:
+    """Random-walk candles drifting from start to end price, one series per symbol.
+
+    All symbols are generated together as (symbols, length) arrays. Each
+    bar's noise is proportional to volatility times its drift price, high
+    and low always bracket open and close, and the last close is pinned
+    to the end price. Passing the same seed (or Generator state) gives the
+    same candles.
+    """
+    rng = np.random.default_rng(rng)
+    start = np.asarray(start_prices, dtype=np.float64)[:, None]
+    end = np.asarray(end_prices, dtype=np.float64)[:, None]
+    symbols = start.shape[0]
+    if end_time is None:
+        end_time = int(time.time())
+
+    progress = np.arange(length) / length
+    base = start + (end - start) * progress
+    spread = base * volatility
+
+    noise = rng.random((4, symbols, length))
+    opens = base + (noise[0] - 0.5) * spread
+    closes = base + (noise[1] - 0.5) * spread
+    closes[:, -1] = end[:, 0]
+    highs = np.maximum(base + noise[2] * spread * 1.5, np.maximum(opens, closes))
+    lows = np.minimum(base - noise[3] * spread * 1.5, np.minimum(opens, closes))
+    volumes = rng.integers(volume_range[0], volume_range[1], size=(symbols, length), endpoint=True)
+    times = end_time - (length - np.arange(length)) * interval
+
+    return [
+        CandleSeries(times, opens[i], highs[i], lows[i], closes[i], volumes[i])
+        for i in range(symbols)
+    ]
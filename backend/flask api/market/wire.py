@@ -0,0 +1,84 @@
+import json
+import os
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; without it only the JSON encodings are offered
+    msgpack = None
+
+from .candles import CandleSeries
+
+WIRE_PRICE_DECIMALS = int(os.environ.get('WIRE_PRICE_DECIMALS', 4))
+
+JSON = 'application/json'
+COLUMNAR_JSON = 'application/vnd.tradesense.columnar+json'
+MSGPACK = 'application/msgpack'
+MSGPACK_ALIASES = ('application/x-msgpack',)
+
+
+def encode_candles(candles: CandleSeries, decimals: int = WIRE_PRICE_DECIMALS) -> Dict[str, Any]:
+    """Columnar, delta-encoded candles.
+
+    Prices are rounded to decimals places and sent as integer ticks
+    (price * 10**decimals). Every time and price column holds its first
+    value followed by differences to the previous value, so the running sum
+    restores it; volumes are sent as-is.
+    """
+    scale = 10 ** decimals
+    encoded = {
+        'encoding': 'delta',
+        'decimals': decimals,
+        'count': len(candles),
+        'time': np.diff(candles.time, prepend=0).tolist()
+    }
+    for field in ('open', 'high', 'low', 'close'):
+        ticks = np.rint(getattr(candles, field) * scale).astype(np.int64)
+        encoded[field] = np.diff(ticks, prepend=0).tolist()
+    encoded['volume'] = candles.volume.tolist()
+    return encoded
+
+
+def decode_candles(encoded: Dict[str, Any]) -> CandleSeries:
+    """Inverse of encode_candles (prices to the encoded precision)"""
+    scale = 10 ** encoded['decimals']
+    return CandleSeries(
+        np.cumsum(np.asarray(encoded['time'], dtype=np.int64)),
+        *(np.cumsum(np.asarray(encoded[field], dtype=np.int64)) / scale for field in ('open', 'high', 'low', 'close')),
+        np.asarray(encoded['volume'], dtype=np.int64)
+    )
+
+
+def negotiate(accept_mimetypes) -> str:
+    """Best wire format for a request's Accept header (werkzeug MIMEAccept); JSON unless asked otherwise"""
+    offered = [JSON, COLUMNAR_JSON]
+    if msgpack is not None:
+        offered += [MSGPACK, *MSGPACK_ALIASES]
+    best = accept_mimetypes.best_match(offered, default=JSON)
+    return MSGPACK if best in MSGPACK_ALIASES else best
+
+
+def encode_payload(payload: Dict[str, Any], mimetype: str, decimals: int = WIRE_PRICE_DECIMALS) -> bytes:
+    """Serialize a response in a compact format, encoding the candles of each quote in payload['data']"""
+
+    def encode_quote(quote: Dict[str, Any]) -> Dict[str, Any]:
+        candles = quote.get('candles')
+        if not isinstance(candles, CandleSeries):
+            candles = CandleSeries.from_records(candles or [])
+        return {**quote, 'candles': encode_candles(candles, decimals)}
+
+    body = {**payload, 'data': [encode_quote(quote) for quote in payload.get('data', [])]}
+    if mimetype == MSGPACK:
+        return msgpack.packb(body, use_bin_type=True)
+    return json.dumps(body, separators=(',', ':')).encode()
+
+
+def candles_since(candles: Optional[Any], timestamp: Optional[int]) -> Any:
+    """Only the candles at or after timestamp (everything when timestamp is None)"""
+    if timestamp is None or candles is None:
+        return candles
+    if not isinstance(candles, CandleSeries):
+        candles = CandleSeries.from_records(candles)
+    return candles.between(timestamp)
@@ -4,6 +4,8 @@ import logging
 from typing import Dict, Any, Optional, List
 import json
 
+from base44 import Base44Client
+
 app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 
@@ -119,59 +121,6 @@ USERS = [
     }
 ]
 
-class Base44Client:
-    def __init__(self, api_key: str, base_url: str):
-        self.api_key = api_key
-        self.base_url = base_url
-    
-    async def get_user_from_request(self, req) -> Optional[Dict[str, Any]]:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header:
-            return None
-        
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self.base_url}/auth/me",
-                headers={"Authorization": auth_header}
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                return None
-    
-    async def filter_challenges(self, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/entities/Challenge/filter",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json=filters
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                return []
-    
-    async def delete_challenge(self, challenge_id: str) -> bool:
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            async with session.delete(
-                f"{self.base_url}/entities/Challenge/{challenge_id}",
-                headers={"Authorization": f"Bearer {self.api_key}"}
-            ) as response:
-                return response.status == 200
-    
-    async def create_challenge(self, challenge_data: Dict[str, Any]) -> Dict[str, Any]:
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/entities/Challenge",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json=challenge_data
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                return {}
-
 base44_client = Base44Client(
     api_key=BASE44_API_KEY,
     base_url=BASE44_API_URL
@@ -186,23 +135,20 @@ async def populate_leaderboard():
 
         # Delete existing challenges created by these test users
         user_emails = [u['email'] for u in USERS]
-        existing_challenges = await base44_client.filter_challenges({
+        deleted = await base44_client.entities.Challenge.bulk_delete_by_filter({
             'created_by': {'$in': user_emails}
         })
-
-        for challenge in existing_challenges:
-            await base44_client.delete_challenge(challenge['id'])
+        if deleted is None:
+            return jsonify({'error': 'Failed to delete existing challenges'}), 500
 
         # Create new challenges with display names
-        created_challenges = []
-        for user_data in USERS:
-            challenge_data = {
+        created_challenges = await base44_client.entities.Challenge.bulk_create([
+            {
                 **user_data['challenge'],
                 'display_name': user_data['name']
             }
-            challenge = await base44_client.create_challenge(challenge_data)
-            if challenge:
-                created_challenges.append(challenge)
+            for user_data in USERS
+        ])
 
         return jsonify({
             'success': True,
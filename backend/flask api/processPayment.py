@@ -7,72 +7,25 @@ import time
 from typing import Dict, Any, Optional
 import json
 
+from base44 import Base44Client
+from common.idempotency import IdempotencyStore
+
 app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 
 BASE44_API_KEY = os.environ.get('BASE44_API_KEY')
 BASE44_API_URL = os.environ.get('BASE44_API_URL', 'https://api.base44.com')
 
-class Base44Client:
-    def __init__(self, api_key: str, base_url: str):
-        self.api_key = api_key
-        self.base_url = base_url
-    
-    async def get_user_from_request(self, req) -> Optional[Dict[str, Any]]:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header:
-            return None
-        
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self.base_url}/auth/me",
-                headers={"Authorization": auth_header}
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                return None
-    
-    async def create_payment(self, payment_data: Dict[str, Any]) -> Dict[str, Any]:
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/entities/Payment",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json=payment_data
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                return {}
-    
-    async def create_challenge(self, challenge_data: Dict[str, Any]) -> Dict[str, Any]:
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/entities/Challenge",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json=challenge_data
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                return {}
-    
-    async def update_payment(self, payment_id: str, updates: Dict[str, Any]) -> bool:
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            async with session.put(
-                f"{self.base_url}/entities/Payment/{payment_id}",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json=updates
-            ) as response:
-                return response.status == 200
-
 base44_client = Base44Client(
     api_key=BASE44_API_KEY,
     base_url=BASE44_API_URL
 )
 
+# A retried payment returns the original Payment and Challenge instead of charging again
+idempotency = IdempotencyStore()
+
 @app.route('/process_payment', methods=['POST'])
+@idempotency.idempotent('process_payment')
 async def process_payment():
     try:
         user = await base44_client.get_user_from_request(request)
@@ -114,7 +67,7 @@ async def process_payment():
         transaction_id = f"TXN-{int(time.time() * 1000)}-{random.randint(1000, 9999)}"
 
         # Create payment record
-        payment = await base44_client.create_payment({
+        payment = await base44_client.entities.Payment.create({
             'plan_type': plan_type,
             'amount': amount,
             'currency': 'DH',
@@ -139,7 +92,7 @@ async def process_payment():
         starting_balance = balances.get(plan_type, 5000)
 
         # Create challenge
-        challenge = await base44_client.create_challenge({
+        challenge = await base44_client.entities.Challenge.create({
             'plan_type': plan_type,
             'starting_balance': starting_balance,
             'current_balance': starting_balance,
@@ -164,7 +117,7 @@ async def process_payment():
             }), 500
 
         # Link payment to challenge
-        await base44_client.update_payment(payment['id'], {
+        await base44_client.entities.Payment.update(payment['id'], {
             'challenge_id': challenge['id']
         })
 
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The services import their packages (base44, common, market, trading) from the service directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
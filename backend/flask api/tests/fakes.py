@@ -0,0 +1,108 @@
+"""In-memory stand-ins for the Base44 client, enough for the trading engine and write-behind queue"""
+import itertools
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+# Unique keys the SQL schema declares (DATABASE.sql); a bulk create that violates one fails as a whole
+UNIQUE_KEYS = {
+    'TradeEvent': ('challenge_id', 'seq'),
+    'ChallengeSnapshot': ('challenge_id', 'seq')
+}
+
+_ids = itertools.count(1)
+
+
+def _matches(record: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    for field, condition in filters.items():
+        value = record.get(field)
+        if isinstance(condition, dict):
+            if '$in' in condition and value not in condition['$in']:
+                return False
+            if '$gt' in condition and (value is None or not value > condition['$gt']):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeEntity:
+    def __init__(self, backend: 'FakeBase44', name: str):
+        self.backend = backend
+        self.name = name
+
+    @property
+    def records(self) -> Dict[str, Dict[str, Any]]:
+        return self.backend.tables[self.name]
+
+    async def filter(self, filters: Dict[str, Any], fields: Optional[List[str]] = None,
+                     limit: Optional[int] = None, sort: Optional[str] = None) -> List[Dict[str, Any]]:
+        self.backend.calls.append(('filter', self.name))
+        found = [dict(r) for r in self.records.values() if _matches(r, filters)]
+        if sort:
+            field = sort.lstrip('-')
+            found.sort(key=lambda r: r.get(field), reverse=sort.startswith('-'))
+        if fields:
+            found = [{f: r.get(f) for f in fields} for r in found]
+        return found[:limit] if limit is not None else found
+
+    async def bulk_create(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        self.backend.calls.append(('bulk_create', self.name))
+        if self.backend.down:
+            raise ConnectionError('Base44 unavailable')
+        unique = UNIQUE_KEYS.get(self.name)
+        if unique:
+            taken = {tuple(r.get(f) for f in unique) for r in self.records.values()}
+            if any(tuple(r.get(f) for f in unique) in taken for r in records):
+                raise RuntimeError(f'duplicate key value violates unique constraint on {self.name}')
+        created = []
+        for record in records:
+            record = {**record, 'id': record.get('id') or f'{self.name.lower()}-{next(_ids)}'}
+            self.records[record['id']] = record
+            created.append(dict(record))
+        return created
+
+    async def bulk_update(self, updates: List[Dict[str, Any]]) -> bool:
+        self.backend.calls.append(('bulk_update', self.name))
+        if self.backend.down:
+            raise ConnectionError('Base44 unavailable')
+        for update in updates:
+            record = self.records.get(update['id'])
+            if record is not None:
+                record.update(update)
+        return True
+
+
+class FakeEntities:
+    def __init__(self, backend: 'FakeBase44'):
+        self._backend = backend
+
+    def __getattr__(self, name: str) -> FakeEntity:
+        return FakeEntity(self._backend, name)
+
+
+class FakePool:
+    """Runs everything on the caller's loop, as the pool loop would"""
+
+    async def run(self, coro):
+        return await coro
+
+
+class FakeBase44:
+    def __init__(self):
+        self.tables: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+        self.calls: List[tuple] = []
+        self.down = False  # every write fails while set
+        self.entities = FakeEntities(self)
+        self.pool = FakePool()
+
+    def add(self, entity: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        self.tables[entity][record['id']] = dict(record)
+        return record
+
+
+def challenge(challenge_id: str = 'c1', owner: str = 'u@x.com', balance: float = 10000, **fields) -> Dict[str, Any]:
+    return {
+        'id': challenge_id, 'created_by': owner, 'status': 'active', 'starting_balance': balance,
+        'current_balance': balance, 'daily_start_balance': balance, 'total_trades': 0,
+        'winning_trades': 0, 'total_pnl': 0, **fields
+    }
@@ -0,0 +1,77 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+
+from base44.auth import TokenCache, InvalidToken, decode_jwt
+
+SECRET = 'test-secret'
+
+
+def _segment(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b'=').decode()
+
+
+def make_token(claims: dict, secret: str = None) -> str:
+    signing_input = f"{_segment({'alg': 'HS256', 'typ': 'JWT'})}.{_segment(claims)}"
+    signature = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest() if secret else b'forged'
+    return f"{signing_input}.{base64.urlsafe_b64encode(signature).rstrip(b'=').decode()}"
+
+
+class FakeAuthService:
+    def __init__(self, user=None):
+        self.user = user
+        self.calls = 0
+
+    async def __call__(self, auth_header):
+        self.calls += 1
+        return self.user
+
+
+FORGED = {'email': 'victim@x.com', 'role': 'admin', '_verified': True}
+
+
+def test_decode_jwt_reports_unchecked_claims():
+    claims, verified = decode_jwt(make_token(FORGED))
+    assert claims['email'] == 'victim@x.com'
+    assert verified is False
+
+
+def test_forged_token_without_secret_is_checked_remotely():
+    service = FakeAuthService(user=None)
+    cache = TokenCache(jwt_secret=None)
+    user = asyncio.run(cache.verify(f'Bearer {make_token(FORGED)}', service))
+    assert user is None
+    assert service.calls == 1
+
+
+def test_forged_token_with_secret_is_rejected():
+    service = FakeAuthService(user={'email': 'victim@x.com', 'role': 'admin'})
+    cache = TokenCache(jwt_secret=SECRET)
+    assert asyncio.run(cache.verify(f'Bearer {make_token(FORGED)}', service)) is None
+    assert service.calls == 0
+
+
+def test_signed_token_is_verified_locally():
+    service = FakeAuthService()
+    cache = TokenCache(jwt_secret=SECRET)
+    token = make_token({'email': 'u@x.com', 'sub': 'u1', 'exp': time.time() + 60}, SECRET)
+    user = asyncio.run(cache.verify(f'Bearer {token}', service))
+    assert user['email'] == 'u@x.com'
+    assert user['role'] == 'user'
+    assert service.calls == 0
+
+
+def test_expired_token_is_rejected_and_cached():
+    service = FakeAuthService(user={'email': 'u@x.com'})
+    cache = TokenCache(jwt_secret=SECRET)
+    header = f"Bearer {make_token({'email': 'u@x.com', 'exp': time.time() - 1}, SECRET)}"
+    with pytest.raises(InvalidToken):
+        decode_jwt(header[7:], SECRET)
+    assert asyncio.run(cache.verify(header, service)) is None
+    assert asyncio.run(cache.verify(header, service)) is None
+    assert service.calls == 0
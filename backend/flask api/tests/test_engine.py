@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+
+from trading.engine import TradingEngine, TradingError
+from trading.writebehind import WriteBehind, Journal
+
+from fakes import FakeBase44, challenge
+
+OWNER = 'u@x.com'
+
+
+def make_engine(client, journal_path=None):
+    journal = Journal(str(journal_path)) if journal_path is not None else None
+    return TradingEngine(client, WriteBehind(client, journal, interval=0.01, retry=0.01))
+
+
+def test_replayed_journal_is_flushed_before_the_first_load(tmp_path):
+    client = FakeBase44()
+    client.add('Challenge', challenge('c1', OWNER, balance=10000))
+    journal_path = tmp_path / 'executeTrade.journal'
+
+    async def crash():
+        # Base44 is down, so the open is acknowledged and journaled but never persisted
+        client.down = True
+        engine = make_engine(client, journal_path)
+        trade, _ = await engine.open_trade(OWNER, 'c1', 'AAPL', 'buy', 10, 100)
+        await asyncio.sleep(0.05)
+        return trade
+
+    trade = asyncio.run(crash())
+    assert client.tables['Challenge']['c1']['current_balance'] == 10000
+    assert not client.tables['Trade']
+
+    async def restart():
+        client.down = False
+        engine = make_engine(client, journal_path)
+        assert engine.writer.stats()['replayed'] > 0
+        closed, _ = await engine.close_trade(OWNER, trade['id'], 110)
+        await engine.drain(1)
+        return engine, closed
+
+    engine, closed = asyncio.run(restart())
+    assert closed['pnl'] == pytest.approx(100)
+    record = engine.snapshot('c1')
+    assert record['current_balance'] == pytest.approx(10100)
+    assert record['total_trades'] == 1
+    assert client.tables['Challenge']['c1']['current_balance'] == pytest.approx(10100)
+    assert [t['status'] for t in client.tables['Trade'].values()] == ['closed']
+
+
+def test_load_lock_is_released_when_the_challenge_is_missing():
+    client = FakeBase44()
+    engine = make_engine(client)
+
+    async def run():
+        with pytest.raises(TradingError) as error:
+            await engine.open_trade(OWNER, 'missing', 'AAPL', 'buy', 1, 100)
+        assert error.value.status == 404
+        assert not engine._loading
+
+    asyncio.run(run())
+
+
+def test_batch_reports_each_order_and_keeps_the_groups_that_succeeded(monkeypatch):
+    client = FakeBase44()
+    client.add('Challenge', challenge('c1', OWNER, balance=1000))
+    client.add('Challenge', challenge('c2', OWNER, balance=1000))
+    client.add('Challenge', challenge('c3', OWNER, balance=1000))
+    engine = make_engine(client)
+    load = engine._load
+
+    async def flaky_load(challenge_id, owner):
+        if challenge_id == 'c3':
+            raise RuntimeError('Base44 unavailable')
+        return await load(challenge_id, owner)
+
+    monkeypatch.setattr(engine, '_load', flaky_load)
+    orders = [
+        {'challenge_id': 'c1', 'symbol': 'AAPL', 'side': 'buy', 'quantity': 6, 'price': 100},
+        {'challenge_id': 'c1', 'symbol': 'MSFT', 'side': 'buy', 'quantity': 6, 'price': 100},
+        {'challenge_id': 'missing', 'symbol': 'AAPL', 'side': 'buy', 'quantity': 1, 'price': 100},
+        {'challenge_id': 'c3', 'symbol': 'AAPL', 'side': 'buy', 'quantity': 1, 'price': 100},
+        {'challenge_id': 'c2', 'symbol': 'AAPL', 'side': 'sell', 'quantity': 2, 'price': 100},
+    ]
+
+    async def run():
+        results, evaluations = await engine.open_trades(OWNER, orders)
+        await engine.drain(1)
+        return results, evaluations
+
+    results, evaluations = asyncio.run(run())
+    assert [result['success'] for result in results] == [True, False, False, False, True]
+    assert [result.get('status') for result in results] == [None, 400, 404, 500, None]
+    assert results[1]['error'] == 'Insufficient balance'
+    assert set(evaluations) == {'c1', 'c2'}
+    assert client.tables['Challenge']['c1']['current_balance'] == pytest.approx(400)
+    assert client.tables['Challenge']['c2']['current_balance'] == pytest.approx(800)
+    assert client.tables['Challenge']['c3']['current_balance'] == 1000
+    assert len(client.tables['Trade']) == 2
+    assert engine.stats()['orders'] == 2 and engine.stats()['rejected'] == 3
+
+
+def test_tick_closes_the_positions_whose_levels_it_crossed():
+    client = FakeBase44()
+    client.add('Challenge', challenge('c1', OWNER, balance=10000))
+    engine = make_engine(client)
+
+    async def run():
+        long, _ = await engine.open_trade(OWNER, 'c1', 'AAPL', 'buy', 10, 100, {'stop_loss': 95, 'take_profit': 110})
+        short, _ = await engine.open_trade(OWNER, 'c1', 'AAPL', 'sell', 10, 100, {'stop_loss_pct': 3})
+        untouched, _ = await engine.open_trade(OWNER, 'c1', 'MSFT', 'buy', 1, 100, {'stop_loss': 50})
+        first = await engine.mark_to_market({'AAPL': 102})
+        second = await engine.mark_to_market({'AAPL': 111, 'MSFT': 99})
+        await engine.drain(1)
+        return long, short, untouched, first, second
+
+    long, short, untouched, first, second = asyncio.run(run())
+    assert first['triggered'] == []
+    fired = {(event['tradeId'], event['reason'], event['exitPrice']) for event in second['triggered']}
+    assert fired == {(long['id'], 'take_profit', 111), (short['id'], 'stop_loss', 111)}
+    assert short['stop_loss'] == pytest.approx(103)
+    trades = {trade['client_id']: trade for trade in client.tables['Trade'].values()}
+    assert trades[long['id']]['status'] == 'closed' and trades[long['id']]['close_reason'] == 'take_profit'
+    assert trades[long['id']]['pnl'] == pytest.approx(110)
+    assert trades[short['id']]['pnl'] == pytest.approx(-110)
+    assert trades[untouched['id']]['status'] == 'open'
+    assert untouched['id'] in engine.triggers and long['id'] not in engine.triggers
+
+
+def test_marked_loss_beyond_the_limit_fails_the_challenge():
+    client = FakeBase44()
+    client.add('Challenge', challenge('c1', OWNER, balance=10000, max_total_loss_pct=10, max_daily_loss_pct=50))
+    engine = make_engine(client)
+
+    async def run():
+        await engine.open_trade(OWNER, 'c1', 'AAPL', 'buy', 100, 100)
+        marked = await engine.mark_to_market({'AAPL': 95})
+        failed = await engine.mark_to_market({'AAPL': 89})
+        await engine.drain(1)
+        return marked, failed
+
+    marked, failed = asyncio.run(run())
+    assert marked['failed'] == [] and marked['equityUpdated'] == 1
+    assert failed['failed'] == ['c1']
+    record = client.tables['Challenge']['c1']
+    assert record['status'] == 'failed'
+    assert record['equity'] == pytest.approx(8900)
@@ -0,0 +1,36 @@
+import asyncio
+
+from market.exchange import ScheduledSnapshot
+
+
+class IdleRunner:
+    """Never runs the background refresh loop, so only reads fetch"""
+
+    def submit(self, coro):
+        coro.close()
+
+
+def test_failed_first_fetch_is_not_repeated_by_every_read():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        if len(calls) == 1:
+            raise ConnectionError('upstream down')
+        return {'ATW': 500}
+
+    snapshot = ScheduledSnapshot(IdleRunner(), fetch, retry_interval=0.2)
+
+    async def run():
+        reads = await asyncio.gather(*(snapshot.get() for _ in range(5)))
+        reads.append(await snapshot.get())
+        await asyncio.sleep(0.25)
+        reads.append(await snapshot.get())
+        return reads
+
+    reads = asyncio.run(run())
+    assert reads[:-1] == [None] * 6
+    assert reads[-1]['value'] == {'ATW': 500}
+    assert len(calls) == 2
+    assert snapshot.stats()['backed_off_reads'] == 1
@@ -0,0 +1,107 @@
+import asyncio
+
+from flask import Flask, jsonify, request
+
+from common.idempotency import IdempotencyStore
+
+
+def make_app(store):
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/orders', methods=['POST'])
+    @store.idempotent('orders')
+    async def orders():
+        calls.append(request.get_json())
+        return jsonify({'success': True, 'order': len(calls)})
+
+    return app, calls
+
+
+def test_retry_is_replayed_and_a_different_body_is_rejected():
+    store = IdempotencyStore()
+    app, calls = make_app(store)
+    client = app.test_client()
+    headers = {'Idempotency-Key': 'k1', 'Authorization': 'Bearer a'}
+
+    first = client.post('/orders', json={'symbol': 'AAPL'}, headers=headers)
+    retry = client.post('/orders', json={'symbol': 'AAPL'}, headers=headers)
+    assert first.status_code == retry.status_code == 200
+    assert retry.get_json() == first.get_json() == {'success': True, 'order': 1}
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+
+    mismatch = client.post('/orders', json={'symbol': 'MSFT'}, headers=headers)
+    assert mismatch.status_code == 422
+    assert len(calls) == 1
+
+    # Keys are scoped to the caller, and requests without one always run
+    other_caller = client.post('/orders', json={'symbol': 'MSFT'}, headers={**headers, 'Authorization': 'Bearer b'})
+    assert other_caller.get_json()['order'] == 2
+    client.post('/orders', json={'symbol': 'AAPL'})
+    assert len(calls) == 3
+    assert store.stats()['replayed'] == 1 and store.stats()['conflicts'] == 1
+
+
+def test_body_key_and_invalid_keys():
+    store = IdempotencyStore()
+    app, calls = make_app(store)
+    client = app.test_client()
+
+    client.post('/orders', json={'symbol': 'AAPL', 'idempotencyKey': 'k1'})
+    retry = client.post('/orders', json={'symbol': 'AAPL', 'idempotencyKey': 'k1'})
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert client.post('/orders', json={'idempotencyKey': 'k' * 256}).status_code == 400
+    assert len(calls) == 1
+
+
+def test_concurrent_retry_waits_for_the_original():
+    store = IdempotencyStore()
+    ran = []
+
+    async def call():
+        ran.append(1)
+        await asyncio.sleep(0.05)
+        return b'ok', 200, 'application/json'
+
+    async def run():
+        return await asyncio.gather(store.run('k', 'f', call), store.run('k', 'f', call))
+
+    assert asyncio.run(run()) == [((b'ok', 200, 'application/json'), 'ran'),
+                                  ((b'ok', 200, 'application/json'), 'waited')]
+    assert ran == [1]
+
+
+def test_retry_takes_over_when_the_original_is_cancelled():
+    store = IdempotencyStore()
+    ran = []
+
+    async def call():
+        ran.append(1)
+        await asyncio.sleep(0.05)
+        return b'ok', 200, 'application/json'
+
+    async def run():
+        original = asyncio.ensure_future(store.run('k', 'f', call))
+        await asyncio.sleep(0.01)
+        retry = asyncio.ensure_future(store.run('k', 'f', call))
+        await asyncio.sleep(0.01)
+        original.cancel()
+        return await retry
+
+    assert asyncio.run(run()) == ((b'ok', 200, 'application/json'), 'ran')
+    assert len(ran) == 2
+    assert store.stats()['leader_cancellations'] == 1
+
+
+def test_server_errors_are_not_stored():
+    store = IdempotencyStore()
+    statuses = iter([503, 200])
+
+    async def call():
+        return b'', next(statuses), 'application/json'
+
+    async def run():
+        return [await store.run('k', 'f', call), await store.run('k', 'f', call)]
+
+    assert [outcome for _, outcome in asyncio.run(run())] == ['ran', 'ran']
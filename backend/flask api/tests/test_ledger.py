@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+import pytest
+
+from trading.engine import TradingEngine
+from trading.ledger import replay, projection_of, trade_event, TRADE_OPENED, TRADE_CLOSED
+from trading.writebehind import WriteBehind, Journal
+
+from fakes import FakeBase44, challenge
+
+OWNER = 'u@x.com'
+
+
+def make_engine(client, journal_path, interval=0.01):
+    return TradingEngine(client, WriteBehind(client, Journal(str(journal_path)), interval=interval, retry=0.01))
+
+
+def test_replayed_events_that_were_persisted_count_as_written(tmp_path):
+    client = FakeBase44()
+    client.add('Challenge', challenge('c1', OWNER, balance=10000))
+    journal_path = tmp_path / 'executeTrade.journal'
+
+    async def crash():
+        engine = make_engine(client, journal_path, interval=60)
+        await engine.open_trade(OWNER, 'c1', 'AAPL', 'buy', 10, 100)
+        journaled = journal_path.read_text()
+        await engine.drain(1)
+        # Crash after the flush but before it was journaled as done: the ledger writes replay
+        ledger_lines = [
+            line for line in journaled.splitlines()
+            if json.loads(line)['entity'] in ('TradeEvent', 'ChallengeSnapshot')
+        ]
+        journal_path.write_text(''.join(line + '\n' for line in ledger_lines))
+
+    asyncio.run(crash())
+    assert len(client.tables['TradeEvent']) == 1
+
+    async def restart():
+        engine = make_engine(client, journal_path)
+        assert engine.writer.stats()['replayed'] == 2
+        await engine.open_trade(OWNER, 'c1', 'AAPL', 'buy', 5, 100)
+        await engine.drain(1)
+        return engine
+
+    engine = asyncio.run(restart())
+    stats = engine.writer.stats()
+    assert stats['pending'] == 0
+    assert stats['duplicates'] == 2
+    assert sorted(event['seq'] for event in client.tables['TradeEvent'].values()) == [1, 2]
+    assert len(client.tables['ChallengeSnapshot']) == 1
+    assert journal_path.read_text() == ''
+
+    projection = asyncio.run(engine.ledger.rebuild('c1'))
+    assert projection['current_balance'] == pytest.approx(8500)
+    assert projection['total_trades'] == 2
+
+
+def test_replay_skips_a_seq_seen_twice():
+    start = projection_of({'current_balance': 1000})
+    opened = {**trade_event(TRADE_OPENED, 't1', -100), 'seq': 1}
+    closed = {**trade_event(TRADE_CLOSED, 't1', 120, 20), 'seq': 2}
+    projection = replay(start, [opened, opened, closed])
+    assert projection == {'seq': 2, 'current_balance': 1020, 'total_pnl': 20, 'total_trades': 1, 'winning_trades': 1}
+
+
+def test_rebuild_starts_from_the_latest_snapshot_and_reconcile_repairs_drift():
+    client = FakeBase44()
+    client.add('Challenge', challenge('c1', OWNER, balance=10000))
+    writer = WriteBehind(client, interval=0.01)
+    engine = TradingEngine(client, writer)
+    engine.ledger.snapshot_interval = 2
+
+    async def run():
+        for _ in range(3):
+            trade, _ = await engine.open_trade(OWNER, 'c1', 'AAPL', 'buy', 1, 100)
+        await engine.close_trade(OWNER, trade['id'], 150)
+        await engine.drain(1)
+        # Drift the loaded aggregates away from the ledger
+        engine._states['c1'].record['total_trades'] = 7
+        report = await engine.reconcile(['c1'])
+        repaired = await engine.reconcile(['c1'], apply=True)
+        await engine.drain(1)
+        return report, repaired
+
+    report, repaired = asyncio.run(run())
+    assert sorted(s['seq'] for s in client.tables['ChallengeSnapshot'].values()) == [0, 2, 4]
+    assert engine.ledger.stats()['replayed_events'] == 0
+    assert report[0]['drift'] == {'total_trades': {'stored': 7, 'ledger': 3}}
+    assert report[0]['projection']['current_balance'] == pytest.approx(9850)
+    assert repaired[0]['applied']
+    assert client.tables['Challenge']['c1']['total_trades'] == 3
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from trading.marking import EquityBook
+
+
+def challenge(balance, starting=10000, **fields):
+    return {'status': 'active', 'current_balance': balance, 'starting_balance': starting,
+            'daily_start_balance': starting, **fields}
+
+
+def test_revalue_marks_positions_per_challenge():
+    book = EquityBook(capacity=2)
+    book.set_challenge('c1', challenge(8000))
+    book.set_challenge('c2', challenge(9000))
+    book.add_position('t1', 'c1', 'AAPL', 'buy', 10, 100)
+    book.add_position('t2', 'c1', 'MSFT', 'sell', 10, 100)
+    book.add_position('t3', 'c2', 'AAPL', 'buy', 10, 100)
+
+    # Unpriced symbols are marked at entry
+    valuation = book.revalue()
+    rows = {challenge_id: row for row, challenge_id in enumerate(valuation.challenge_ids)}
+    assert valuation.equity[rows['c1']] == pytest.approx(10000)
+
+    book.update_prices({'AAPL': 110, 'MSFT': 120})
+    valuation = book.revalue()
+    assert valuation.unrealized_pnl[rows['c1']] == pytest.approx(100 - 200)
+    assert valuation.equity[rows['c1']] == pytest.approx(9900)
+    assert valuation.equity[rows['c2']] == pytest.approx(10100)
+    assert valuation.marks(rows['c1'])['total_pnl_pct'] == pytest.approx(-1)
+
+
+def test_many_new_symbols_in_one_tick():
+    book = EquityBook(capacity=1)
+    book.set_challenge('c1', challenge(0, starting=100 * 50))
+    symbols = [f'S{i}' for i in range(50)]
+    for i, symbol in enumerate(symbols):
+        book.add_position(f't{i}', 'c1', symbol, 'buy', 1, 100)
+    book.update_prices({symbol: 101 for symbol in symbols} | {f'NEW{i}': 1 for i in range(50)})
+    assert book.revalue().equity[0] == pytest.approx(50 * 101)
+
+
+def test_breaches_and_equity_changes():
+    book = EquityBook()
+    book.set_challenge('c1', challenge(0, max_total_loss_pct=10, max_daily_loss_pct=50))
+    book.add_position('t1', 'c1', 'AAPL', 'buy', 100, 100)
+    book.mark_challenge('c1')
+
+    book.update_prices({'AAPL': 100.00001})
+    assert list(book.equity_changes(book.revalue())) == []
+
+    book.update_prices({'AAPL': 89})
+    valuation = book.revalue()
+    assert list(np.flatnonzero(valuation.breached)) == [0]
+    assert list(book.equity_changes(valuation)) == [0]
+    assert list(book.equity_changes(valuation)) == []
+
+    book.remove_position('t1')
+    assert len(book) == 0
+    assert book.revalue().equity[0] == pytest.approx(0)
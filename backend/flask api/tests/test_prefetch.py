@@ -0,0 +1,14 @@
+from market.prefetch import PrefetchScheduler
+
+
+def test_cadence_is_clamped_below_the_cache_lifetime():
+    scheduler = PrefetchScheduler(None, None, min_cadence=15, max_cadence=300, lifetime=65)
+    assert scheduler.max_cadence < 65
+    assert scheduler.cadence(0.0, 1.0) < 65
+    assert scheduler.cadence(0.01, 10.0) < 65
+    assert scheduler.min_cadence == 15
+
+
+def test_min_cadence_never_exceeds_the_clamped_max():
+    scheduler = PrefetchScheduler(None, None, min_cadence=15, max_cadence=300, lifetime=5)
+    assert scheduler.min_cadence <= scheduler.max_cadence < 5
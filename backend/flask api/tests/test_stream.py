@@ -0,0 +1,27 @@
+import pytest
+
+from market.stream import QuoteStream
+
+
+class IdleRunner:
+    """Never runs the pollers"""
+
+    def submit(self, coro):
+        coro.close()
+
+
+async def no_quote(symbol):
+    return None
+
+
+def test_subscriptions_are_capped_in_number_and_symbols():
+    stream = QuoteStream(IdleRunner(), no_quote, max_subscriptions=1, max_symbols=2)
+
+    with pytest.raises(ValueError):
+        stream.subscribe(['AAPL', 'MSFT', 'TSLA'])
+    subscription = stream.subscribe(['AAPL', 'MSFT', 'AAPL'])
+    assert subscription.symbols == ['AAPL', 'MSFT']
+    assert stream.subscribe(['TSLA']) is None
+
+    stream.unsubscribe(subscription)
+    assert stream.subscribe(['TSLA']) is not None
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from trading.engine import TradingEngine
+from trading.sweeper import ChallengeSweeper
+from trading.writebehind import WriteBehind
+
+from fakes import FakeBase44, challenge
+
+TODAY = '2026-03-10'
+
+
+def test_evaluate_page_fails_passes_and_rolls_over():
+    sweeper = ChallengeSweeper(None, None)
+    records = [
+        challenge('failed', total_pnl_pct=-12),
+        challenge('daily', daily_pnl_pct=-6),
+        challenge('passed', total_pnl_pct=11),
+        challenge('new-day', equity=10250, daily_reset_date='2026-03-09', daily_pnl=250, daily_pnl_pct=2.5),
+        challenge('same-day', daily_reset_date=TODAY),
+        challenge('traded-yesterday', last_trade_date='2026-03-09T23:59:00'),
+    ]
+    updates = {update['id']: update for update in sweeper.evaluate_page(records, TODAY)}
+
+    assert updates['failed']['status'] == 'failed' and 'total' in updates['failed']['failure_reason'].lower()
+    assert updates['daily']['status'] == 'failed' and 'daily' in updates['daily']['failure_reason'].lower()
+    assert updates['passed'] == {'id': 'passed', 'status': 'passed', 'failure_reason': None}
+    assert updates['new-day'] == {
+        'id': 'new-day', 'daily_start_balance': 10250, 'daily_pnl': 0, 'daily_pnl_pct': 0, 'daily_reset_date': TODAY
+    }
+    assert updates['traded-yesterday']['daily_start_balance'] == 10000
+    assert 'same-day' not in updates
+
+
+def test_local_day_follows_the_trading_timezone():
+    sweeper = ChallengeSweeper(None, None, tz='Asia/Tokyo')
+    record = challenge('c1', last_trade_date='2026-03-09T16:00:00Z')  # 01:00 on the 10th in Tokyo
+    assert sweeper.evaluate_page([record], TODAY) == []
+
+
+def test_sweep_writes_through_the_engine_for_loaded_challenges():
+    client = FakeBase44()
+    client.add('Challenge', challenge('loaded', daily_reset_date='2020-01-01'))
+    client.add('Challenge', challenge('stored', total_pnl_pct=-20))
+    client.add('Challenge', challenge('done', status='failed'))
+    engine = TradingEngine(client, WriteBehind(client, interval=0.01))
+    sweeper = ChallengeSweeper(client.pool, client, engine, page_size=1)
+
+    async def run():
+        await engine.open_trade('u@x.com', 'loaded', 'AAPL', 'buy', 10, 100)
+        result = await sweeper.sweep()
+        await engine.drain(1)
+        return result
+
+    result = asyncio.run(run())
+    assert result['swept'] == 2 and result['pages'] == 2
+    assert result['failed'] == 1 and result['rolled_over'] == 1
+    assert engine.snapshot('loaded')['daily_reset_date'] == sweeper.today()
+    assert engine.snapshot('loaded')['daily_start_balance'] == pytest.approx(10000)
+    assert client.tables['Challenge']['loaded']['current_balance'] == pytest.approx(9000)
+    assert client.tables['Challenge']['stored']['status'] == 'failed'
@@ -0,0 +1,44 @@
+import pytest
+
+from trading.triggers import TriggerBook, levels_from_pct, STOP_LOSS, TAKE_PROFIT
+
+
+def test_levels_from_pct_follow_the_side():
+    assert levels_from_pct('buy', 100, 5, 10) == (pytest.approx(95), pytest.approx(110))
+    assert levels_from_pct('sell', 100, 5, 10) == (pytest.approx(105), pytest.approx(90))
+    assert levels_from_pct('buy', 100) == (None, None)
+
+
+def test_a_tick_fires_exactly_the_levels_it_crossed():
+    book = TriggerBook()
+    book.set('long', 'AAPL', 'buy', stop_loss=95, take_profit=110)
+    book.set('short', 'AAPL', 'sell', stop_loss=105, take_profit=90)
+    book.set('other', 'MSFT', 'buy', stop_loss=1)
+
+    assert book.crossed('AAPL', 100) == []
+    assert book.crossed('AAPL', 106) == [('short', STOP_LOSS, 105)]
+    # One of a trade's levels firing disarms the other
+    assert book.crossed('AAPL', 89) == [('long', STOP_LOSS, 95)]
+    assert 'long' not in book and 'short' not in book
+    assert len(book) == 1
+
+
+def test_replaced_and_removed_levels_do_not_fire():
+    book = TriggerBook()
+    book.set('t1', 'AAPL', 'buy', stop_loss=95, take_profit=110)
+    book.set('t1', 'AAPL', 'buy', take_profit=120)
+    book.set('t2', 'AAPL', 'buy', take_profit=105)
+    book.remove('t2')
+
+    assert book.crossed('AAPL', 90) == []
+    assert book.crossed('AAPL', 115) == []
+    assert book.crossed('AAPL', 120) == [('t1', TAKE_PROFIT, 120)]
+    assert book.stats() == {'armed_trades': 0, 'symbols': 0, 'heap_entries': 0}
+
+
+def test_clearing_both_levels_disarms_the_trade():
+    book = TriggerBook()
+    book.set('t1', 'AAPL', 'buy', stop_loss=95)
+    book.set('t1', 'AAPL', 'buy')
+    assert 't1' not in book
+    assert book.crossed('AAPL', 1) == []
@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+from trading.writebehind import WriteBehind, Journal
+
+from fakes import FakeBase44
+
+
+def test_writes_are_coalesced_into_one_bulk_call_per_entity():
+    client = FakeBase44()
+    client.add('Challenge', {'id': 'c1', 'current_balance': 100})
+    writer = WriteBehind(client, interval=60)
+
+    async def run():
+        writer.create('Trade', 'local-1', {'symbol': 'AAPL', 'status': 'open'})
+        writer.update('Trade', 'local-1', {'status': 'closed'})
+        writer.update('Challenge', 'c1', {'current_balance': 90})
+        writer.update('Challenge', 'c1', {'current_balance': 80, 'total_trades': 1})
+        assert writer.remote_id('Trade', 'local-1') is None
+        await writer.drain(1)
+
+    asyncio.run(run())
+    assert client.calls == [('bulk_create', 'Trade'), ('bulk_update', 'Challenge')]
+    [trade] = client.tables['Trade'].values()
+    assert trade['status'] == 'closed'
+    assert writer.remote_id('Trade', 'local-1') == trade['id']
+    assert client.tables['Challenge']['c1'] == {'id': 'c1', 'current_balance': 80, 'total_trades': 1}
+
+
+def test_failed_batches_are_retried_with_newer_writes_on_top():
+    client = FakeBase44()
+    client.add('Challenge', {'id': 'c1', 'current_balance': 100})
+    writer = WriteBehind(client, interval=60, retry=0.01)
+
+    async def run():
+        client.down = True
+        writer.update('Challenge', 'c1', {'current_balance': 90, 'equity': 90})
+        assert not await writer.flush()
+        writer.update('Challenge', 'c1', {'current_balance': 80})
+        client.down = False
+        await writer.drain(1)
+
+    asyncio.run(run())
+    assert client.tables['Challenge']['c1'] == {'id': 'c1', 'current_balance': 80, 'equity': 90}
+    stats = writer.stats()
+    assert stats['flush_errors'] == 1 and stats['pending'] == 0
+
+
+def test_journal_replays_only_unflushed_writes(tmp_path):
+    path = tmp_path / 'service.journal'
+    client = FakeBase44()
+    client.add('Challenge', {'id': 'c1'})
+
+    async def run():
+        writer = WriteBehind(client, Journal(str(path)), interval=60)
+        writer.create('Trade', 'local-1', {'symbol': 'AAPL'})
+        await writer.flush()
+        client.down = True
+        writer.update('Trade', 'local-1', {'status': 'closed'})
+        writer.update('Challenge', 'c1', {'total_trades': 1})
+        await writer.flush()
+
+    asyncio.run(run())
+    # A crash can tear the last line
+    with open(path, 'a') as f:
+        f.write(json.dumps({'seq': 99, 'op': 'update'})[:10])
+
+    client.down = False
+    writer = WriteBehind(client, Journal(str(path)), interval=60)
+    assert writer.stats()['replayed'] == 2
+
+    asyncio.run(writer.flush())
+    [trade] = client.tables['Trade'].values()
+    assert trade['status'] == 'closed'
+    assert client.tables['Challenge']['c1']['total_trades'] == 1
+    assert path.read_text() == ''
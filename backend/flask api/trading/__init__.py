@@ -0,0 +1,14 @@
+from .engine import TradingEngine, TradingError, ChallengeState, get_engine
+from .ledger import TradeLedger, apply_event, replay
+from .marking import EquityBook, Valuation
+from .rules import evaluate_challenge, evaluate_batch
+from .sweeper import ChallengeSweeper
+from .triggers import TriggerBook, levels_from_pct
+from .writebehind import WriteBehind, Journal
+
+__all__ = [
+    'TradingEngine', 'TradingError', 'ChallengeState', 'get_engine', 'evaluate_challenge', 'evaluate_batch',
+    'ChallengeSweeper', 'EquityBook', 'Valuation', 'TriggerBook', 'levels_from_pct', 'TradeLedger', 'apply_event',
+    'replay',
+    'WriteBehind', 'Journal'
+]
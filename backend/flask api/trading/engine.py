@@ -0,0 +1,640 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from .ledger import TradeLedger, trade_event, TRADE_OPENED, TRADE_CLOSED, PROJECTED_FIELDS, LEDGER_DRIFT_TOLERANCE
+from .marking import EquityBook
+from .rules import evaluate_challenge
+from .triggers import TriggerBook, levels_from_pct
+from .writebehind import WriteBehind, Journal
+
+# Set TRADING_JOURNAL_DIR to an empty string to run without a journal
+TRADING_JOURNAL_DIR = os.environ.get(
+    'TRADING_JOURNAL_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'journal')
+)
+TRADING_STATE_TTL = float(os.environ.get('TRADING_STATE_TTL', 3600))
+TRIGGER_RESTORE_PAGE_SIZE = int(os.environ.get('TRIGGER_RESTORE_PAGE_SIZE', 500))
+# How long a ledger rebuild waits for queued writes to be flushed first
+LEDGER_DRAIN_TIMEOUT = float(os.environ.get('LEDGER_DRAIN_TIMEOUT', 30))
+
+
+class TradingError(Exception):
+    """An order rejected for a client-side reason; status is the HTTP status to answer with"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class ChallengeState:
+    """A loaded challenge record and its open positions"""
+
+    def __init__(self, record: Dict[str, Any], positions: Dict[str, Dict[str, Any]]):
+        self.id = record['id']
+        self.owner = record.get('created_by')
+        self.record = record
+        self.positions = positions
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+    def get(self, field: str, default: float = 0) -> Any:
+        value = self.record.get(field)
+        return default if value is None else value
+
+    def apply(self, updates: Dict[str, Any]):
+        self.record.update(updates)
+
+
+def resolve_levels(side: str, entry_price: float, levels: Optional[Dict[str, float]]) -> Dict[str, float]:
+    """Trade fields for levels given as prices (stop_loss, take_profit) or as percentages of
+    the entry price (stop_loss_pct, take_profit_pct); prices win when both are given"""
+    if not levels:
+        return {}
+    stop_loss, take_profit = levels_from_pct(
+        side, entry_price, levels.get('stop_loss_pct'), levels.get('take_profit_pct')
+    )
+    resolved = {
+        'stop_loss': levels.get('stop_loss', stop_loss),
+        'take_profit': levels.get('take_profit', take_profit)
+    }
+    return {field: level for field, level in resolved.items() if level is not None}
+
+
+class TradingEngine:
+    """Applies orders to in-memory challenge state and persists them write-behind.
+
+    A challenge is loaded (record plus open trades) on its first order and
+    then kept in memory; orders on one challenge are serialized by its lock
+    and acknowledged as soon as they are applied and journaled, while the
+    Trade/Challenge writes are flushed in batches by the WriteBehind queue.
+    Challenges idle for ``state_ttl`` seconds with nothing left to flush are
+    dropped. State is per process: every order for a challenge must reach
+    the same process, which is why executeTrade also serves /close_trade.
+    Open positions are mirrored in an EquityBook so that every loaded
+    challenge can be marked to market at once; marks come only from price
+    ticks, never from the prices orders carry. Stop-loss / take-profit
+    levels are kept in a TriggerBook so that a price tick closes exactly
+    the positions whose levels it crossed; challenges with armed levels are
+    never evicted. Every balance change is also appended to a TradeLedger,
+    from which the challenge aggregates can be rebuilt and reconciled. All
+    methods run on the HTTP pool loop.
+    """
+
+    def __init__(self, client, writer: WriteBehind, state_ttl: float = TRADING_STATE_TTL):
+        self.client = client
+        self.writer = writer
+        self.state_ttl = state_ttl
+        self._states: Dict[str, ChallengeState] = {}
+        self._loading: Dict[str, asyncio.Lock] = {}
+        # Writes replayed from the journal must reach Base44 before the first load reads it
+        self._recovered = not writer.pending()
+        self._recovering = asyncio.Lock()
+        self._trades: Dict[str, str] = {}  # trade id -> challenge id
+        self.book = EquityBook()
+        self.triggers = TriggerBook()
+        self._triggers_restored = False
+        self.ledger = TradeLedger(client, writer)
+        self._stats = {
+            'orders': 0, 'rejected': 0, 'batches': 0, 'loads': 0, 'evictions': 0, 'marks': 0, 'marked_failures': 0,
+            'triggered': 0
+        }
+
+    def _evict_idle(self):
+        if self.writer.pending():
+            return
+        cutoff = time.monotonic() - self.state_ttl
+        for challenge_id, state in list(self._states.items()):
+            if state.last_used < cutoff and not state.lock.locked():
+                if any(trade_id in self.triggers for trade_id in state.positions):
+                    continue
+                del self._states[challenge_id]
+                self.book.remove_challenge(challenge_id)
+                for trade_id in [t for t, c in self._trades.items() if c == challenge_id]:
+                    del self._trades[trade_id]
+                self._stats['evictions'] += 1
+
+    async def _recover(self):
+        """Flush the writes replayed from the journal before any state is read back from Base44, which
+        doesn't reflect them yet"""
+        if self._recovered:
+            return
+        async with self._recovering:
+            if self._recovered:
+                return
+            self.writer.start()
+            try:
+                await self.writer.drain(LEDGER_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise TradingError('Trading state is still being recovered, try again shortly', 503)
+            self._recovered = True
+
+    async def _load(self, challenge_id: str, owner: Optional[str]) -> ChallengeState:
+        state = self._states.get(challenge_id)
+        if state is None:
+            await self._recover()
+            lock = self._loading.setdefault(challenge_id, asyncio.Lock())
+            try:
+                async with lock:
+                    state = self._states.get(challenge_id)
+                    if state is None:
+                        self._evict_idle()
+                        challenges = await self.client.entities.Challenge.filter({'id': challenge_id})
+                        if not challenges:
+                            raise TradingError('Challenge not found', 404)
+                        trades = await self.client.entities.Trade.filter(
+                            {'challenge_id': challenge_id, 'status': 'open'}
+                        )
+                        state = ChallengeState(dict(challenges[0]), {trade['id']: dict(trade) for trade in trades})
+                        self._states[challenge_id] = state
+                        self._trades.update((trade_id, challenge_id) for trade_id in state.positions)
+                        self._trades.update(
+                            (trade['client_id'], challenge_id) for trade in trades if trade.get('client_id')
+                        )
+                        self.book.set_challenge(challenge_id, state.record)
+                        for trade_id, trade in state.positions.items():
+                            self._book_position(challenge_id, trade_id, trade)
+                            self._arm(trade_id, trade)
+                        self._stats['loads'] += 1
+            finally:
+                self._loading.pop(challenge_id, None)
+        if owner is not None and state.owner != owner:
+            raise TradingError('Challenge not found', 404)
+        state.last_used = time.monotonic()
+        return state
+
+    def _book_position(self, challenge_id: str, trade_id: str, trade: Dict[str, Any]):
+        self.book.add_position(
+            trade_id, challenge_id, trade.get('symbol'), trade.get('side'),
+            trade.get('quantity') or 0, trade.get('entry_price') or 0
+        )
+
+    def _arm(self, trade_id: str, trade: Dict[str, Any]):
+        self.triggers.set(
+            trade_id, trade.get('symbol'), trade.get('side'), trade.get('stop_loss'), trade.get('take_profit')
+        )
+
+    def _persist_challenge(self, state: ChallengeState, updates: Dict[str, Any]):
+        state.apply(updates)
+        self.book.set_challenge(state.id, state.record)
+        if 'current_balance' in updates:
+            # Equity is the cash balance plus the open positions at their last prices
+            updates = {**updates, 'equity': self.book.mark_challenge(state.id)}
+            state.apply(updates)
+        self.writer.update('Challenge', state.id, updates)
+
+    def _evaluate(self, state: ChallengeState) -> Dict[str, Any]:
+        evaluation = evaluate_challenge(state.record)
+        if evaluation['status'] not in ('active', state.record.get('status')):
+            self._persist_challenge(state, {
+                'status': evaluation['status'],
+                'failure_reason': evaluation['failureReason']
+            })
+        return evaluation
+
+    async def _open_trade(self, owner: str, challenge_id: str, symbol: str, side: str, quantity: float,
+                          price: float, levels: Optional[Dict[str, float]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        state = await self._load(challenge_id, owner)
+        async with state.lock:
+            if state.record.get('status') != 'active':
+                raise TradingError('Challenge is not active')
+
+            trade_cost = quantity * price
+            if trade_cost > state.get('current_balance'):
+                raise TradingError('Insufficient balance')
+
+            now = datetime.utcnow().isoformat()
+            trade = self._add_position(state, symbol, side, quantity, price, now, levels)
+            self._persist_challenge(state, {
+                'current_balance': state.get('current_balance') - trade_cost,
+                'total_trades': state.get('total_trades') + 1,
+                'last_trade_date': now,
+                'ledger_seq': self.ledger.append(state.record, [
+                    trade_event(TRADE_OPENED, trade['id'], -trade_cost)
+                ])
+            })
+            return dict(trade), self._evaluate(state)
+
+    def _add_position(self, state: ChallengeState, symbol: str, side: str, quantity: float, price: float,
+                      now: str, levels: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """Queue the create of a new open trade and track it; the caller debits the balance"""
+        trade = {
+            'challenge_id': state.id,
+            'symbol': symbol,
+            'side': side,
+            'quantity': quantity,
+            'entry_price': price,
+            'status': 'open',
+            'open_time': now
+        }
+        trade.update(resolve_levels(side, price, levels))
+        trade_id = str(uuid.uuid4())
+        # Stored with the record so the id handed to the client resolves once the mapping is gone
+        trade['client_id'] = trade_id
+        self.writer.create('Trade', trade_id, trade)
+        trade = {'id': trade_id, **trade}
+        state.positions[trade_id] = trade
+        self._trades[trade_id] = state.id
+        self._book_position(state.id, trade_id, trade)
+        self._arm(trade_id, trade)
+        return trade
+
+    async def _open_challenge_batch(self, owner: str, challenge_id: str,
+                                    orders: List[Tuple[int, Dict[str, Any]]],
+                                    results: List[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Open a challenge's share of a batch in order; fills results by order index"""
+        try:
+            state = await self._load(challenge_id, owner)
+        except TradingError as error:
+            for index, _ in orders:
+                results[index] = {'success': False, 'error': error.message, 'status': error.status}
+            return {}
+        async with state.lock:
+            if state.record.get('status') != 'active':
+                for index, _ in orders:
+                    results[index] = {'success': False, 'error': 'Challenge is not active', 'status': 400}
+                return {}
+
+            # Every order is checked against the balance left by the ones accepted before it
+            balance = state.get('current_balance')
+            now = datetime.utcnow().isoformat()
+            events = []
+            for index, order in orders:
+                trade_cost = order['quantity'] * order['price']
+                if trade_cost > balance:
+                    results[index] = {'success': False, 'error': 'Insufficient balance', 'status': 400}
+                    continue
+                balance -= trade_cost
+                trade = self._add_position(
+                    state, order['symbol'], order['side'], order['quantity'], order['price'], now, order.get('levels')
+                )
+                results[index] = {'success': True, 'trade': dict(trade)}
+                events.append(trade_event(TRADE_OPENED, trade['id'], -trade_cost))
+
+            if not events:
+                return {}
+            self._persist_challenge(state, {
+                'current_balance': balance,
+                'total_trades': state.get('total_trades') + len(events),
+                'last_trade_date': now,
+                'ledger_seq': self.ledger.append(state.record, events)
+            })
+            return self._evaluate(state)
+
+    async def _open_trades(self, owner: str, orders: List[Dict[str, Any]]) -> Tuple[list, Dict[str, Any]]:
+        self.writer.start()
+        by_challenge: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+        for index, order in enumerate(orders):
+            by_challenge.setdefault(order['challenge_id'], []).append((index, order))
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(orders)
+
+        async def open_group(challenge_id: str, challenge_orders: List[Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+            # One challenge failing mustn't fail the batch: the other groups' trades are already open
+            try:
+                return await self._open_challenge_batch(owner, challenge_id, challenge_orders, results)
+            except Exception as error:
+                logging.error(f'Batch orders for challenge {challenge_id} failed: {error}', exc_info=True)
+                for index, _ in challenge_orders:
+                    if results[index] is None:
+                        results[index] = {'success': False, 'error': str(error), 'status': 500}
+                return {}
+
+        evaluations = await asyncio.gather(*(
+            open_group(challenge_id, challenge_orders) for challenge_id, challenge_orders in by_challenge.items()
+        ))
+        accepted = sum(1 for result in results if result['success'])
+        self._stats['orders'] += accepted
+        self._stats['rejected'] += len(results) - accepted
+        self._stats['batches'] += 1
+        return results, {
+            challenge_id: evaluation
+            for challenge_id, evaluation in zip(by_challenge, evaluations) if evaluation
+        }
+
+    def _find_position(self, state: ChallengeState, trade_id: str) -> Optional[str]:
+        """Key of the open position trade_id refers to, by local or remote id"""
+        if trade_id in state.positions:
+            return trade_id
+        for key, trade in state.positions.items():
+            if trade.get('client_id') == trade_id or self.writer.remote_id('Trade', key) == trade_id:
+                return key
+        return None
+
+    async def _challenge_of(self, trade_id: str) -> str:
+        """Id of the challenge an open trade belongs to"""
+        challenge_id = self._trades.get(trade_id)
+        if challenge_id is None:
+            await self._recover()
+            trades = await self.client.entities.Trade.filter({'id': trade_id})
+            if not trades:
+                # An id handed out before the create was flushed (see _add_position)
+                trades = await self.client.entities.Trade.filter({'client_id': trade_id})
+            if not trades:
+                raise TradingError('Trade not found', 404)
+            if trades[0].get('status') != 'open':
+                raise TradingError('Trade is already closed')
+            challenge_id = trades[0].get('challenge_id')
+        return challenge_id
+
+    async def _close_trade(self, owner: Optional[str], trade_id: str, exit_price: float,
+                           close_reason: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        state = await self._load(await self._challenge_of(trade_id), owner)
+        async with state.lock:
+            key = self._find_position(state, trade_id)
+            if key is None:
+                raise TradingError('Trade is already closed')
+            trade = state.positions.pop(key)
+            self.book.remove_position(key)
+            self.triggers.remove(key)
+
+            entry_price = trade.get('entry_price', 0)
+            quantity = trade.get('quantity', 0)
+            if trade.get('side') == 'buy':
+                price_diff = exit_price - entry_price
+            else:
+                price_diff = entry_price - exit_price
+            pnl = price_diff * quantity
+            pnl_pct = (price_diff / entry_price) * 100 if entry_price != 0 else 0
+
+            trade_updates = {
+                'exit_price': exit_price,
+                'pnl': pnl,
+                'pnl_pct': pnl_pct,
+                'status': 'closed',
+                'close_time': datetime.utcnow().isoformat()
+            }
+            if close_reason:
+                trade_updates['close_reason'] = close_reason
+            self.writer.update('Trade', key, trade_updates)
+
+            starting_balance = state.get('starting_balance')
+            daily_start_balance = state.get('daily_start_balance', starting_balance)
+            total_pnl = state.get('total_pnl') + pnl
+            daily_pnl = state.get('daily_pnl') + pnl
+            released = quantity * entry_price + pnl
+            self._persist_challenge(state, {
+                'current_balance': state.get('current_balance') + released,
+                'total_pnl': total_pnl,
+                'total_pnl_pct': (total_pnl / starting_balance) * 100 if starting_balance != 0 else 0,
+                'daily_pnl': daily_pnl,
+                'daily_pnl_pct': (daily_pnl / daily_start_balance) * 100 if daily_start_balance != 0 else 0,
+                'winning_trades': state.get('winning_trades') + (1 if pnl > 0 else 0),
+                'ledger_seq': self.ledger.append(state.record, [
+                    trade_event(TRADE_CLOSED, trade['id'], released, pnl)
+                ])
+            })
+            return {**trade, **trade_updates}, self._evaluate(state)
+
+    async def _set_levels(self, owner: str, trade_id: str, levels: Dict[str, float]) -> Dict[str, Any]:
+        state = await self._load(await self._challenge_of(trade_id), owner)
+        async with state.lock:
+            key = self._find_position(state, trade_id)
+            if key is None:
+                raise TradingError('Trade is already closed')
+            trade = state.positions[key]
+            updates = {'stop_loss': None, 'take_profit': None}
+            updates.update(resolve_levels(trade.get('side'), trade.get('entry_price') or 0, levels))
+            trade.update(updates)
+            self.writer.update('Trade', key, updates)
+            self._arm(key, trade)
+            return dict(trade)
+
+    async def _restore_triggers(self):
+        """Load every challenge with an open trade that has levels, so they are watched after a restart"""
+        await self._recover()
+        challenge_ids, after = set(), None
+        while True:
+            filters: Dict[str, Any] = {'status': 'open'}
+            if after is not None:
+                filters['id'] = {'$gt': after}
+            page = await self.client.entities.Trade.filter(
+                filters, fields=['id', 'challenge_id', 'stop_loss', 'take_profit'],
+                limit=TRIGGER_RESTORE_PAGE_SIZE, sort='id'
+            )
+            challenge_ids.update(
+                trade.get('challenge_id') for trade in page
+                if trade.get('stop_loss') is not None or trade.get('take_profit') is not None
+            )
+            if len(page) < TRIGGER_RESTORE_PAGE_SIZE:
+                break
+            after = page[-1]['id']
+        for challenge_id in challenge_ids - set(self._states):
+            try:
+                await self._load(challenge_id, None)
+            except TradingError:
+                pass
+        self._triggers_restored = True
+
+    async def _fire_triggers(self, prices: Dict[str, float]) -> List[Dict[str, Any]]:
+        """Close, at the tick price, every position whose stop loss or take profit prices crossed"""
+        fired = []
+        for symbol, price in prices.items():
+            for trade_id, reason, level in self.triggers.crossed(symbol, price):
+                try:
+                    trade, evaluation = await self._close_trade(None, trade_id, price, reason)
+                except TradingError:
+                    continue
+                fired.append({'tradeId': trade['id'], 'reason': reason, 'level': level, 'exitPrice': price,
+                              'pnl': trade['pnl'], 'status': evaluation['status']})
+        self._stats['triggered'] += len(fired)
+        return fired
+
+    async def _mark_to_market(self, prices: Dict[str, float]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        if not self._triggers_restored:
+            await self._restore_triggers()
+        triggered = await self._fire_triggers(prices)
+        self.book.update_prices(prices)
+        valuation = self.book.revalue()
+
+        failed = []
+        for row in np.flatnonzero(valuation.breached):
+            state = self._states.get(valuation.challenge_ids[row])
+            if state is None:
+                continue
+            marks = valuation.marks(row)
+            evaluation = evaluate_challenge({**state.record, **marks})
+            if evaluation['status'] == 'failed':
+                self._persist_challenge(state, {
+                    'equity': marks['equity'],
+                    'status': 'failed',
+                    'failure_reason': evaluation['failureReason']
+                })
+                failed.append(state.id)
+
+        updated = 0
+        for row in self.book.equity_changes(valuation):
+            state = self._states.get(valuation.challenge_ids[row])
+            if state is not None:
+                self._persist_challenge(state, {'equity': float(valuation.equity[row])})
+                updated += 1
+
+        self._stats['marks'] += 1
+        self._stats['marked_failures'] += len(failed)
+        return {
+            'positions': len(self.book),
+            'challenges': len(self._states),
+            'equityUpdated': updated,
+            'triggered': triggered,
+            'failed': failed,
+            'elapsedMs': round((time.perf_counter() - started) * 1000, 3)
+        }
+
+    async def _reconcile(self, challenge_ids: List[str], apply: bool) -> List[Dict[str, Any]]:
+        # Rebuild from what has been persisted, including everything acknowledged so far
+        await self.writer.drain(LEDGER_DRAIN_TIMEOUT)
+        projections = await self.ledger.rebuild_many(challenge_ids)
+        unloaded = [challenge_id for challenge_id in challenge_ids if challenge_id not in self._states]
+        stored = {}
+        if unloaded:
+            records = await self.client.entities.Challenge.filter({'id': {'$in': unloaded}})
+            stored = {record['id']: record for record in records}
+
+        results, remote = [], []
+        for challenge_id in challenge_ids:
+            projection = projections[challenge_id]
+            state = self._states.get(challenge_id)
+            record = state.record if state is not None else stored.get(challenge_id)
+            result: Dict[str, Any] = {'challengeId': challenge_id, 'projection': projection}
+            results.append(result)
+            if record is None:
+                result['error'] = 'Challenge not found'
+                continue
+            if projection is None:
+                result['error'] = 'Challenge has no ledger'
+                continue
+            if projection['seq'] != (record.get('ledger_seq') or 0):
+                # Only possible for a loaded challenge that traded while the ledger was read
+                result['error'] = 'Challenge changed during the rebuild'
+                continue
+            result['drift'] = {
+                field: {'stored': record.get(field), 'ledger': projection[field]}
+                for field in PROJECTED_FIELDS
+                if abs((record.get(field) or 0) - projection[field]) >= LEDGER_DRIFT_TOLERANCE
+            }
+            if not apply or not result['drift']:
+                continue
+            starting_balance = record.get('starting_balance') or 0
+            updates = {field: projection[field] for field in PROJECTED_FIELDS}
+            updates['total_pnl_pct'] = (projection['total_pnl'] / starting_balance) * 100 if starting_balance else 0
+            if state is not None:
+                self._persist_challenge(state, updates)
+            else:
+                remote.append({'id': challenge_id, **updates})
+            result['applied'] = True
+
+        if remote and not await self.client.entities.Challenge.bulk_update(remote):
+            for result in results:
+                if result.get('applied') and result['challengeId'] not in self._states:
+                    result['applied'] = False
+        return results
+
+    def snapshot(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        """Copy of a challenge's in-memory record, or None if it isn't loaded here"""
+        state = self._states.get(challenge_id)
+        return dict(state.record) if state is not None else None
+
+    def apply_updates(self, challenge_id: str, updates: Dict[str, Any]) -> bool:
+        """Apply and persist updates made outside an order (e.g. by the sweeper) to a loaded
+        challenge; False if it isn't loaded here and the caller should write them itself"""
+        state = self._states.get(challenge_id)
+        if state is None:
+            return False
+        self.writer.start()
+        self._persist_challenge(state, updates)
+        return True
+
+    async def _run_order(self, coro):
+        self.writer.start()
+        try:
+            result = await coro
+        except TradingError:
+            self._stats['rejected'] += 1
+            raise
+        self._stats['orders'] += 1
+        return result
+
+    async def open_trade(self, owner: str, challenge_id: str, symbol: str, side: str, quantity: float, price: float,
+                         levels: Optional[Dict[str, float]] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Open a position, with optional stop-loss/take-profit levels (see resolve_levels);
+        returns the trade and the challenge evaluation"""
+        return await self.client.pool.run(
+            self._run_order(self._open_trade(owner, challenge_id, symbol, side, quantity, price, levels))
+        )
+
+    async def open_trades(self, owner: str, orders: List[Dict[str, Any]]) -> Tuple[list, Dict[str, Any]]:
+        """Open a batch of positions across one or more challenges.
+
+        orders hold challenge_id, symbol, side, quantity, price and
+        optionally levels (see resolve_levels). Each
+        challenge is loaded once and gets one balance update and one
+        evaluation for all of its orders. Returns per-order results
+        ({'success', 'trade'} or {'success', 'error', 'status'}, in order)
+        and the evaluation of each challenge that opened something.
+        """
+        return await self.client.pool.run(self._open_trades(owner, orders))
+
+    async def close_trade(self, owner: str, trade_id: str,
+                          exit_price: float) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Close an open position; returns the closed trade and the challenge evaluation"""
+        return await self.client.pool.run(self._run_order(self._close_trade(owner, trade_id, exit_price)))
+
+    async def set_levels(self, owner: str, trade_id: str, levels: Dict[str, float]) -> Dict[str, Any]:
+        """Attach, replace or clear (with no levels) an open trade's stop loss and take profit"""
+        self.writer.start()
+        return await self.client.pool.run(self._set_levels(owner, trade_id, levels))
+
+    async def mark_to_market(self, prices: Dict[str, float]) -> Dict[str, Any]:
+        """Apply a price tick (symbol -> last price): close the positions whose stop loss or take
+        profit it crossed, revalue every open position, persist marked equity and fail the
+        challenges whose marked P&L breaches a loss limit"""
+        async def mark():
+            self.writer.start()
+            return await self._mark_to_market(prices)
+        return await self.client.pool.run(mark())
+
+    async def reconcile(self, challenge_ids: List[str], apply: bool = False) -> List[Dict[str, Any]]:
+        """Rebuild challenges' aggregates from the ledger and report where the stored ones drifted;
+        with apply, overwrite the drifted aggregates with the rebuilt ones"""
+        async def reconcile():
+            self.writer.start()
+            return await self._reconcile(challenge_ids, apply)
+        return await self.client.pool.run(reconcile())
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Wait until every acknowledged order has been persisted"""
+        await self.client.pool.run(self.writer.drain(timeout))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            'challenges': len(self._states),
+            'book': self.book.stats(),
+            'triggers': self.triggers.stats(),
+            'ledger': self.ledger.stats(),
+            'write_behind': self.writer.stats()
+        }
+
+
+_engines: Dict[str, TradingEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(client, name: str) -> TradingEngine:
+    """Process-wide engine for a service; name keys its journal file under TRADING_JOURNAL_DIR"""
+    with _engines_lock:
+        engine = _engines.get(name)
+        if engine is None:
+            journal = Journal(os.path.join(TRADING_JOURNAL_DIR, f'{name}.journal')) if TRADING_JOURNAL_DIR else None
+            engine = TradingEngine(client, WriteBehind(client, journal))
+            _engines[name] = engine
+    return engine
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import uuid
+from typing import Dict, Any, List, Optional, Mapping, Iterable
+
+# A challenge is snapshotted every this many events, which bounds the tail a rebuild replays
+LEDGER_SNAPSHOT_INTERVAL = int(os.environ.get('LEDGER_SNAPSHOT_INTERVAL', 100))
+LEDGER_PAGE_SIZE = int(os.environ.get('LEDGER_PAGE_SIZE', 500))
+LEDGER_REBUILD_CONCURRENCY = int(os.environ.get('LEDGER_REBUILD_CONCURRENCY', 8))
+# Stored aggregates further than this from the rebuilt ones count as drifted
+LEDGER_DRIFT_TOLERANCE = float(os.environ.get('LEDGER_DRIFT_TOLERANCE', 0.01))
+
+TRADE_OPENED = 'trade_opened'
+TRADE_CLOSED = 'trade_closed'
+
+# Challenge fields that are projections of the ledger
+PROJECTED_FIELDS = ['current_balance', 'total_pnl', 'total_trades', 'winning_trades']
+
+
+def trade_event(event_type: str, trade_id: str, balance_delta: float, pnl: float = 0) -> Dict[str, Any]:
+    """A ledger event, with the TradeEvent fields; balance_delta is the cash it moved (a trade's cost
+    is debited when opened)"""
+    return {
+        'event_type': event_type,
+        'trade_id': trade_id,
+        'balance_delta': balance_delta,
+        'pnl': pnl
+    }
+
+
+def projection_of(record: Mapping[str, Any]) -> Dict[str, Any]:
+    """The projected fields of a Challenge (or ChallengeSnapshot) record, with its ledger position"""
+    return {
+        'seq': int(record.get('ledger_seq', record.get('seq')) or 0),
+        'current_balance': record.get('current_balance') or 0,
+        'total_pnl': record.get('total_pnl') or 0,
+        'total_trades': int(record.get('total_trades') or 0),
+        'winning_trades': int(record.get('winning_trades') or 0)
+    }
+
+
+def apply_event(projection: Dict[str, Any], event: Mapping[str, Any]) -> Dict[str, Any]:
+    """The projection after one more event (pure)"""
+    opened = event.get('event_type') == TRADE_OPENED
+    closed = event.get('event_type') == TRADE_CLOSED
+    pnl = event.get('pnl') or 0
+    return {
+        'seq': event.get('seq', projection['seq'] + 1),
+        'current_balance': projection['current_balance'] + (event.get('balance_delta') or 0),
+        'total_pnl': projection['total_pnl'] + pnl,
+        'total_trades': projection['total_trades'] + (1 if opened else 0),
+        'winning_trades': projection['winning_trades'] + (1 if closed and pnl > 0 else 0)
+    }
+
+
+def replay(projection: Dict[str, Any], events: Iterable[Mapping[str, Any]]) -> Dict[str, Any]:
+    """Fold events (ordered by seq) into a projection; a seq seen twice counts once"""
+    for event in events:
+        if event.get('seq', projection['seq'] + 1) > projection['seq']:
+            projection = apply_event(projection, event)
+    return projection
+
+
+class TradeLedger:
+    """Append-only per-challenge log of trade events, with periodic snapshots.
+
+    Every change to a challenge's projected fields (see PROJECTED_FIELDS)
+    is recorded as a TradeEvent numbered by the challenge's ledger_seq.
+    Before a challenge's first event its current fields are written as the
+    seq 0 snapshot, so challenges that traded before the ledger existed
+    replay from where they were; after that a ChallengeSnapshot is written
+    every ``snapshot_interval`` events. A challenge is rebuilt from its
+    latest snapshot plus the events after it, so a rebuild reads at most
+    one snapshot and about ``snapshot_interval`` events whatever the
+    challenge's history, and challenges rebuild independently of each
+    other. Events and snapshots go through the engine's WriteBehind queue,
+    journaled with the Challenge update they belong to. Both are unique on
+    (challenge_id, seq), so an event a replayed journal delivers again is
+    counted as already written (and replay skips a seq seen twice anyway).
+    """
+
+    def __init__(self, client, writer, snapshot_interval: int = LEDGER_SNAPSHOT_INTERVAL,
+                 page_size: int = LEDGER_PAGE_SIZE, concurrency: int = LEDGER_REBUILD_CONCURRENCY):
+        if snapshot_interval <= 0:
+            raise ValueError('snapshot_interval must be positive')
+        self.client = client
+        self.writer = writer
+        self.snapshot_interval = snapshot_interval
+        self.page_size = page_size
+        self.concurrency = concurrency
+        writer.set_unique('TradeEvent', ('challenge_id', 'seq'))
+        writer.set_unique('ChallengeSnapshot', ('challenge_id', 'seq'))
+        self._stats = {'events': 0, 'snapshots': 0, 'rebuilds': 0, 'replayed_events': 0}
+
+    def _snapshot(self, challenge_id: str, projection: Dict[str, Any]):
+        self.writer.create('ChallengeSnapshot', str(uuid.uuid4()), {'challenge_id': challenge_id, **projection})
+        self._stats['snapshots'] += 1
+
+    def append(self, record: Mapping[str, Any], events: List[Dict[str, Any]]) -> int:
+        """Queue events for a challenge whose record doesn't reflect them yet; returns the new
+        ledger_seq, which the caller persists along with the events' effect on the record"""
+        projection = projection_of(record)
+        if projection['seq'] == 0:
+            self._snapshot(record['id'], projection)
+        for event in events:
+            event = {**event, 'challenge_id': record['id'], 'seq': projection['seq'] + 1}
+            self.writer.create('TradeEvent', str(uuid.uuid4()), event)
+            projection = apply_event(projection, event)
+            if projection['seq'] % self.snapshot_interval == 0:
+                self._snapshot(record['id'], projection)
+        self._stats['events'] += len(events)
+        return projection['seq']
+
+    async def _events_after(self, challenge_id: str, seq: int) -> List[Dict[str, Any]]:
+        events = []
+        while True:
+            page = await self.client.entities.TradeEvent.filter(
+                {'challenge_id': challenge_id, 'seq': {'$gt': seq}}, limit=self.page_size, sort='seq'
+            )
+            events.extend(page)
+            if len(page) < self.page_size:
+                return events
+            seq = page[-1]['seq']
+
+    async def rebuild(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        """The challenge's projection from its latest snapshot and the events since, or None if it
+        has no ledger yet"""
+        snapshots = await self.client.entities.ChallengeSnapshot.filter(
+            {'challenge_id': challenge_id}, limit=1, sort='-seq'
+        )
+        if not snapshots:
+            return None
+        events = await self._events_after(challenge_id, int(snapshots[0].get('seq') or 0))
+        self._stats['rebuilds'] += 1
+        self._stats['replayed_events'] += len(events)
+        return replay(projection_of(snapshots[0]), events)
+
+    async def rebuild_many(self, challenge_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """rebuild for every challenge, ``concurrency`` at a time"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def rebuild_one(challenge_id: str) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                return await self.rebuild(challenge_id)
+
+        projections = await asyncio.gather(*(rebuild_one(challenge_id) for challenge_id in challenge_ids))
+        return dict(zip(challenge_ids, projections))
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats)
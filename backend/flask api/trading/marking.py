@@ -0,0 +1,223 @@
+import os
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Mapping
+
+import numpy as np
+
+# Marked equity moving less than this since it was last persisted isn't written back
+MARK_EQUITY_TOLERANCE = float(os.environ.get('MARK_EQUITY_TOLERANCE', 0.01))
+
+
+@dataclass(frozen=True)
+class Valuation:
+    """Per-challenge marks from one revaluation, indexed like challenge_ids (None for free rows)"""
+    challenge_ids: List[Optional[str]]
+    equity: np.ndarray
+    unrealized_pnl: np.ndarray
+    total_pnl_pct: np.ndarray
+    daily_pnl_pct: np.ndarray
+    breached: np.ndarray
+
+    def marks(self, index: int) -> Dict[str, float]:
+        """Challenge fields for one row, marked to market"""
+        return {
+            'equity': float(self.equity[index]),
+            'total_pnl_pct': float(self.total_pnl_pct[index]),
+            'daily_pnl_pct': float(self.daily_pnl_pct[index])
+        }
+
+
+def _grow(array: np.ndarray, size: int, fill=0) -> np.ndarray:
+    if size <= len(array):
+        return array
+    grown = np.full(max(size, 2 * len(array)), fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class EquityBook:
+    """Every open position as flat arrays, revalued for all challenges in one pass.
+
+    Positions are rows of parallel arrays (challenge row, symbol row, side
+    sign, quantity, entry price); removing one moves the last row into its
+    slot so the arrays stay dense. Challenges hold their cash balance and
+    loss limits, symbols their last price. A revaluation is a handful of
+    vectorized operations plus two bincounts, whatever the number of
+    positions. A position is charged its full cost when opened (the
+    trading engine debits quantity * entry price for either side), so
+    equity is cash plus cost plus unrealized P&L. Not thread-safe; the
+    trading engine uses it from the pool loop only.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._size = 0
+        self._challenge = np.zeros(capacity, dtype=np.int32)
+        self._symbol = np.zeros(capacity, dtype=np.int32)
+        self._sign = np.zeros(capacity, dtype=np.float64)
+        self._quantity = np.zeros(capacity, dtype=np.float64)
+        self._entry = np.zeros(capacity, dtype=np.float64)
+        self._trade_ids: List[str] = []
+        self._slots: Dict[str, int] = {}
+
+        self._challenge_ids: List[Optional[str]] = []
+        self._challenge_rows: Dict[str, int] = {}
+        self._free_rows: List[int] = []
+        self._cash = np.zeros(0)
+        self._starting = np.zeros(0)
+        self._daily_start = np.zeros(0)
+        self._max_daily_loss = np.zeros(0)
+        self._max_total_loss = np.zeros(0)
+        self._active = np.zeros(0, dtype=bool)
+        self._persisted_equity = np.zeros(0)
+
+        self._symbols: Dict[str, int] = {}
+        self._prices = np.zeros(0)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _challenge_row(self, challenge_id: str) -> int:
+        row = self._challenge_rows.get(challenge_id)
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+                self._challenge_ids[row] = challenge_id
+            else:
+                row = len(self._challenge_ids)
+                self._challenge_ids.append(challenge_id)
+                size = row + 1
+                self._cash = _grow(self._cash, size)
+                self._starting = _grow(self._starting, size)
+                self._daily_start = _grow(self._daily_start, size)
+                self._max_daily_loss = _grow(self._max_daily_loss, size)
+                self._max_total_loss = _grow(self._max_total_loss, size)
+                self._active = _grow(self._active, size, False)
+                self._persisted_equity = _grow(self._persisted_equity, size, np.nan)
+            self._persisted_equity[row] = np.nan
+            self._challenge_rows[challenge_id] = row
+        return row
+
+    def _symbol_row(self, symbol: str) -> int:
+        row = self._symbols.get(symbol)
+        if row is None:
+            row = len(self._symbols)
+            self._symbols[symbol] = row
+            self._prices = _grow(self._prices, row + 1, np.nan)
+        return row
+
+    def set_challenge(self, challenge_id: str, record: Mapping[str, Any]):
+        """Track (or refresh) a challenge's cash balance, baselines and loss limits from its record"""
+        row = self._challenge_row(challenge_id)
+        starting = record.get('starting_balance') or 0
+        self._cash[row] = record.get('current_balance') or 0
+        self._starting[row] = starting
+        self._daily_start[row] = record.get('daily_start_balance') or starting
+        self._max_daily_loss[row] = record.get('max_daily_loss_pct', 5)
+        self._max_total_loss[row] = record.get('max_total_loss_pct', 10)
+        self._active[row] = record.get('status') == 'active'
+
+    def remove_challenge(self, challenge_id: str):
+        """Forget a challenge and all of its positions"""
+        row = self._challenge_rows.pop(challenge_id, None)
+        if row is None:
+            return
+        for slot in sorted(np.flatnonzero(self._challenge[:self._size] == row), reverse=True):
+            self._remove_slot(int(slot))
+        self._challenge_ids[row] = None
+        self._active[row] = False
+        self._free_rows.append(row)
+
+    def add_position(self, trade_id: str, challenge_id: str, symbol: str, side: str,
+                     quantity: float, entry_price: float):
+        if trade_id in self._slots:
+            return
+        slot = self._size
+        size = slot + 1
+        self._challenge = _grow(self._challenge, size)
+        self._symbol = _grow(self._symbol, size)
+        self._sign = _grow(self._sign, size)
+        self._quantity = _grow(self._quantity, size)
+        self._entry = _grow(self._entry, size)
+        self._challenge[slot] = self._challenge_row(challenge_id)
+        self._symbol[slot] = self._symbol_row(symbol)
+        self._sign[slot] = 1.0 if side == 'buy' else -1.0
+        self._quantity[slot] = quantity
+        self._entry[slot] = entry_price
+        self._trade_ids.append(trade_id)
+        self._slots[trade_id] = slot
+        self._size = size
+
+    def _remove_slot(self, slot: int):
+        last = self._size - 1
+        del self._slots[self._trade_ids[slot]]
+        if slot != last:
+            for array in (self._challenge, self._symbol, self._sign, self._quantity, self._entry):
+                array[slot] = array[last]
+            self._trade_ids[slot] = self._trade_ids[last]
+            self._slots[self._trade_ids[slot]] = slot
+        self._trade_ids.pop()
+        self._size = last
+
+    def remove_position(self, trade_id: str):
+        slot = self._slots.get(trade_id)
+        if slot is not None:
+            self._remove_slot(slot)
+
+    def update_prices(self, prices: Mapping[str, float]):
+        """Record the latest price of each symbol; positions in unpriced symbols are marked at entry"""
+        for symbol, price in prices.items():
+            # The row first: a new symbol may grow (and so replace) the price array
+            row = self._symbol_row(symbol)
+            self._prices[row] = price
+
+    def revalue(self) -> Valuation:
+        """Mark every position to its symbol's last price and total the results per challenge"""
+        n = self._size
+        rows = len(self._challenge_ids)
+        entry = self._entry[:n]
+        quantity = self._quantity[:n]
+        prices = self._prices[self._symbol[:n]]
+        prices = np.where(np.isnan(prices), entry, prices)
+
+        unrealized = self._sign[:n] * (prices - entry) * quantity
+        challenge = self._challenge[:n]
+        unrealized_pnl = np.bincount(challenge, weights=unrealized, minlength=rows)
+        cost = np.bincount(challenge, weights=entry * quantity, minlength=rows)
+        equity = self._cash[:rows] + cost + unrealized_pnl
+
+        starting = self._starting[:rows]
+        daily_start = self._daily_start[:rows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            total_pnl_pct = np.where(starting != 0, (equity - starting) / starting * 100, 0.0)
+            daily_pnl_pct = np.where(daily_start != 0, (equity - daily_start) / daily_start * 100, 0.0)
+        breached = self._active[:rows] & (
+            (daily_pnl_pct <= -self._max_daily_loss[:rows]) | (total_pnl_pct <= -self._max_total_loss[:rows])
+        )
+        return Valuation(list(self._challenge_ids), equity, unrealized_pnl, total_pnl_pct, daily_pnl_pct, breached)
+
+    def mark_challenge(self, challenge_id: str) -> float:
+        """Marked equity of one challenge, which is then taken as persisted"""
+        row = self._challenge_rows[challenge_id]
+        slots = np.flatnonzero(self._challenge[:self._size] == row)
+        entry = self._entry[slots]
+        quantity = self._quantity[slots]
+        prices = self._prices[self._symbol[slots]]
+        prices = np.where(np.isnan(prices), entry, prices)
+        equity = float(self._cash[row] + np.sum(entry * quantity + self._sign[slots] * (prices - entry) * quantity))
+        self._persisted_equity[row] = equity
+        return equity
+
+    def equity_changes(self, valuation: Valuation, tolerance: float = MARK_EQUITY_TOLERANCE) -> np.ndarray:
+        """Rows of active challenges whose marked equity moved by at least tolerance since the last call"""
+        rows = len(valuation.equity)
+        persisted = self._persisted_equity[:rows]
+        changed = self._active[:rows] & ~(np.abs(valuation.equity - persisted) < tolerance)
+        persisted[changed] = valuation.equity[changed]
+        return np.flatnonzero(changed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'positions': self._size,
+            'challenges': len(self._challenge_rows),
+            'symbols': len(self._symbols)
+        }
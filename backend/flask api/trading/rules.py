@@ -0,0 +1,83 @@
+from typing import Dict, Any, Mapping, Tuple
+
+import numpy as np
+
+
+def daily_loss_reason(daily_pnl_pct: float, max_daily_loss_pct: float) -> str:
+    return f"Max Daily Loss Exceeded: {daily_pnl_pct:.2f}% (Limit: -{max_daily_loss_pct}%)"
+
+
+def total_loss_reason(total_pnl_pct: float, max_total_loss_pct: float) -> str:
+    return f"Max Total Loss Exceeded: {total_pnl_pct:.2f}% (Limit: -{max_total_loss_pct}%)"
+
+
+def evaluate_challenge(challenge: Mapping[str, Any]) -> Dict[str, Any]:
+    """Apply the challenge rules to a Challenge record.
+
+    Pure: it reads only the record it is given, so callers that already
+    hold the challenge state evaluate it in-process. The result is the
+    /evaluate_challenge response body; persisting a status change is up
+    to the caller.
+    """
+    if challenge.get('status') != 'active':
+        return {
+            'success': True,
+            'status': challenge.get('status'),
+            'message': f"Challenge already {challenge.get('status')}"
+        }
+
+    total_pnl_pct = challenge.get('total_pnl_pct', 0) or 0
+    daily_pnl_pct = challenge.get('daily_pnl_pct', 0) or 0
+    max_daily_loss_pct = challenge.get('max_daily_loss_pct', 5)
+    max_total_loss_pct = challenge.get('max_total_loss_pct', 10)
+    profit_target_pct = challenge.get('profit_target_pct', 10)
+
+    new_status = 'active'
+    failure_reason = None
+
+    # Rule 1: Max Daily Loss
+    if daily_pnl_pct <= -max_daily_loss_pct:
+        new_status = 'failed'
+        failure_reason = daily_loss_reason(daily_pnl_pct, max_daily_loss_pct)
+
+    # Rule 2: Max Total Loss
+    if total_pnl_pct <= -max_total_loss_pct:
+        new_status = 'failed'
+        failure_reason = total_loss_reason(total_pnl_pct, max_total_loss_pct)
+
+    # Rule 3: Profit Target
+    if total_pnl_pct >= profit_target_pct:
+        new_status = 'passed'
+        failure_reason = None
+
+    return {
+        'success': True,
+        'challengeId': challenge.get('id'),
+        'status': new_status,
+        'metrics': {
+            'totalPnlPct': total_pnl_pct,
+            'dailyPnlPct': daily_pnl_pct,
+            'currentBalance': challenge.get('current_balance'),
+            'startingBalance': challenge.get('starting_balance')
+        },
+        'failureReason': failure_reason,
+        'rulesViolated': new_status == 'failed',
+        'targetAchieved': new_status == 'passed'
+    }
+
+
+def evaluate_batch(total_pnl_pct: np.ndarray, daily_pnl_pct: np.ndarray, max_daily_loss_pct: np.ndarray,
+                   max_total_loss_pct: np.ndarray, profit_target_pct: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """The rules of evaluate_challenge over arrays of active challenges.
+
+    Returns the new status of each challenge ('active', 'failed' or
+    'passed') and a mask of the failures caused by the total loss rule
+    (the rest were the daily loss rule), with the same precedence as
+    evaluate_challenge: the total loss reason wins over the daily one and
+    reaching the profit target wins over both.
+    """
+    daily_loss = daily_pnl_pct <= -max_daily_loss_pct
+    total_loss = total_pnl_pct <= -max_total_loss_pct
+    passed = total_pnl_pct >= profit_target_pct
+    status = np.where(passed, 'passed', np.where(daily_loss | total_loss, 'failed', 'active'))
+    return status, total_loss & ~passed
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from common.singleflight import SingleFlight
+
+from .rules import evaluate_batch, daily_loss_reason, total_loss_reason
+
+SWEEP_INTERVAL = float(os.environ.get('SWEEP_INTERVAL', 60))
+SWEEP_PAGE_SIZE = int(os.environ.get('SWEEP_PAGE_SIZE', 500))
+SWEEP_RETRY_INTERVAL = float(os.environ.get('SWEEP_RETRY_INTERVAL', 30))
+# Run the periodic sweep in this process; the /sweep_challenges endpoint works either way
+SWEEP_ENABLED = os.environ.get('SWEEP_ENABLED', 'True').lower() == 'true'
+# Daily P&L restarts at midnight in this time zone
+TRADING_DAY_TIMEZONE = os.environ.get('TRADING_DAY_TIMEZONE', 'UTC')
+
+SWEEP_FIELDS = [
+    'id', 'status', 'current_balance', 'equity', 'starting_balance', 'daily_start_balance',
+    'daily_pnl', 'daily_pnl_pct', 'total_pnl_pct', 'max_daily_loss_pct', 'max_total_loss_pct',
+    'profit_target_pct', 'daily_reset_date', 'last_trade_date', 'created_date'
+]
+
+
+def _value(record: Dict[str, Any], field: str, default: float = 0) -> Any:
+    value = record.get(field)
+    return default if value is None else value
+
+
+def _column(records: List[Dict[str, Any]], field: str, default: float = 0) -> np.ndarray:
+    return np.array([_value(record, field, default) for record in records], dtype=np.float64)
+
+
+def _local_day(value: Any, tz: ZoneInfo) -> str:
+    """ISO date of a timestamp (naive ones are UTC) in tz, or '' if it can't be parsed"""
+    if not isinstance(value, str) or not value:
+        return ''
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return value[:10]
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(tz).date().isoformat()
+
+
+class ChallengeSweeper:
+    """Applies the challenge rules and the daily rollover to every active challenge.
+
+    Active challenges are loaded ``page_size`` at a time (keyset-paged by
+    id, only the fields the rules need). Each page is evaluated with
+    evaluate_batch in one vectorized pass; challenges that are still
+    active and whose trading day has ended (per their daily_reset_date,
+    or else their last trade or creation) start a new day from their
+    current equity. The changed rows of a page are written back with one
+    bulk update. Challenges held by the trading engine are read from and
+    written through it, so its in-memory state and write-behind queue stay
+    authoritative. Runs every ``interval`` seconds and right after
+    midnight in the trading day's time zone.
+    """
+
+    def __init__(self, runner, client, engine=None, interval: float = SWEEP_INTERVAL,
+                 page_size: int = SWEEP_PAGE_SIZE, retry_interval: float = SWEEP_RETRY_INTERVAL,
+                 tz: str = TRADING_DAY_TIMEZONE):
+        self.runner = runner
+        self.client = client
+        self.engine = engine
+        self.interval = interval
+        self.page_size = page_size
+        self.retry_interval = retry_interval
+        self.timezone = ZoneInfo(tz)
+        self._started = False
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._last: Optional[Dict[str, Any]] = None
+        self._stats = {'sweeps': 0, 'sweep_errors': 0, 'swept': 0, 'failed': 0, 'passed': 0, 'rolled_over': 0}
+
+    def start(self):
+        """Start the sweep loop on runner, once"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.runner.submit(self._run())
+
+    def today(self, now: Optional[float] = None) -> str:
+        return datetime.fromtimestamp(time.time() if now is None else now, self.timezone).date().isoformat()
+
+    def next_delay(self, now: Optional[float] = None) -> float:
+        local = datetime.fromtimestamp(time.time() if now is None else now, self.timezone)
+        midnight = datetime.combine(local.date() + timedelta(days=1), datetime.min.time(), self.timezone)
+        return min(self.interval, (midnight - local).total_seconds() + 1)
+
+    def evaluate_page(self, records: List[Dict[str, Any]], today: str) -> List[Dict[str, Any]]:
+        """Updates (each with the record id) for the challenges in a page that changed"""
+        if not records:
+            return []
+        total_pnl_pct = _column(records, 'total_pnl_pct')
+        daily_pnl_pct = _column(records, 'daily_pnl_pct')
+        max_daily_loss_pct = _column(records, 'max_daily_loss_pct', 5)
+        max_total_loss_pct = _column(records, 'max_total_loss_pct', 10)
+        status, total_loss = evaluate_batch(
+            total_pnl_pct, daily_pnl_pct, max_daily_loss_pct, max_total_loss_pct,
+            _column(records, 'profit_target_pct', 10)
+        )
+
+        reference_day = np.array([
+            record.get('daily_reset_date')
+            or _local_day(record.get('last_trade_date') or record.get('created_date'), self.timezone)
+            for record in records
+        ])
+        # The rules above judged the day that just ended; survivors then start the new one
+        rollover = (status == 'active') & (reference_day < today)
+        balance = _column(records, 'current_balance')
+        equity = np.array([record.get('equity') for record in records], dtype=np.float64)
+        equity = np.where(np.isnan(equity), balance, equity)
+
+        updates = []
+        for i in np.flatnonzero((status != 'active') | rollover):
+            update = {'id': records[i]['id']}
+            if status[i] == 'failed':
+                update['status'] = 'failed'
+                update['failure_reason'] = (
+                    total_loss_reason(total_pnl_pct[i], _value(records[i], 'max_total_loss_pct', 10)) if total_loss[i]
+                    else daily_loss_reason(daily_pnl_pct[i], _value(records[i], 'max_daily_loss_pct', 5))
+                )
+            elif status[i] == 'passed':
+                update['status'] = 'passed'
+                update['failure_reason'] = None
+            else:
+                update.update({
+                    'daily_start_balance': float(equity[i]),
+                    'daily_pnl': 0,
+                    'daily_pnl_pct': 0,
+                    'daily_reset_date': today
+                })
+            updates.append(update)
+        return updates
+
+    async def _load_page(self, after: Optional[str]) -> List[Dict[str, Any]]:
+        filters: Dict[str, Any] = {'status': 'active'}
+        if after is not None:
+            filters['id'] = {'$gt': after}
+        return await self.client.entities.Challenge.filter(
+            filters, fields=SWEEP_FIELDS, limit=self.page_size, sort='id'
+        )
+
+    async def _sweep(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        today = self.today()
+        result = {'swept': 0, 'failed': 0, 'passed': 0, 'rolled_over': 0, 'pages': 0, 'write_errors': 0}
+        after = None
+        while True:
+            page = await self._load_page(after)
+            if not page:
+                break
+            after = page[-1]['id']
+            result['pages'] += 1
+            records = page
+            if self.engine is not None:
+                # The engine's copy of a challenge it holds is newer than the stored one
+                records = [self.engine.snapshot(record['id']) or record for record in page]
+                records = [record for record in records if record.get('status') == 'active']
+
+            remote = []
+            for update in self.evaluate_page(records, today):
+                if 'status' in update:
+                    result[update['status']] += 1
+                else:
+                    result['rolled_over'] += 1
+                fields = {key: value for key, value in update.items() if key != 'id'}
+                if self.engine is None or not self.engine.apply_updates(update['id'], fields):
+                    remote.append(update)
+            if remote and not await self.client.entities.Challenge.bulk_update(remote):
+                result['write_errors'] += len(remote)
+                logging.error(f'Challenge sweep failed to write {len(remote)} updates')
+            result['swept'] += len(records)
+            if len(page) < self.page_size:
+                break
+
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        with self._lock:
+            self._stats['sweeps'] += 1
+            for key in ('swept', 'failed', 'passed', 'rolled_over'):
+                self._stats[key] += result[key]
+            self._last = {**result, 'at': datetime.utcnow().isoformat()}
+        return result
+
+    async def sweep(self) -> Dict[str, Any]:
+        """Sweep every active challenge now; concurrent callers share one sweep"""
+        return await self.runner.run(self._flight.do('sweep', self._sweep))
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+                delay = self.next_delay()
+            except Exception as e:
+                with self._lock:
+                    self._stats['sweep_errors'] += 1
+                logging.warning(f'Challenge sweep failed: {e}')
+                delay = self.retry_interval
+            await asyncio.sleep(max(delay, 1.0))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['last_sweep'] = self._last
+        stats['next_sweep_in'] = round(self.next_delay(), 1)
+        return stats
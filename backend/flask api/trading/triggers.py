@@ -0,0 +1,104 @@
+import heapq
+from typing import Dict, Any, List, Optional, Tuple
+
+STOP_LOSS = 'stop_loss'
+TAKE_PROFIT = 'take_profit'
+
+
+def levels_from_pct(side: str, entry_price: float, stop_loss_pct: Optional[float] = None,
+                    take_profit_pct: Optional[float] = None) -> Tuple[Optional[float], Optional[float]]:
+    """Absolute stop-loss/take-profit prices for levels given as percentages of the entry price
+    (the form getAISignals suggests them in)"""
+    direction = 1 if side == 'buy' else -1
+    stop_loss = entry_price * (1 - direction * stop_loss_pct / 100) if stop_loss_pct else None
+    take_profit = entry_price * (1 + direction * take_profit_pct / 100) if take_profit_pct else None
+    return stop_loss, take_profit
+
+
+class TriggerBook:
+    """Stop-loss and take-profit levels of open trades, indexed per symbol for price ticks.
+
+    Each symbol has two heaps: levels that fire when the price falls to
+    them (a long's stop loss, a short's take profit), kept as a max-heap,
+    and levels that fire when it rises to them (a long's take profit, a
+    short's stop loss), kept as a min-heap. A tick pops exactly the levels
+    it crossed, so it costs O(k log n) for k triggers among n levels.
+    Replaced or removed levels are left in the heaps and skipped when they
+    surface (their entry no longer matches the trade's current version).
+    Not thread-safe; the trading engine uses it from the pool loop only.
+    """
+
+    def __init__(self):
+        self._falling: Dict[str, list] = {}  # symbol -> [(-level, seq, trade id, kind, version)]
+        self._rising: Dict[str, list] = {}  # symbol -> [(level, seq, trade id, kind, version)]
+        self._versions: Dict[str, int] = {}
+        self._seq = 0
+        self._live = 0
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+    def __contains__(self, trade_id: str) -> bool:
+        return trade_id in self._versions
+
+    def set(self, trade_id: str, symbol: str, side: str, stop_loss: Optional[float] = None,
+            take_profit: Optional[float] = None):
+        """Attach (or replace) a trade's levels; None clears one"""
+        self.remove(trade_id)
+        if stop_loss is None and take_profit is None:
+            return
+        version = self._seq = self._seq + 1
+        self._versions[trade_id] = version
+        long = side == 'buy'
+        for kind, level in ((STOP_LOSS, stop_loss), (TAKE_PROFIT, take_profit)):
+            if level is None:
+                continue
+            self._seq += 1
+            if (kind == STOP_LOSS) == long:
+                heapq.heappush(self._falling.setdefault(symbol, []), (-level, self._seq, trade_id, kind, version))
+            else:
+                heapq.heappush(self._rising.setdefault(symbol, []), (level, self._seq, trade_id, kind, version))
+            self._live += 1
+
+    def remove(self, trade_id: str):
+        """Detach a trade's levels (e.g. once it is closed)"""
+        self._versions.pop(trade_id, None)
+
+    def _pop_crossed(self, heap: list, crossed, fired: List[Tuple[str, str, float]]):
+        while heap and crossed(heap[0][0]):
+            key, _, trade_id, kind, version = heapq.heappop(heap)
+            self._live -= 1
+            if self._versions.get(trade_id) == version:
+                # One of a trade's levels firing disarms the other
+                del self._versions[trade_id]
+                fired.append((trade_id, kind, abs(key)))
+
+    def crossed(self, symbol: str, price: float) -> List[Tuple[str, str, float]]:
+        """(trade id, kind, level) of every level price reached, which are detached"""
+        fired: List[Tuple[str, str, float]] = []
+        falling = self._falling.get(symbol)
+        if falling:
+            self._pop_crossed(falling, lambda key: -key >= price, fired)
+        rising = self._rising.get(symbol)
+        if rising:
+            self._pop_crossed(rising, lambda key: key <= price, fired)
+        if self._live > 2 * len(self._versions) + 1024:
+            self._compact()
+        return fired
+
+    def _compact(self):
+        """Drop stale entries once they outnumber the live ones"""
+        for heaps in (self._falling, self._rising):
+            for symbol, heap in list(heaps.items()):
+                heap[:] = [entry for entry in heap if self._versions.get(entry[2]) == entry[4]]
+                heapq.heapify(heap)
+                if not heap:
+                    del heaps[symbol]
+        self._live = sum(len(heap) for heaps in (self._falling, self._rising) for heap in heaps.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'armed_trades': len(self._versions),
+            'symbols': len({symbol for heaps in (self._falling, self._rising) for symbol, heap in heaps.items() if heap}),
+            'heap_entries': self._live
+        }
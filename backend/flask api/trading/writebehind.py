@@ -0,0 +1,306 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
+
+TRADING_FLUSH_INTERVAL = float(os.environ.get('TRADING_FLUSH_INTERVAL', 0.05))
+TRADING_FLUSH_BATCH = int(os.environ.get('TRADING_FLUSH_BATCH', 200))
+TRADING_FLUSH_RETRY = float(os.environ.get('TRADING_FLUSH_RETRY', 2))
+# fsync every journal write; without it the journal survives a process crash but not a power loss
+TRADING_JOURNAL_FSYNC = os.environ.get('TRADING_JOURNAL_FSYNC', 'False').lower() == 'true'
+
+Key = Tuple[str, str]  # (entity name, record id)
+
+
+class Journal:
+    """Append-only JSON-lines log of queued writes and of the ones flushed since.
+
+    Replaying it after a crash yields every write that was acknowledged but
+    not yet known to be persisted (delivery is at-least-once).
+    """
+
+    def __init__(self, path: str, fsync: bool = TRADING_JOURNAL_FSYNC):
+        self.path = path
+        self.fsync = fsync
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def append(self, entry: Dict[str, Any]):
+        with self._lock:
+            self._file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def replay(self) -> Tuple[List[Dict[str, Any]], List[List[str]]]:
+        """Logged writes not marked done, in order, and the [entity, local id, remote id] mappings"""
+        entries, done, ids = [], set(), []
+        with self._lock, open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # torn last line from a crash mid-write
+                if 'done' in entry:
+                    done.update(entry['done'])
+                    ids.extend(entry.get('ids', []))
+                else:
+                    entries.append(entry)
+        return [entry for entry in entries if entry['seq'] not in done], ids
+
+    def truncate(self):
+        with self._lock:
+            self._file.truncate(0)
+            self._file.seek(0)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class WriteBehind:
+    """Coalesces entity creates/updates in memory and flushes them in batches.
+
+    Writes are journaled before they are accepted, then applied in the
+    background every ``interval`` seconds with one bulk call per entity and
+    kind: updates to the same record merge into one, and updates to a
+    record whose create hasn't been flushed yet merge into that create.
+    Records created here get a local id immediately; it maps to the
+    remote id once the create is flushed. Failed batches stay queued and
+    are retried. Must be used from a single event loop (the pool loop).
+    """
+
+    def __init__(self, client, journal: Optional[Journal] = None, interval: float = TRADING_FLUSH_INTERVAL,
+                 batch_size: int = TRADING_FLUSH_BATCH, retry: float = TRADING_FLUSH_RETRY):
+        self.client = client
+        self.journal = journal
+        self.interval = interval
+        self.batch_size = batch_size
+        self.retry = retry
+        # key -> [fields, seqs]; creates keep insertion order so ids map back in order
+        self._creates: 'OrderedDict[Key, list]' = OrderedDict()
+        self._updates: 'OrderedDict[Key, list]' = OrderedDict()
+        self._remote_ids: Dict[Key, str] = {}
+        self._creating: set = set()
+        self._flushing = False
+        self._unique: Dict[str, Tuple[str, ...]] = {}
+        self._seq = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._stats = {'writes': 0, 'flushes': 0, 'flushed_records': 0, 'flush_errors': 0, 'replayed': 0,
+                       'duplicates': 0}
+        if journal is not None:
+            self._replay()
+
+    def _replay(self):
+        entries, ids = self.journal.replay()
+        for entity, local_id, remote_id in ids:
+            self._remote_ids[(entity, local_id)] = remote_id
+        for entry in entries:
+            self._seq = max(self._seq, entry['seq'])
+            key = (entry['entity'], entry['id'])
+            if entry['op'] == 'create':
+                self._queue(self._creates, key, entry['data'], entry['seq'])
+            else:
+                self._queue_update(key, entry['data'], entry['seq'])
+            self._stats['replayed'] += 1
+
+    def _log(self, op: str, key: Key, data: Dict[str, Any]) -> int:
+        self._seq += 1
+        if self.journal is not None:
+            self.journal.append({'seq': self._seq, 'op': op, 'entity': key[0], 'id': key[1], 'data': data})
+        self._stats['writes'] += 1
+        return self._seq
+
+    @staticmethod
+    def _queue(queue: 'OrderedDict[Key, list]', key: Key, fields: Dict[str, Any], seq: int):
+        pending = queue.get(key)
+        if pending is None:
+            queue[key] = [dict(fields), [seq]]
+        else:
+            pending[0].update(fields)
+            pending[1].append(seq)
+
+    def _queue_update(self, key: Key, fields: Dict[str, Any], seq: int):
+        if key in self._creates:
+            self._queue(self._creates, key, fields, seq)
+        else:
+            self._queue(self._updates, (key[0], self._remote_ids.get(key, key[1])), fields, seq)
+
+    def start(self):
+        """Start the flusher on the running loop (the pool loop), if it isn't running"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._idle = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        if len(self._creates) + len(self._updates) >= self.batch_size:
+            self._wakeup.set()
+        if self.pending():
+            self._idle.clear()
+
+    def create(self, entity: str, local_id: str, fields: Dict[str, Any]):
+        """Queue a new record known locally as local_id until it is flushed"""
+        key = (entity, local_id)
+        self._queue(self._creates, key, fields, self._log('create', key, fields))
+        self.start()
+
+    def update(self, entity: str, record_id: str, fields: Dict[str, Any]):
+        """Queue field updates for a record (remote or local id)"""
+        key = (entity, self._remote_ids.get((entity, record_id), record_id))
+        self._queue_update(key, fields, self._log('update', key, fields))
+        self.start()
+
+    def set_unique(self, entity: str, fields: Tuple[str, ...]):
+        """Declare entity's records unique on fields, so that a replayed create that is already
+        persisted counts as written instead of failing its batch"""
+        self._unique[entity] = tuple(fields)
+
+    def remote_id(self, entity: str, record_id: str) -> Optional[str]:
+        """Remote id of a record created here, or None while its create is queued"""
+        key = (entity, record_id)
+        if key in self._creates or key in self._creating:
+            return None
+        return self._remote_ids.get(key, record_id)
+
+    def pending(self, entity: Optional[str] = None) -> int:
+        return sum(1 for key in list(self._creates) + list(self._updates) if entity is None or key[0] == entity)
+
+    async def _persisted(self, entity: str, batch: List[Tuple[Key, list]]) -> Dict[Key, str]:
+        """Remote ids of the records in batch that already exist under entity's unique fields"""
+        unique = self._unique[entity]
+        filters = {
+            field: {'$in': list(dict.fromkeys(fields.get(field) for _, (fields, _) in batch))} for field in unique
+        }
+        existing = await getattr(self.client.entities, entity).filter(filters, fields=['id', *unique])
+        remote_ids = {tuple(record.get(field) for field in unique): record['id'] for record in existing}
+        persisted = {}
+        for key, (fields, _) in batch:
+            remote_id = remote_ids.get(tuple(fields.get(field) for field in unique))
+            if remote_id is not None:
+                persisted[key] = remote_id
+        return persisted
+
+    async def _flush_creates(self, entity: str, batch: List[Tuple[Key, list]]) -> Optional[list]:
+        """Create batch; returns the [entity, local id, remote id] mappings, or None on failure"""
+        entities = getattr(self.client.entities, entity)
+        persisted: Dict[Key, str] = {}
+        try:
+            created = await entities.bulk_create([fields for _, (fields, _) in batch])
+        except Exception:
+            # A replayed journal re-sends creates that were persisted before the crash; with a unique
+            # key they reject the whole batch, so create only the ones that aren't there yet
+            if entity not in self._unique:
+                raise
+            persisted = await self._persisted(entity, batch)
+            if not persisted:
+                raise
+            batch = [(key, pending) for key, pending in batch if key not in persisted]
+            created = await entities.bulk_create([fields for _, (fields, _) in batch]) if batch else []
+            self._stats['duplicates'] += len(persisted)
+        if len(created) != len(batch):
+            return None
+        ids = []
+        for key, remote_id in persisted.items():
+            self._remote_ids[key] = remote_id
+            ids.append([entity, key[1], remote_id])
+        for (key, _), record in zip(batch, created):
+            if record.get('id'):
+                self._remote_ids[key] = record['id']
+                ids.append([entity, key[1], record['id']])
+        return ids
+
+    async def _flush_updates(self, entity: str, batch: List[Tuple[Key, list]]) -> Optional[list]:
+        updated = await getattr(self.client.entities, entity).bulk_update(
+            [{**fields, 'id': key[1]} for key, (fields, _) in batch]
+        )
+        return [] if updated else None
+
+    async def _flush_queue(self, queue: 'OrderedDict[Key, list]', flush) -> bool:
+        items = list(queue.items())
+        queue.clear()
+        by_entity: Dict[str, List[Tuple[Key, list]]] = {}
+        for key, pending in items:
+            by_entity.setdefault(key[0], []).append((key, pending))
+
+        ok = True
+        for entity, batch in by_entity.items():
+            try:
+                ids = await flush(entity, batch)
+            except Exception as e:
+                logging.error(f'Write-behind flush of {entity} failed: {e}')
+                ids = None
+            if ids is not None:
+                self._stats['flushed_records'] += len(batch)
+                if self.journal is not None:
+                    done = {'done': [seq for _, (_, seqs) in batch for seq in seqs]}
+                    if ids:
+                        done['ids'] = ids
+                    self.journal.append(done)
+                continue
+            ok = False
+            self._stats['flush_errors'] += 1
+            # Requeue ahead of anything queued while the batch was in flight, merging newer fields on top
+            for key, (fields, seqs) in reversed(batch):
+                newer = queue.pop(key, None)
+                if newer is not None:
+                    fields, seqs = {**fields, **newer[0]}, seqs + newer[1]
+                queue[key] = [fields, seqs]
+                queue.move_to_end(key, last=False)
+        return ok
+
+    def _requeue_local_updates(self):
+        """Point updates queued against local ids at the remote record, or back into its pending create"""
+        for key in [key for key in self._updates if key in self._remote_ids or key in self._creates]:
+            fields, seqs = self._updates.pop(key)
+            for seq in seqs:
+                self._queue_update(key, fields, seq)
+
+    async def flush(self) -> bool:
+        """Flush everything queued so far; False if some writes stayed queued"""
+        # Creates first, so updates queued against their local ids can be remapped
+        self._creating = set(self._creates)
+        self._flushing = True
+        try:
+            ok = await self._flush_queue(self._creates, self._flush_creates)
+            self._creating = set()
+            self._requeue_local_updates()
+            ok = await self._flush_queue(self._updates, self._flush_updates) and ok
+        finally:
+            self._creating = set()
+            self._flushing = False
+        self._stats['flushes'] += 1
+        if not self.pending():
+            if self._idle is not None:
+                self._idle.set()
+            if self.journal is not None:
+                self.journal.truncate()
+        return ok
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self.pending():
+                self._idle.set()
+                continue
+            if not await self.flush():
+                await asyncio.sleep(self.retry)
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Wait until every queued write has been flushed, including a batch already in flight"""
+        if (self.pending() or self._flushing) and self._idle is not None:
+            self._wakeup.set()
+            await asyncio.wait_for(self._idle.wait(), timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats['pending'] = self.pending()
+        return stats
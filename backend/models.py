@@ -36,6 +36,8 @@ class Challenge(db.Model):
     total_pnl = db.Column(db.Float, default=0)
     total_pnl_pct = db.Column(db.Float, default=0)
     daily_pnl_pct = db.Column(db.Float, default=0)
+    # Trading day that daily_start_balance belongs to; set by the challenge sweeper
+    daily_reset_date = db.Column(db.Date)
     max_daily_loss_pct = db.Column(db.Float, default=5)
     max_total_loss_pct = db.Column(db.Float, default=10)
     profit_target_pct = db.Column(db.Float, default=10)
@@ -44,17 +46,23 @@ class Challenge(db.Model):
     total_trades = db.Column(db.Integer, default=0)
     winning_trades = db.Column(db.Integer, default=0)
     last_trade_date = db.Column(db.DateTime)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    ledger_seq = db.Column(db.Integer, nullable=False, default=0)
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
     updated_date = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.relationship('User', backref='challenges')
     
+    # ORM updates only match the row at the version that was read (raises StaleDataError otherwise)
+    __mapper_args__ = {'version_id_col': version}
+    
     def to_dict(self):
         return {
             'id': self.id, 'created_by': self.created_by.email if self.created_by else None,
             'display_name': self.display_name, 'plan_type': self.plan_type,
             'starting_balance': self.starting_balance, 'current_balance': self.current_balance,
             'equity': self.equity, 'total_pnl': self.total_pnl, 'total_pnl_pct': self.total_pnl_pct,
-            'status': self.status, 'total_trades': self.total_trades, 'winning_trades': self.winning_trades
+            'status': self.status, 'total_trades': self.total_trades, 'winning_trades': self.winning_trades,
+            'version': self.version, 'ledger_seq': self.ledger_seq
         }
 
 class Trade(db.Model):
@@ -69,6 +77,11 @@ class Trade(db.Model):
     pnl = db.Column(db.Float, default=0)
     pnl_pct = db.Column(db.Float, default=0)
     status = db.Column(db.String(20), default='open')
+    stop_loss = db.Column(db.Float)
+    take_profit = db.Column(db.Float)
+    close_reason = db.Column(db.String(20))
+    # Id the trading service handed out before Base44 assigned one
+    client_id = db.Column(db.String(36))
     open_time = db.Column(db.DateTime)
     close_time = db.Column(db.DateTime)
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
@@ -77,9 +90,40 @@ class Trade(db.Model):
         return {
             'id': self.id, 'challenge_id': self.challenge_id, 'symbol': self.symbol,
             'side': self.side, 'quantity': self.quantity, 'entry_price': self.entry_price,
-            'exit_price': self.exit_price, 'pnl': self.pnl, 'status': self.status
+            'exit_price': self.exit_price, 'pnl': self.pnl, 'status': self.status,
+            'stop_loss': self.stop_loss, 'take_profit': self.take_profit, 'close_reason': self.close_reason
+        }
+
+class TradeEvent(db.Model):
+    __tablename__ = 'trade_events'
+    id = db.Column(db.String(36), primary_key=True, default=gen_uuid)
+    challenge_id = db.Column(db.String(36), db.ForeignKey('challenges.id'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    event_type = db.Column(db.String(20), nullable=False)
+    trade_id = db.Column(db.String(36))
+    balance_delta = db.Column(db.Float, default=0)
+    pnl = db.Column(db.Float, default=0)
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.UniqueConstraint('challenge_id', 'seq'),)
+    
+    def to_dict(self):
+        return {
+            'id': self.id, 'challenge_id': self.challenge_id, 'seq': self.seq, 'event_type': self.event_type,
+            'trade_id': self.trade_id, 'balance_delta': self.balance_delta, 'pnl': self.pnl
         }
 
+class ChallengeSnapshot(db.Model):
+    __tablename__ = 'challenge_snapshots'
+    id = db.Column(db.String(36), primary_key=True, default=gen_uuid)
+    challenge_id = db.Column(db.String(36), db.ForeignKey('challenges.id'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    current_balance = db.Column(db.Float, nullable=False)
+    total_pnl = db.Column(db.Float, default=0)
+    total_trades = db.Column(db.Integer, default=0)
+    winning_trades = db.Column(db.Integer, default=0)
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.UniqueConstraint('challenge_id', 'seq'),)
+
 class Post(db.Model):
     __tablename__ = 'posts'
     id = db.Column(db.String(36), primary_key=True, default=gen_uuid)
@@ -0,0 +1,53 @@
+import { appParams } from '@/lib/app-params';
+
+export const MARKET_STREAM_URL = import.meta.env.VITE_MARKET_STREAM_URL;
+
+const MAX_CANDLES = 100;
+
+// Apply a snapshot or delta event from the market data stream to the quote list
+export const applyMarketEvent = (quotes, event) => {
+	const { type, ...update } = event;
+	const index = quotes.findIndex(q => q.symbol === update.symbol);
+
+	if (type === 'snapshot' || index === -1) {
+		if (index === -1) {
+			return [...quotes, update];
+		}
+		return quotes.map((q, i) => (i === index ? update : q));
+	}
+
+	const current = quotes[index];
+	let candles = current.candles || [];
+	if (update.candles && update.candles.length > 0) {
+		const since = update.candles[0].time;
+		candles = [...candles.filter(c => c.time < since), ...update.candles].slice(-MAX_CANDLES);
+	}
+	const merged = { ...current, ...update, candles };
+	return quotes.map((q, i) => (i === index ? merged : q));
+};
+
+// Open a server-sent event stream of quotes for symbols; returns a function that closes it
+export const openMarketStream = (symbols, { onEvent, onError }) => {
+	const params = new URLSearchParams({ symbols: symbols.join(',') });
+	if (appParams.token) {
+		params.set('access_token', appParams.token);
+	}
+	const source = new EventSource(`${MARKET_STREAM_URL}?${params.toString()}`);
+
+	const handle = (message) => {
+		try {
+			onEvent(JSON.parse(message.data));
+		} catch (error) {
+			console.error('Invalid market stream event:', error);
+		}
+	};
+	source.addEventListener('snapshot', handle);
+	source.addEventListener('delta', handle);
+	source.onerror = (error) => {
+		if (source.readyState === EventSource.CLOSED && onError) {
+			onError(error);
+		}
+	};
+
+	return () => source.close();
+};
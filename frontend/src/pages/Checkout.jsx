@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { createPageUrl } from '../utils';
 import { Button } from "@/components/ui/button";
@@ -21,6 +21,8 @@ export default function Checkout() {
     const [isProcessing, setIsProcessing] = useState(false);
     const [showSuccessDialog, setShowSuccessDialog] = useState(false);
     const [challengeId, setChallengeId] = useState(null);
+    // Reused when the same payment is retried, so the server processes it only once
+    const paymentAttempt = useRef(null);
 
     const plans = {
         starter: { name: 'Starter', price: 200, balance: 5000 },
@@ -46,14 +48,21 @@ export default function Checkout() {
 
         setIsProcessing(true);
 
+        const attempt = `${selectedPlan}:${paymentMethod}`;
+        if (paymentAttempt.current?.attempt !== attempt) {
+            paymentAttempt.current = { attempt, key: crypto.randomUUID() };
+        }
+
         try {
             // Simulate payment processing
             const response = await base44.functions.invoke('processPayment', {
                 planType: selectedPlan,
-                paymentMethod
+                paymentMethod,
+                idempotencyKey: paymentAttempt.current.key
             });
 
             if (response.data.success) {
+                paymentAttempt.current = null;
                 setChallengeId(response.data.challenge.id);
                 setShowSuccessDialog(true);
                 setIsProcessing(false);
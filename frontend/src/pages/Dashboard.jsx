@@ -11,6 +11,7 @@ import TradingChart from '../components/dashboard/TradingChart.jsx';
 import AISignalsPanel from '../components/dashboard/AISignalsPanel.jsx';
 import TradeExecutionPanel from '../components/dashboard/TradeExecutionPanel.jsx';
 import { toast } from "sonner";
+import { MARKET_STREAM_URL, openMarketStream, applyMarketEvent } from "@/lib/market-stream";
 
 export default function Dashboard() {
     const navigate = useNavigate();
@@ -33,23 +34,45 @@ export default function Dashboard() {
 
     useEffect(() => {
         loadChallenge();
+    }, []);
+
+    useEffect(() => {
+        setSelectedSymbol(symbols[0]);
         loadMarketData();
 
-        // Auto-refresh every 30 seconds
-        refreshInterval.current = setInterval(() => {
-            loadMarketData(true);
-        }, 30000);
+        const startPolling = () => {
+            // Auto-refresh every 30 seconds
+            refreshInterval.current = setInterval(() => {
+                loadMarketData(true);
+            }, 30000);
+        };
+
+        // Prefer pushed updates; fall back to polling if the stream is unavailable
+        let closeStream = null;
+        if (MARKET_STREAM_URL) {
+            closeStream = openMarketStream(symbols, {
+                onEvent: (event) => {
+                    setMarketData(quotes => applyMarketEvent(quotes, event));
+                    setLastUpdate(new Date());
+                },
+                onError: () => {
+                    closeStream = null;
+                    startPolling();
+                }
+            });
+        } else {
+            startPolling();
+        }
 
         return () => {
+            if (closeStream) {
+                closeStream();
+            }
             if (refreshInterval.current) {
                 clearInterval(refreshInterval.current);
+                refreshInterval.current = null;
             }
         };
-    }, []);
-
-    useEffect(() => {
-        setSelectedSymbol(symbols[0]);
-        loadMarketData();
     }, [selectedMarket]);
 
     const loadChallenge = async () => {